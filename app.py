@@ -1,4 +1,4 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, session
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, session, Response, stream_with_context, abort, g
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -18,7 +18,19 @@ except ImportError:
     facebook = None
     SQLAlchemyStorage = None
     oauth_authorized = None
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy import text, event, bindparam
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session as OrmSession, joinedload, selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import click
+import migrations
 from dotenv import load_dotenv
 import smtplib
 import ssl
@@ -30,6 +42,18 @@ import string
 from flask_mail import Mail, Message
 import math
 import json
+import threading
+import time
+import hashlib
+import base64
+import re
+import bisect
+import unicodedata
+import uuid
+from queue import Queue, Empty, Full
+from collections import OrderedDict, deque, namedtuple
+from array import array
+from functools import wraps
 from oauthlib.oauth2.rfc6749.errors import MismatchingStateError
 
 # Carrega variáveis do .env e permite HTTP em desenvolvimento
@@ -45,12 +69,42 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False
 # Banco de dados SQLite no arquivo food_delivery.db (na raiz do projeto)
 # Dica: se preferir, mude para dentro de instance com: 'sqlite:///instance/food_delivery.db'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cliente.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///cliente.db')
+
+def pool_options(url, **options):
+    """Opções de pool para ``url``; vazio para SQLite em memória, que usa StaticPool (uma conexão só)
+    e não aceita pool_size/max_overflow/pool_timeout."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return {}
+    return options
+
+_restaurants_url = os.environ.get('RESTAURANTS_DATABASE_URL', 'sqlite:///restaurante.db')
 app.config['SQLALCHEMY_BINDS'] = {
-    'restaurants': 'sqlite:///restaurante.db'
+    # restaurante.db concentra as leituras quentes (cardápio, listagens) e as gravações de checkout
+    'restaurants': dict(pool_options(_restaurants_url, pool_size=10, max_overflow=20, pool_timeout=10), url=_restaurants_url),
 }
+# Pool de cliente.db (o bind restaurants tem as próprias opções acima)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], pool_size=5, max_overflow=10, pool_timeout=10)
 # Desativa rastreamento de modificações (melhora performance)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Perfil SQLite aplicado a cada conexão nova. WAL deixa leituras rodarem enquanto um checkout grava;
+# synchronous=NORMAL é seguro em WAL (só perde as últimas transações numa queda de energia).
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'cache_size': -16000,  # negativo = KiB (16 MB)
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    # Desligado por padrão: exclusões antigas (restaurante, conta) ainda deixam linhas órfãs
+    'foreign_keys': 'ON' if str(os.environ.get('SQLITE_FOREIGN_KEYS', '')).lower() in ('1', 'true', 'yes', 'on') else 'OFF',
+}
+# Ajustes por bind (None = cliente.db)
+app.config['SQLITE_BIND_PRAGMAS'] = {
+    'restaurants': {'cache_size': -64000, 'mmap_size': 256 * 1024 * 1024},
+}
 
 # Configuração de email (Flask-Mail)
 # Usa variáveis de ambiente se disponíveis; caso contrário, aplica defaults (Gmail) como solicitado
@@ -95,39 +149,235 @@ app.config['FACEBOOK_OAUTH_CLIENT_SECRET'] = os.environ.get('FACEBOOK_OAUTH_CLIE
 # Inicialização do banco de dados (ORM SQLAlchemy)
 db = SQLAlchemy(app)
 
+def sqlite_pragmas_for(bind_key):
+    return dict(app.config['SQLITE_PRAGMAS'], **app.config['SQLITE_BIND_PRAGMAS'].get(bind_key, {}))
+
+def apply_sqlite_pragmas(dbapi_conn, pragmas):
+    cursor = dbapi_conn.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+def configure_sqlite_engines():
+    for bind_key, engine in db.engines.items():
+        if engine.dialect.name != 'sqlite':
+            continue
+        # Lê a config na hora da conexão, para ajustes em runtime valerem após engine.dispose()
+        event.listen(engine, 'connect', lambda dbapi_conn, record, key=bind_key: apply_sqlite_pragmas(dbapi_conn, sqlite_pragmas_for(key)))
+
+def read_sqlite_pragmas(engine):
+    with engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar() for name in app.config['SQLITE_PRAGMAS']}
+
+with app.app_context():
+    configure_sqlite_engines()
+
 # Configuração do login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # Geocodificação e cálculo de distância (Haversine)
-def geocode_address(query: str):
-    """Obtém (lat, lon) via Nominatim para um endereço no Brasil."""
+# Cache de geocodificação: LRU em memória na frente de uma tabela SQLite (GeocodeCache).
+# Resultados positivos vivem GEOCODE_CACHE_TTL segundos; endereço não encontrado (o geocodificador
+# respondeu sem resultado) fica em cache negativo por GEOCODE_NEGATIVE_TTL. Timeout e erro HTTP não
+# entram no cache: a próxima consulta tenta de novo.
+app.config['GEOCODE_CACHE_TTL'] = 30 * 24 * 3600
+app.config['GEOCODE_NEGATIVE_TTL'] = 6 * 3600
+app.config['GEOCODE_CACHE_SIZE'] = 2048
+# Backend do geocodificador: 'nominatim' (produção) ou 'stub' (coordenadas determinísticas, sem rede)
+app.config['GEOCODER_BACKEND'] = os.environ.get('GEOCODER_BACKEND', 'nominatim')
+app.config['NOMINATIM_URL'] = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+# Política de uso do Nominatim: no máximo 1 requisição por segundo
+app.config['GEOCODE_RATE_PER_SEC'] = 1.0
+app.config['GEOCODE_MAX_RETRIES'] = 3
+app.config['GEOCODE_RETRY_BACKOFF'] = 5.0
+# False processa a fila de geocodificação na própria chamada (scripts e testes)
+app.config['GEOCODE_QUEUE_ASYNC'] = True
+
+NOMINATIM_HEADERS = {"User-Agent": "FoodDeliveryApp/1.0 (contato: dev@example.com)"}
+
+
+class GeocodeUnavailable(Exception):
+    """Falha transitória do geocodificador (timeout, erro HTTP, limite de taxa)."""
+
+
+class TokenBucket:
+    """Limitador de taxa token bucket: acquire() bloqueia até haver um token."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class LRUCache:
+    """Cache LRU thread-safe com expiração opcional por entrada."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = (time.time() + ttl) if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Marcador para resultados negativos (distingue "não encontrado" de "não está no cache")
+_GEOCODE_MISS = object()
+geocode_memory_cache = LRUCache(app.config['GEOCODE_CACHE_SIZE'])
+geocode_cache_stats = {'memory_hits': 0, 'db_hits': 0, 'negative_hits': 0, 'misses': 0, 'remote_calls': 0, 'remote_failures': 0}
+_geocode_stats_lock = threading.Lock()
+
+def _count_geocode(stat):
+    with _geocode_stats_lock:
+        geocode_cache_stats[stat] += 1
+
+def normalize_geocode_query(query: str) -> str:
+    return ' '.join(str(query or '').lower().replace(';', ',').split()).strip(' ,')
+
+def reverse_geocode_key(lat: float, lon: float) -> str:
+    # 4 casas decimais ~ 11m: suficiente para reaproveitar o mesmo ponto de GPS
+    return f"rev:{round(float(lat), 4):.4f},{round(float(lon), 4):.4f}"
+
+def _geocode_cache_lookup(key):
+    """Busca no LRU e, em seguida, na tabela geocode_cache. Retorna _GEOCODE_MISS se ausente/expirado."""
+    value = geocode_memory_cache.get(key, _GEOCODE_MISS)
+    if value is not _GEOCODE_MISS:
+        _count_geocode('negative_hits' if value is None else 'memory_hits')
+        return value
     try:
-        if not query:
-            return None
-        url = "https://nominatim.openstreetmap.org/search"
+        # Sem autoflush: a leitura do cache não empurra para o banco o que está pendente na sessão
+        with db.session.no_autoflush:
+            rec = GeocodeCache.query.filter_by(key=key).first()
+    except Exception:
+        rec = None
+    if rec and rec.expires_at and rec.expires_at > datetime.utcnow():
+        value = json.loads(rec.payload) if rec.found and rec.payload else None
+        remaining = (rec.expires_at - datetime.utcnow()).total_seconds()
+        geocode_memory_cache.set(key, value, ttl=remaining)
+        _count_geocode('negative_hits' if value is None else 'db_hits')
+        return value
+    _count_geocode('misses')
+    return _GEOCODE_MISS
+
+def _geocode_cache_store(key, value):
+    """Grava no LRU e na tabela geocode_cache, numa conexão própria: a sessão de quem chamou (que pode
+    ter alterações pendentes) não é commitada nem descartada por causa do cache. Quem geocodifica o faz
+    antes de gravar em restaurante.db (a fila usa sessão própria), então não há lock do SQLite em espera."""
+    ttl = app.config['GEOCODE_CACHE_TTL'] if value is not None else app.config['GEOCODE_NEGATIVE_TTL']
+    geocode_memory_cache.set(key, value, ttl=ttl)
+    stmt = sqlite_insert(GeocodeCache.__table__).values(
+        chave=key,
+        encontrado=value is not None,
+        dados=json.dumps(value) if value is not None else None,
+        expira_em=datetime.utcnow() + timedelta(seconds=ttl),
+        criado_em=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(index_elements=['chave'], set_={
+        'encontrado': stmt.excluded.encontrado, 'dados': stmt.excluded.dados, 'expira_em': stmt.excluded.expira_em})
+    try:
+        with db.engines['restaurants'].begin() as conn:
+            conn.execute(stmt)
+    except Exception as e:
+        # Cache persistente é só otimização: o LRU já tem o valor
+        print(f"[GEO] Falha ao gravar cache de geocodificação '{key}': {e}")
+
+nominatim_rate_limiter = TokenBucket(app.config['GEOCODE_RATE_PER_SEC'])
+
+def stub_geocode(query: str):
+    """Geocodificador local para testes: coordenadas estáveis na Grande São Paulo derivadas do texto."""
+    digest = hashlib.sha1(normalize_geocode_query(query).encode('utf-8')).digest()
+    lat = -23.55 + (int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF - 0.5) * 0.3
+    lon = -46.63 + (int.from_bytes(digest[4:8], 'big') / 0xFFFFFFFF - 0.5) * 0.3
+    return (round(lat, 6), round(lon, 6))
+
+def fetch_geocode(query: str, raise_errors: bool = False):
+    """Consulta o geocodificador sem cache. Retorna (lat, lon) ou None.
+
+    Com raise_errors=True, falhas transitórias levantam GeocodeUnavailable em vez de
+    retornar None, para que quem chama possa tentar de novo.
+    """
+    if not query:
+        return None
+    if app.config.get('GEOCODER_BACKEND') == 'stub':
+        return stub_geocode(query)
+    _count_geocode('remote_calls')
+    try:
+        nominatim_rate_limiter.acquire()
+        url = f"{app.config['NOMINATIM_URL']}/search"
         params = {"format": "json", "q": query, "countrycodes": "br"}
-        headers = {"User-Agent": "FoodDeliveryApp/1.0 (contato: dev@example.com)"}
-        resp = requests.get(url, params=params, headers=headers, timeout=8)
+        resp = requests.get(url, params=params, headers=NOMINATIM_HEADERS, timeout=8)
         if resp.status_code == 200:
             data = resp.json()
             if isinstance(data, list) and data:
                 lat = float(data[0].get("lat"))
                 lon = float(data[0].get("lon"))
                 return (lat, lon)
-    except Exception:
-        pass
+            return None
+        error = GeocodeUnavailable(f'HTTP {resp.status_code}')
+    except Exception as e:
+        error = GeocodeUnavailable(str(e))
+    _count_geocode('remote_failures')
+    if raise_errors:
+        raise error
     return None
 
-def reverse_geocode(lat: float, lon: float):
+def fetch_reverse_geocode(lat: float, lon: float):
+    """Reverse geocoding no Nominatim sem cache. Retorna dict de endereço ou None."""
+    if app.config.get('GEOCODER_BACKEND') == 'stub':
+        return {"street": "", "number": "", "neighborhood": "", "city": "São Paulo", "state": "SP", "zip_code": ""}
+    _count_geocode('remote_calls')
     try:
-        if lat is None or lon is None:
-            return None
-        url = "https://nominatim.openstreetmap.org/reverse"
+        nominatim_rate_limiter.acquire()
+        url = f"{app.config['NOMINATIM_URL']}/reverse"
         params = {"format": "json", "lat": str(lat), "lon": str(lon), "addressdetails": "1"}
-        headers = {"User-Agent": "FoodDeliveryApp/1.0 (contato: dev@example.com)"}
-        resp = requests.get(url, params=params, headers=headers, timeout=8)
+        resp = requests.get(url, params=params, headers=NOMINATIM_HEADERS, timeout=8)
         if resp.status_code == 200:
             data = resp.json()
             addr = data.get("address", {}) if isinstance(data, dict) else {}
@@ -147,8 +397,41 @@ def reverse_geocode(lat: float, lon: float):
             }
     except Exception:
         pass
+    _count_geocode('remote_failures')
     return None
 
+def geocode_address(query: str, raise_errors: bool = False):
+    """Obtém (lat, lon) via Nominatim para um endereço no Brasil (com cache)."""
+    key = normalize_geocode_query(query)
+    if not key:
+        return None
+    cached = _geocode_cache_lookup(key)
+    if cached is not _GEOCODE_MISS:
+        return tuple(cached) if cached else None
+    # Cache negativo só quando o geocodificador respondeu sem resultado; falhas transitórias (timeout,
+    # HTTP de erro) não são gravadas e sobem com raise_errors (a fila tenta de novo)
+    try:
+        coords = fetch_geocode(query, raise_errors=True)
+    except GeocodeUnavailable:
+        if raise_errors:
+            raise
+        return None
+    _geocode_cache_store(key, list(coords) if coords else None)
+    return coords
+
+def reverse_geocode(lat: float, lon: float):
+    if lat is None or lon is None:
+        return None
+    key = reverse_geocode_key(lat, lon)
+    cached = _geocode_cache_lookup(key)
+    if cached is not _GEOCODE_MISS:
+        return cached
+    data = fetch_reverse_geocode(lat, lon)
+    # None aqui é falha da consulta (uma resposta 200 sempre vira dict): não vira cache negativo
+    if data is not None:
+        _geocode_cache_store(key, data)
+    return data
+
 @app.route('/api/reverse-geocode')
 def api_reverse_geocode():
     try:
@@ -246,6 +529,20 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+def haversine_km_batch(lat: float, lon: float, lats, lons):
+    """Distâncias (km) de um ponto para vários pontos de uma vez.
+
+    Com NumPy faz uma única passada vetorizada e retorna um ndarray; sem NumPy
+    retorna uma lista calculada com haversine_km.
+    """
+    if not NUMPY_AVAILABLE:
+        return [haversine_km(lat, lon, la, lo) for la, lo in zip(lats, lons)]
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    phi1 = math.radians(lat)
+    a = np.sin((lats - phi1) / 2) ** 2 + math.cos(phi1) * np.cos(lats) * np.sin((lons - math.radians(lon)) / 2) ** 2
+    return 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
 # Utilitários de parse numérico
 def parse_float(s):
     if not s:
@@ -279,26 +576,478 @@ def validate_payment(method: str, total: float) -> bool:
         pass
     return False
 
-def get_restaurant_coords(restaurant):
+def refresh_restaurant_geo(restaurant, raise_errors=False):
+    """Regeocodifica o endereço do restaurante e atualiza RestaurantGeo (sem commit)."""
+    coords = geocode_address(restaurant.address, raise_errors=raise_errors) if restaurant.address else None
+    rec = RestaurantGeo.query.filter_by(restaurant_id=restaurant.id).first()
+    if coords:
+        if not rec:
+            rec = RestaurantGeo(restaurant_id=restaurant.id, lat=coords[0], lon=coords[1])
+            db.session.add(rec)
+        else:
+            rec.lat, rec.lon = coords
+    elif rec:
+        # Endereço mudou e não foi encontrado: coordenadas antigas não valem mais
+        db.session.delete(rec)
+    return coords
+
+# Índice espacial: R*Tree (restaurant_geo_rtree) espelhando restaurant_geo via triggers.
+# A busca "próximos a mim" faz um pré-filtro por bounding box no SQL e só calcula
+# Haversine exato para os candidatos dentro da caixa.
+# Busca textual: índices FTS5 restaurant_fts e menu_item_fts (migração 0004 do bind restaurants),
+# mantidos por triggers. Sem FTS5, as buscas caem no LIKE.
+# Pesos do bm25 por coluna: nome pesa mais que categoria, que pesa mais que endereço/descrição
+RESTAURANT_FTS_RANK = 'bm25(restaurant_fts, 10.0, 4.0, 2.0, 1.0)'
+MENU_ITEM_FTS_RANK = 'bm25(menu_item_fts, 10.0, 1.0, 4.0, 3.0, 2.0)'
+_search_index_state = {'available': None}
+
+def search_index_available():
+    if _search_index_state['available'] is None:
+        try:
+            found = db.session.execute(
+                text("SELECT count(*) FROM sqlite_master WHERE name IN ('restaurant_fts', 'menu_item_fts')"),
+                bind_arguments={'bind': db.engines['restaurants']}
+            ).scalar()
+            _search_index_state['available'] = found == 2
+        except Exception:
+            _search_index_state['available'] = False
+    return _search_index_state['available']
+
+def fts_match_query(q: str):
+    """Converte o texto digitado numa consulta FTS5: cada termo vira prefixo, todos obrigatórios."""
+    terms = re.findall(r'\w+', q or '', re.UNICODE)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def restaurant_search_subquery(q: str):
+    """Subquery (id, rank) dos restaurantes que casam com q, rank = bm25 (menor é melhor)."""
+    match = fts_match_query(q)
+    if not match or not search_index_available():
+        return None
+    return text(
+        f"SELECT rowid AS id, {RESTAURANT_FTS_RANK} AS rank FROM restaurant_fts WHERE restaurant_fts MATCH :match"
+    ).bindparams(match=match).columns(id=db.Integer, rank=db.Float).subquery('restaurant_search')
+
+def menu_item_search_subquery(q: str):
+    """Subquery (id, rank) dos itens de menu que casam com q (nome, descrição, categoria ou restaurante)."""
+    match = fts_match_query(q)
+    if not match or not search_index_available():
+        return None
+    return text(
+        f"SELECT rowid AS id, {MENU_ITEM_FTS_RANK} AS rank FROM menu_item_fts WHERE menu_item_fts MATCH :match"
+    ).bindparams(match=match).columns(id=db.Integer, rank=db.Float).subquery('menu_item_search')
+
+# Autocomplete: índice de prefixos em memória (lista ordenada + bisect) sobre nomes de
+# restaurantes, itens de menu e categorias. Mantido incrementalmente pelos eventos da sessão.
+SUGGEST_DEFAULT_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+SUGGEST_MAX_AGE = 5  # segundos de cache no navegador
+SUGGEST_KIND_ORDER = {'category': 0, 'restaurant': 1, 'product': 2}
+
+def normalize_search_text(value):
+    """Minúsculas e sem acentos, para "Açaí" casar com "acai"."""
+    value = unicodedata.normalize('NFKD', str(value or '').lower())
+    return ''.join(ch for ch in value if not unicodedata.combining(ch)).strip()
+
+class SuggestIndex:
+    """Entradas (chave, id) ordenadas, uma lista por tipo; cada palavra do nome gera uma chave,
+    então "pizza marg" e "marg" encontram "Pizza Margherita"."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {kind: [] for kind in SUGGEST_KIND_ORDER}
+        self._docs = {}  # (tipo, id) -> (label, extra, chaves)
+        self._categories = {}  # categoria normalizada -> [label, contagem de referências]
+        self._built = False
+        self._bulk = False
+        self.built_at = None
+
+    @staticmethod
+    def _keys_for(label):
+        words = normalize_search_text(label).split()
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def _insert_keys(self, kind, doc_id, keys):
+        entries = self._entries[kind]
+        for key in keys:
+            if self._bulk:
+                entries.append((key, doc_id))
+            else:
+                bisect.insort(entries, (key, doc_id))
+
+    def _remove_keys(self, kind, doc_id, keys):
+        entries = self._entries[kind]
+        for key in keys:
+            pos = bisect.bisect_left(entries, (key, doc_id))
+            if pos < len(entries) and entries[pos] == (key, doc_id):
+                del entries[pos]
+
+    def _add_category(self, category):
+        norm = normalize_search_text(category)
+        if not norm:
+            return
+        slot = self._categories.get(norm)
+        if slot:
+            slot[1] += 1
+            return
+        self._categories[norm] = [category.strip(), 1]
+        self._insert_keys('category', norm, self._keys_for(category))
+
+    def _release_category(self, category):
+        norm = normalize_search_text(category)
+        slot = self._categories.get(norm)
+        if not slot:
+            return
+        slot[1] -= 1
+        if slot[1] <= 0:
+            del self._categories[norm]
+            self._remove_keys('category', norm, self._keys_for(slot[0]))
+
+    def _upsert(self, kind, doc_id, label, category, extra=None):
+        self._discard(kind, doc_id)
+        if not label:
+            return
+        keys = self._keys_for(label)
+        self._docs[(kind, doc_id)] = (label, extra or {}, keys, category)
+        self._insert_keys(kind, doc_id, keys)
+        if category:
+            self._add_category(category)
+
+    def _discard(self, kind, doc_id):
+        doc = self._docs.pop((kind, doc_id), None)
+        if doc:
+            self._remove_keys(kind, doc_id, doc[2])
+            if doc[3]:
+                self._release_category(doc[3])
+
+    def rebuild(self):
+        restaurants = db.session.query(Restaurant.id, Restaurant.name, Restaurant.category).all()
+        items = db.session.query(MenuItem.id, MenuItem.name, MenuItem.category, MenuItem.restaurant_id).all()
+        self.load(restaurants, items)
+
+    def load(self, restaurants, items):
+        """Substitui o índice: restaurants = [(id, nome, categoria)], items = [(id, nome, categoria, restaurante_id)]."""
+        with self._lock:
+            self._entries = {kind: [] for kind in SUGGEST_KIND_ORDER}
+            self._docs, self._categories = {}, {}
+            # Na reconstrução completa acumula e ordena uma vez só, em vez de insort por chave
+            self._bulk = True
+            for rid, name, category in restaurants:
+                self._upsert('restaurant', rid, name, category)
+            for mid, name, category, restaurant_id in items:
+                self._upsert('product', mid, name, category, {'restaurant_id': restaurant_id})
+            self._bulk = False
+            for entries in self._entries.values():
+                entries.sort()
+            self._built = True
+            self.built_at = datetime.utcnow()
+
+    def ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+
+    def apply(self, changes):
+        """Aplica alterações confirmadas: {(tipo, id): None (removido) | (label, categoria, extra)}."""
+        with self._lock:
+            if not self._built:
+                return
+            for (kind, doc_id), value in changes.items():
+                if value is None:
+                    self._discard(kind, doc_id)
+                    if kind == 'restaurant':
+                        # Itens do restaurante são removidos em lote (query.delete), sem eventos por objeto
+                        orphans = [key for key, doc in self._docs.items()
+                                   if key[0] == 'product' and doc[1].get('restaurant_id') == doc_id]
+                        for orphan_kind, orphan_id in orphans:
+                            self._discard(orphan_kind, orphan_id)
+                else:
+                    label, category, extra = value
+                    self._upsert(kind, doc_id, label, category, extra)
+
+    def suggest(self, prefix, limit=SUGGEST_DEFAULT_LIMIT):
+        norm = ' '.join(normalize_search_text(prefix).split())
+        if not norm:
+            return []
+        # Categorias, depois restaurantes, depois produtos; dentro do tipo, nome começando pelo termo
+        # primeiro. Cada tipo varre a própria lista, então uma sequência densa de produtos não esconde
+        # categorias e restaurantes que ficam acima deles no ranking.
+        results = []
+        with self._lock:
+            for kind in sorted(SUGGEST_KIND_ORDER, key=SUGGEST_KIND_ORDER.get):
+                if len(results) >= limit:
+                    break
+                results.extend(self._scan(kind, norm, limit))
+        return results[:limit]
+
+    def _scan(self, kind, norm, limit):
+        entries = self._entries[kind]
+        found, seen = [], set()
+        pos = bisect.bisect_left(entries, (norm,))
+        # Limita a varredura para prefixos muito curtos ("p") não percorrerem o índice inteiro
+        scan_end = min(len(entries), pos + limit * 25)
+        while pos < scan_end:
+            key, doc_id = entries[pos]
+            if not key.startswith(norm):
+                break
+            pos += 1
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            if kind == 'category':
+                label, extra = self._categories[doc_id][0], {}
+            else:
+                label, extra = self._docs[(kind, doc_id)][:2]
+            found.append(dict(extra, type=kind, id=doc_id, label=label, exact=key == normalize_search_text(label)))
+        found.sort(key=lambda r: (not r.pop('exact'), r['label'].lower()))
+        return found[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self._built,
+                'built_at': self.built_at.isoformat() if self.built_at else None,
+                'entries': sum(len(entries) for entries in self._entries.values()),
+                'documents': len(self._docs),
+                'categories': len(self._categories),
+            }
+
+suggest_index = SuggestIndex()
+
+def _suggest_doc(obj):
+    if isinstance(obj, Restaurant):
+        return ('restaurant', obj.id), (obj.name, obj.category, None)
+    if isinstance(obj, MenuItem):
+        return ('product', obj.id), (obj.name, obj.category, {'restaurant_id': obj.restaurant_id})
+    return None, None
+
+@event.listens_for(OrmSession, 'after_flush')
+def _collect_suggest_changes(session, flush_context):
+    pending = session.info.setdefault('suggest_changes', {})
+    for obj in list(session.new) + list(session.dirty):
+        key, value = _suggest_doc(obj)
+        if key:
+            pending[key] = value
+    for obj in session.deleted:
+        key, _ = _suggest_doc(obj)
+        if key:
+            pending[key] = None
+
+@event.listens_for(OrmSession, 'after_commit')
+def _apply_suggest_changes(session):
+    changes = session.info.pop('suggest_changes', None)
+    if changes:
+        suggest_index.apply(changes)
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _discard_suggest_changes(session, previous_transaction):
+    session.info.pop('suggest_changes', None)
+
+@app.route('/api/search/suggest')
+def api_search_suggest():
+    q = (request.args.get('q') or '').strip()
     try:
-        if not restaurant or not restaurant.address:
-            return None
-        rec = RestaurantGeo.query.filter_by(restaurant_id=restaurant.id).first()
-        if rec:
-            return (rec.lat, rec.lon)
-        coords = geocode_address(restaurant.address)
-        if coords:
-            lat, lon = coords
+        limit = max(1, min(int(request.args.get('limit') or SUGGEST_DEFAULT_LIMIT), SUGGEST_MAX_LIMIT))
+    except ValueError:
+        limit = SUGGEST_DEFAULT_LIMIT
+    if not q:
+        return jsonify({'ok': True, 'q': q, 'suggestions': []})
+    suggest_index.ensure_built()
+    response = jsonify({'ok': True, 'q': q, 'suggestions': suggest_index.suggest(q, limit)})
+    # O índice acompanha cada commit do cardápio: só o próprio navegador guarda, e por poucos segundos,
+    # para não sugerir itens renomeados ou removidos
+    response.headers['Cache-Control'] = f'private, max-age={SUGGEST_MAX_AGE}'
+    return response
+
+def geo_bounding_box(lat: float, lon: float, radius_km: float):
+    """(min_lat, max_lat, min_lon, max_lon) que contém o círculo de raio radius_km."""
+    dlat = radius_km / 111.32
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    dlon = min(radius_km / (111.32 * cos_lat), 180.0)
+    return (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+
+def restaurants_within_radius(lat: float, lon: float, radius_km: float):
+    """{restaurant_id: distância_km} dos restaurantes geocodificados dentro do raio, do mais próximo ao mais distante."""
+    min_lat, max_lat, min_lon, max_lon = geo_bounding_box(lat, lon, radius_km)
+    params = {'min_lat': min_lat, 'max_lat': max_lat, 'min_lon': min_lon, 'max_lon': max_lon}
+    try:
+        rows = db.session.execute(text(
+            'SELECT g.restaurant_id, g.lat, g.lon FROM restaurant_geo_rtree t '
+            'JOIN restaurant_geo g ON g.restaurant_id = t.restaurant_id '
+            'WHERE t.max_lat >= :min_lat AND t.min_lat <= :max_lat '
+            'AND t.max_lon >= :min_lon AND t.min_lon <= :max_lon'
+        ), params, bind_arguments={'bind': db.engines['restaurants']}).all()
+    except Exception:
+        db.session.rollback()
+        rows = db.session.query(RestaurantGeo.restaurant_id, RestaurantGeo.lat, RestaurantGeo.lon).filter(
+            RestaurantGeo.lat.between(min_lat, max_lat),
+            RestaurantGeo.lon.between(min_lon, max_lon)
+        ).all()
+    if not rows:
+        return {}
+    ids, lats, lons = zip(*rows)
+    dists = haversine_km_batch(lat, lon, lats, lons)
+    if NUMPY_AVAILABLE:
+        order = np.argsort(dists, kind='stable')
+        return {ids[i]: float(dists[i]) for i in order if dists[i] <= radius_km}
+    distances = sorted((d, restaurant_id) for d, restaurant_id in zip(dists, ids) if d <= radius_km)
+    return {restaurant_id: d for d, restaurant_id in distances}
+
+def geocode_user_address(address, raise_errors=False):
+    """Geocodifica um UserAddress e grava lat/lon no próprio registro (sem commit)."""
+    coords = geocode_address(address.get_geocode_query(), raise_errors=raise_errors)
+    address.lat, address.lon = coords if coords else (None, None)
+    address.geocoded_at = datetime.utcnow()
+    return coords
+
+def default_address_query(user_id):
+    """Endereço padrão do usuário primeiro; sem padrão, o mais antigo."""
+    return UserAddress.query.filter_by(user_id=user_id).order_by(UserAddress.is_default.desc(), UserAddress.id.asc())
+
+def resolve_user_coords(user_lat=None, user_lon=None):
+    """Coordenadas do usuário: parâmetros da URL, sessão ou endereço padrão já geocodificado."""
+    if user_lat is not None and user_lon is not None:
+        return (user_lat, user_lon)
+    if session.get('user_lat') is not None and session.get('user_lon') is not None:
+        return (session.get('user_lat'), session.get('user_lon'))
+    if not current_user.is_authenticated:
+        return None
+    default_address = default_address_query(current_user.id).first()
+    if not default_address:
+        return None
+    if default_address.lat is not None and default_address.lon is not None:
+        return (default_address.lat, default_address.lon)
+    if default_address.geocoded_at is None:
+        # Ainda não geocodificado: agenda em segundo plano; próximas buscas já terão as coordenadas
+        geocode_queue.enqueue('address', default_address.id)
+    return None
+
+
+class GeocodeQueue:
+    """Fila de geocodificação em segundo plano para restaurantes e endereços.
+
+    Um único worker (thread daemon) consome jobs (tipo, id), respeita o token bucket
+    do Nominatim e reagenda falhas transitórias com backoff exponencial.
+    """
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._queue = Queue()
+        self._pending = set()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'enqueued': 0, 'processed': 0, 'retried': 0, 'failed': 0}
+
+    def enqueue(self, kind, obj_id):
+        """Agenda a geocodificação de um 'restaurant' ou 'address'; ignora jobs já pendentes."""
+        job = (kind, obj_id)
+        with self._lock:
+            if job in self._pending:
+                return False
+            self._pending.add(job)
+            self.stats['enqueued'] += 1
+        if not self.app.config.get('GEOCODE_QUEUE_ASYNC', True):
+            self._process(kind, obj_id, 0)
+            return True
+        self._ensure_worker()
+        self._queue.put((kind, obj_id, 0))
+        return True
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending) + self._in_flight
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, pending=len(self._pending) + self._in_flight)
+
+    def _count(self, name):
+        # O worker, os timers de retry e enqueue (modo síncrono) contam em threads diferentes
+        with self._lock:
+            self.stats[name] += 1
+
+    def join(self, timeout=None):
+        """Espera a fila esvaziar (útil para scripts e testes)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self.pending_count():
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='geocode-worker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                kind, obj_id, attempt = self._queue.get(timeout=60)
+            except Empty:
+                continue
             try:
-                rec = RestaurantGeo(restaurant_id=restaurant.id, lat=lat, lon=lon)
-                db.session.add(rec)
+                self._process(kind, obj_id, attempt)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, kind, obj_id, attempt):
+        # Sai de _pending antes de processar: uma edição feita durante o job agenda outro
+        with self._lock:
+            self._pending.discard((kind, obj_id))
+            self._in_flight += 1
+        try:
+            retry = self._geocode_job(kind, obj_id, attempt)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if retry:
+            self._count('retried')
+            delay = self.app.config['GEOCODE_RETRY_BACKOFF'] * (2 ** attempt)
+            with self._lock:
+                self._pending.add((kind, obj_id))
+            if self.app.config.get('GEOCODE_QUEUE_ASYNC', True):
+                timer = threading.Timer(delay, self._queue.put, args=((kind, obj_id, attempt + 1),))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._process(kind, obj_id, attempt + 1)
+
+    def _geocode_job(self, kind, obj_id, attempt):
+        """Executa um job; retorna True se deve ser reagendado."""
+        retry = False
+        with self.app.app_context():
+            try:
+                if kind == 'restaurant':
+                    restaurant = Restaurant.query.get(obj_id)
+                    if restaurant:
+                        refresh_restaurant_geo(restaurant, raise_errors=True)
+                elif kind == 'address':
+                    address = UserAddress.query.get(obj_id)
+                    if address:
+                        geocode_user_address(address, raise_errors=True)
                 db.session.commit()
-            except Exception:
+                self._count('processed')
+            except GeocodeUnavailable as e:
                 db.session.rollback()
-            return coords
-    except Exception:
-        pass
-    return None
+                retry = attempt + 1 < self.app.config['GEOCODE_MAX_RETRIES']
+                if not retry:
+                    self._count('failed')
+                    print(f"[GEO] Desistindo de geocodificar {kind} {obj_id}: {e}")
+            except Exception as e:
+                db.session.rollback()
+                self._count('failed')
+                print(f"[GEO] Erro ao geocodificar {kind} {obj_id}: {e}")
+        return retry
+
+
+geocode_queue = GeocodeQueue(app)
 
 # Configuração dos blueprints OAuth
 if OAUTH_AVAILABLE:
@@ -388,6 +1137,13 @@ class Restaurant(db.Model):
     phone = db.Column('telefone', db.String(20))
     image_url = db.Column('url_imagem', db.String(200))
     items = db.relationship('MenuItem', backref='restaurant', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_restaurant_categoria_nome', 'categoria', 'nome'),
+        db.Index('ix_restaurant_id_dono', 'id_dono'),
+        db.Index('ix_restaurant_nome', 'nome'),
+        # + índices de expressão das ordenações com coalesce (migração 0010)
+    )
     
     def __repr__(self):
         return f'<Restaurant {self.name}>'
@@ -404,6 +1160,15 @@ class MenuItem(db.Model):
     image_url = db.Column('url_imagem', db.String(200))
     category = db.Column('categoria', db.String(50))
     available = db.Column('disponivel', db.Boolean, default=True)
+
+    # Cardápio do restaurante: filtro por restaurante + ordenação por categoria/nome ou preço
+    __table_args__ = (
+        db.Index('ix_menu_item_restaurante_categoria_nome', 'restaurante_id', 'categoria', 'nome'),
+        db.Index('ix_menu_item_restaurante_preco', 'restaurante_id', 'preco'),
+        db.Index('ix_menu_item_categoria', 'categoria'),
+        db.Index('ix_menu_item_preco', 'preco'),
+        db.Index('ix_menu_item_nome', 'nome'),
+    )
     
     def __repr__(self):
         return f'<MenuItem {self.name}>'
@@ -417,15 +1182,38 @@ class Cart(db.Model):
     restaurant_id = db.Column('restaurante_id', db.Integer, db.ForeignKey('restaurant.id'), nullable=False)
     created_at = db.Column('criado_em', db.DateTime, default=datetime.utcnow)
     updated_at = db.Column('atualizado_em', db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Totais mantidos a cada alteração de item (apply_delta), para não carregar self.items
+    item_count = db.Column('quantidade_itens', db.Integer, nullable=False, default=0)
+    subtotal = db.Column('subtotal', db.Float, nullable=False, default=0.0)
     items = db.relationship('CartItem', backref='cart', lazy=True, cascade='all, delete-orphan')
     
     restaurant = db.relationship('Restaurant', backref=db.backref('carts', lazy=True))
+
+    # Carrinho mais recente do usuário e carrinho do usuário em um restaurante (único: alvo do upsert)
+    __table_args__ = (
+        db.Index('ix_cart_usuario_atualizado', 'usuario_id', 'atualizado_em'),
+        db.Index('ix_cart_usuario_restaurante', 'usuario_id', 'restaurante_id', unique=True),
+    )
     
     def get_total(self):
-        return sum(item.get_subtotal() for item in self.items)
+        return round(self.subtotal or 0.0, 2)
     
     def get_item_count(self):
-        return sum(item.quantity for item in self.items)
+        return self.item_count or 0
+    
+    def apply_delta(self, quantity, amount):
+        """Soma ``quantity`` itens e ``amount`` reais aos totais, no mesmo commit da alteração do item.
+
+        Num carrinho já gravado vira um UPDATE relativo (quantidade_itens = quantidade_itens + n), então
+        requisições simultâneas não sobrescrevem os totais umas das outras.
+        """
+        if self.id is None:
+            self.item_count = (self.item_count or 0) + quantity
+            self.subtotal = (self.subtotal or 0.0) + amount
+        else:
+            self.item_count = Cart.item_count + quantity
+            self.subtotal = Cart.subtotal + amount
+        self.updated_at = datetime.utcnow()
     
     def __repr__(self):
         return f'<Cart {self.id} - User {self.user_id}>'
@@ -441,12 +1229,17 @@ class CartItem(db.Model):
     price = db.Column('preco', db.Float, nullable=False)  # Preço no momento da adição
     
     menu_item = db.relationship('MenuItem', backref='cart_items')
+
+    __table_args__ = (
+        db.Index('ix_cart_item_carrinho_item', 'carrinho_id', 'item_menu_id', unique=True),
+        db.Index('ix_cart_item_item_menu', 'item_menu_id'),
+    )
     
     def get_subtotal(self):
         return self.quantity * self.price
     
     def __repr__(self):
-        return f'<CartItem {self.menu_item.name} x{self.quantity}>'
+        return f'<CartItem {self.menu_item_id} x{self.quantity}>'
 
 class RestaurantGeo(db.Model):
     __bind_key__ = 'restaurants'
@@ -459,6 +1252,20 @@ class RestaurantGeo(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     restaurant = db.relationship('Restaurant', backref=db.backref('geo_record', uselist=False))
 
+# GeocodeCache: resultados do Nominatim (positivos e negativos) com expiração
+class GeocodeCache(db.Model):
+    __bind_key__ = 'restaurants'
+    __tablename__ = 'geocode_cache'
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column('chave', db.String(300), unique=True, nullable=False)
+    found = db.Column('encontrado', db.Boolean, nullable=False, default=False)
+    payload = db.Column('dados', db.Text)  # JSON: [lat, lon] ou dict de endereço (reverse)
+    expires_at = db.Column('expira_em', db.DateTime, nullable=False)
+    created_at = db.Column('criado_em', db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<GeocodeCache {self.key}>'
+
 # Order: pedido com status, total e endereço; criado em created_at e possui itens (OrderItem)
 class UserAddress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -474,8 +1281,16 @@ class UserAddress(db.Model):
     reference = db.Column('referencia', db.String(200))  # Ponto de referência
     is_default = db.Column('padrao', db.Boolean, default=False)
     created_at = db.Column('criado_em', db.DateTime, default=datetime.utcnow)
+    # Coordenadas pré-calculadas (preenchidas ao salvar o endereço ou pelo comando backfill-address-geo)
+    lat = db.Column('latitude', db.Float)
+    lon = db.Column('longitude', db.Float)
+    geocoded_at = db.Column('geocodificado_em', db.DateTime)
     
     user = db.relationship('User', backref=db.backref('addresses', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_user_address_usuario_padrao_id', 'usuario_id', db.text('padrao DESC'), 'id'),
+    )
     
     def __repr__(self):
         return f'<UserAddress {self.name} - {self.user.name}>'
@@ -490,6 +1305,10 @@ class UserAddress(db.Model):
             f"CEP: {self.zip_code}"
         ]
         return ", ".join([part for part in address_parts if part])
+    
+    def get_geocode_query(self):
+        """Texto enviado ao geocodificador para este endereço"""
+        return f"{self.street}, {self.number} - {self.neighborhood}, {self.city} - {self.state}, {self.zip_code}, Brasil"
 
 class Order(db.Model):
     __bind_key__ = 'restaurants'
@@ -504,9 +1323,18 @@ class Order(db.Model):
     payment_method = db.Column('metodo_pagamento', db.String(50), nullable=False)  # credit_card, debit_card, pix, cash
     notes = db.Column('observacoes', db.Text)  # Observações do pedido
     created_at = db.Column('criado_em', db.DateTime, default=datetime.utcnow)
+    # Enviada pelo cliente no checkout; reenvios com a mesma chave reaproveitam o pedido
+    idempotency_key = db.Column('chave_idempotencia', db.String(64))
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     
     restaurant = db.relationship('Restaurant', backref=db.backref('restaurant_orders', lazy=True))
+
+    # Meus pedidos (usuário) e painel do restaurante, ambos ordenados por criado_em desc
+    __table_args__ = (
+        db.Index('ix_order_usuario_criado', 'usuario_id', 'criado_em'),
+        db.Index('ix_order_restaurante_criado', 'restaurante_id', 'criado_em'),
+        db.Index('ix_order_usuario_chave', 'usuario_id', 'chave_idempotencia', unique=True),
+    )
     
     def get_status_display(self):
         status_map = {
@@ -519,6 +1347,13 @@ class Order(db.Model):
             'cancelled': 'Cancelado'
         }
         return status_map.get(self.status, self.status)
+
+    def get_eta_time(self):
+        try:
+            mins = (self.restaurant.delivery_time or 0)
+            return datetime.fromtimestamp(self.created_at.timestamp() + mins * 60)
+        except Exception:
+            return self.created_at
     
     def __repr__(self):
         return f'<Order {self.id} - {self.status}>'
@@ -533,6 +1368,10 @@ class OrderItem(db.Model):
     
     # Relacionamento para acessar o MenuItem diretamente nos templates (item.menu_item)
     menu_item = db.relationship('MenuItem', backref='order_items')
+
+    __table_args__ = (
+        db.Index('ix_order_item_pedido', 'pedido_id'),
+    )
     
     def __repr__(self):
         return f'<OrderItem {self.id}>'
@@ -573,6 +1412,548 @@ class ProductFavorite(db.Model):
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+# Referências entre bancos: pedidos (restaurante.db) apontam para User/UserAddress (cliente.db), sem
+# join possível. As views juntam os ids da página e resolvem tudo com um IN por modelo; o resultado
+# fica num mapa de identidade da requisição (flask.g), reaproveitado por quem renderizar depois.
+class CrossBindLoader:
+    def __init__(self):
+        self._loaded = {}   # modelo -> {id: objeto, ou None se não existe}
+        self._pending = {}  # modelo -> ids ainda não consultados
+
+    def add(self, model, obj):
+        if obj is not None:
+            self._loaded.setdefault(model, {})[obj.id] = obj
+
+    def want(self, model, ids):
+        """Agenda ids para a próxima consulta do modelo (nada é lido ainda)."""
+        loaded = self._loaded.get(model, {})
+        pending = self._pending.setdefault(model, set())
+        pending.update(i for i in ids if i is not None and i not in loaded)
+        return self
+
+    def want_orders(self, orders):
+        """Clientes e endereços de entrega de uma lista de pedidos."""
+        self.want(User, [o.user_id for o in orders])
+        return self.want(UserAddress, [o.address_id for o in orders])
+
+    def _resolve(self, model):
+        ids = self._pending.pop(model, None)
+        if not ids:
+            return
+        loaded = self._loaded.setdefault(model, {})
+        found = {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+        for i in ids:
+            loaded[i] = found.get(i)
+
+    def get(self, model, obj_id):
+        if obj_id is None:
+            return None
+        self.want(model, [obj_id])
+        self._resolve(model)
+        return self._loaded[model].get(obj_id)
+
+    def map(self, model, ids):
+        """{id: objeto} dos ids encontrados; ids agendados antes entram na mesma consulta."""
+        ids = [i for i in ids if i is not None]
+        self.want(model, ids)
+        self._resolve(model)
+        loaded = self._loaded.get(model, {})
+        return {i: loaded[i] for i in ids if loaded.get(i) is not None}
+
+def cross_bind():
+    """Loader da requisição atual; já conhece o usuário logado."""
+    if 'cross_bind' not in g:
+        g.cross_bind = CrossBindLoader()
+        if current_user.is_authenticated:
+            g.cross_bind.add(User, current_user._get_current_object())
+    return g.cross_bind
+
+# Paginação por cursor (keyset): cada página continua a partir dos valores de ordenação da última
+# linha vista, então o custo não cresce com a profundidade e inserções não duplicam/pulam itens.
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+def parse_page_size(raw, default=PAGE_SIZE):
+    try:
+        return max(1, min(int(raw), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+def _cursor_value(value):
+    return {'$dt': value.isoformat()} if isinstance(value, datetime) else value
+
+def _cursor_load(value):
+    return datetime.fromisoformat(value['$dt']) if isinstance(value, dict) and '$dt' in value else value
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Cursor opaco -> dict; None se ausente ou inválido (volta para a primeira página)."""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return payload if isinstance(payload, dict) else None
+    except (ValueError, TypeError):
+        return None
+
+class KeysetKey:
+    """Coluna de ordenação: expressão SQL, direção e como ler o mesmo valor de uma linha do resultado.
+
+    A última chave precisa ser única (id) para desempatar.
+    """
+    def __init__(self, expr, getter, desc=False):
+        self.expr = expr
+        self.getter = getter
+        self.desc = desc
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None, limit=PAGE_SIZE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.limit = limit
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _url(self, cursor):
+        if not cursor:
+            return None
+        args = request.args.to_dict()
+        args['cursor'] = cursor
+        return url_for(request.endpoint, **dict(request.view_args or {}, **args))
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor)
+
+    @property
+    def prev_url(self):
+        return self._url(self.prev_cursor)
+
+def _keyset_condition(keys, values, forward):
+    clauses = []
+    for i, key in enumerate(keys):
+        after = (key.expr < values[i]) if key.desc == forward else (key.expr > values[i])
+        clauses.append(db.and_(*[keys[j].expr == values[j] for j in range(i)], after))
+    return db.or_(*clauses)
+
+def _cursor_state(state, keys, signature):
+    """Valida o cursor decodificado contra a ordenação atual; adulterado ou antigo -> None (primeira página)."""
+    if not state or state.get('s') != signature:
+        return None
+    if keys is None:
+        offset, history = state.get('o'), state.get('h', [])
+        if type(offset) is not int or offset < 0:
+            return None
+        if not isinstance(history, list) or not all(type(h) is int and 0 <= h < offset for h in history):
+            return None
+        return state
+    values = state.get('v')
+    if not isinstance(values, list) or len(values) != len(keys) or state.get('d', 'n') not in ('n', 'p'):
+        return None
+    try:
+        loaded = [_cursor_load(v) for v in values]
+    except (TypeError, ValueError):
+        return None
+    if not all(v is None or isinstance(v, (str, int, float, datetime)) for v in loaded):
+        return None
+    return dict(state, v=loaded)
+
+# Páginas guardadas no cursor de deslocamento para o link "anterior" (com filtro as páginas não têm
+# tamanho fixo em linhas SQL)
+OFFSET_CURSOR_HISTORY = 20
+
+def _offset_paginate(query, state, limit, signature, rows_filter=None):
+    """Paginação por deslocamento; o cursor guarda a posição SQL da próxima linha não exibida."""
+    offset = state['o'] if state else 0
+    history = state.get('h', []) if state else []
+    rows, positions = [], []
+    sql_offset, exhausted = offset, False
+    batch = limit + 1
+    while len(rows) <= limit and not exhausted:
+        fetched = query.offset(sql_offset).limit(batch).all()
+        exhausted = len(fetched) < batch
+        kept = {id(row) for row in rows_filter(fetched)} if rows_filter else None
+        for i, row in enumerate(fetched):
+            if kept is None or id(row) in kept:
+                rows.append(row)
+                positions.append(sql_offset + i)
+        sql_offset += len(fetched)
+        batch = (limit + 1) * 4  # filtro descartando muito: lê blocos maiores
+
+    next_cursor = prev_cursor = None
+    if len(rows) > limit:
+        next_history = (history + [offset])[-OFFSET_CURSOR_HISTORY:]
+        next_cursor = encode_cursor({'s': signature, 'o': positions[limit], 'h': next_history})
+    if offset > 0:
+        if history:
+            prev_cursor = encode_cursor({'s': signature, 'o': history[-1], 'h': history[:-1]})
+        else:
+            prev_cursor = encode_cursor({'s': signature, 'o': max(0, offset - limit)})
+    return KeysetPage(rows[:limit], next_cursor, prev_cursor, limit)
+
+def keyset_page_query(query, keys, values=None, forward=True):
+    """``query`` na ordem de ``keys`` (invertida para trás) e, com ``values``, a partir dessa posição; sem LIMIT."""
+    ordering = [k.expr.desc() if k.desc == forward else k.expr.asc() for k in keys]
+    base = query.order_by(None).order_by(*ordering)
+    return base if values is None else base.filter(_keyset_condition(keys, values, forward))
+
+def keyset_paginate(query, keys, cursor=None, limit=PAGE_SIZE, signature='', rows_filter=None):
+    """Uma página de ``query`` ordenada por ``keys``.
+
+    ``signature`` identifica a ordenação: cursor gerado com outra ordenação é ignorado.
+    ``keys=None`` usa deslocamento (para ordenações sem chave estável, como relevância).
+    ``rows_filter(rows) -> rows`` descarta linhas depois do SQL (ex.: raio exato); a página é
+    completada com novas leituras a partir da última linha lida.
+    """
+    state = _cursor_state(decode_cursor(cursor), keys, signature)
+    if keys is None:
+        return _offset_paginate(query, state, limit, signature, rows_filter)
+
+    forward = not state or state.get('d') != 'p'
+    values = state['v'] if state else None
+
+    rows, last_values, exhausted = [], values, False
+    batch = limit + 1
+    while len(rows) <= limit and not exhausted:
+        fetched = keyset_page_query(query, keys, last_values, forward).limit(batch).all()
+        exhausted = len(fetched) < batch
+        if fetched:
+            last_values = [k.getter(fetched[-1]) for k in keys]
+        rows.extend(rows_filter(fetched) if rows_filter else fetched)
+        batch = (limit + 1) * 4  # filtro descartando muito: lê blocos maiores
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+
+    def cursor_for(row, direction):
+        return encode_cursor({'s': signature, 'd': direction, 'v': [_cursor_value(k.getter(row)) for k in keys]})
+
+    has_next = has_more if forward else True
+    has_prev = bool(state) if forward else has_more
+    next_cursor = cursor_for(rows[-1], 'n') if rows and has_next else None
+    prev_cursor = cursor_for(rows[0], 'p') if rows and has_prev else None
+    return KeysetPage(rows, next_cursor, prev_cursor, limit)
+
+def order_sort_keys():
+    """Pedidos mais recentes primeiro (usa os índices (usuario_id|restaurante_id, criado_em))."""
+    return [KeysetKey(Order.created_at, lambda o: o.created_at, desc=True), KeysetKey(Order.id, lambda o: o.id, desc=True)]
+
+def order_query():
+    """Order já com itens, produtos e restaurante: uma consulta a mais para os itens (selectin, com o
+    produto em join) em vez de um lazy load por pedido/item nos templates."""
+    return Order.query.options(
+        selectinload(Order.items).joinedload(OrderItem.menu_item),
+        joinedload(Order.restaurant),
+    )
+
+def restaurant_sort_keys(sort_by):
+    """Chaves keyset das ordenações de restaurantes; NULL entra como o pior valor da ordenação.
+
+    O valor do coalesce vai como literal no SQL (não parâmetro) para casar com os índices de expressão
+    da migração 0010.
+    """
+    tiebreak = KeysetKey(Restaurant.id, lambda r: r.id)
+    if sort_by == 'rating':
+        return [KeysetKey(db.func.coalesce(Restaurant.rating, db.literal_column('0.0')), lambda r: r.rating if r.rating is not None else 0.0, desc=True), tiebreak]
+    if sort_by == 'delivery_time':
+        return [KeysetKey(db.func.coalesce(Restaurant.delivery_time, db.literal_column('2147483648')), lambda r: r.delivery_time if r.delivery_time is not None else 2 ** 31), tiebreak]
+    if sort_by == 'delivery_fee':
+        return [KeysetKey(db.func.coalesce(Restaurant.delivery_fee, db.literal_column('1000000000.0')), lambda r: r.delivery_fee if r.delivery_fee is not None else 1e9), tiebreak]
+    return [KeysetKey(Restaurant.name, lambda r: r.name), tiebreak]
+
+def product_sort_keys(sort_by):
+    """Chaves keyset de /products; as linhas são (MenuItem, Restaurant, ...).
+
+    O desempate por id segue a direção do preço para a página sair de ix_menu_item_preco sem sort.
+    """
+    item_id_key = KeysetKey(MenuItem.id, lambda row: row[0].id)
+    if sort_by == 'price_asc':
+        return [KeysetKey(MenuItem.price, lambda row: row[0].price), item_id_key]
+    if sort_by == 'price_desc':
+        return [KeysetKey(MenuItem.price, lambda row: row[0].price, desc=True),
+                KeysetKey(MenuItem.id, lambda row: row[0].id, desc=True)]
+    return [KeysetKey(MenuItem.name, lambda row: row[0].name), item_id_key]
+
+def product_list_query():
+    """Base de /products: item com o restaurante no mesmo SELECT."""
+    return db.session.query(MenuItem, Restaurant).join(Restaurant, MenuItem.restaurant_id == Restaurant.id)
+
+# GET condicional do catálogo: catalog_version (migração v0006) guarda uma versão por restaurante e a
+# linha 0 para o catálogo inteiro, incrementadas por triggers em restaurant/menu_item. A ETag sai só
+# dessa versão, então uma resposta inalterada vira 304 com uma única consulta pela chave primária.
+CATALOG_SCOPE = 0
+def _etag_salt():
+    """APP_VERSION, ou um hash do código e dos templates: igual em todos os workers e reinícios, e
+    diferente quando um deploy muda o que é renderizado (ETags antigas deixam de valer)."""
+    if os.getenv('APP_VERSION'):
+        return os.getenv('APP_VERSION')
+    digest = hashlib.sha1()
+    root = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.path.abspath(__file__)]
+    for folder, _, files in sorted(os.walk(os.path.join(root, 'templates'))):
+        paths.extend(os.path.join(folder, name) for name in sorted(files))
+    for path in paths:
+        digest.update(os.path.relpath(path, root).encode('utf-8'))
+        with open(path, 'rb') as fh:
+            digest.update(fh.read())
+    return digest.hexdigest()[:16]
+
+ETAG_SALT = _etag_salt()
+
+def catalog_version(restaurant_id=CATALOG_SCOPE):
+    """(versão, atualizado_em) do restaurante (ou do catálogo, com 0); (0, None) se não houver registro."""
+    row = db.session.execute(
+        text("SELECT versao, atualizado_em FROM catalog_version WHERE restaurante_id = :rid"),
+        {'rid': restaurant_id},
+        bind_arguments={'bind': db.engines['restaurants']},
+    ).first()
+    if not row:
+        return 0, None
+    updated_at = row[1]
+    if isinstance(updated_at, str):
+        try:
+            updated_at = datetime.strptime(updated_at[:19], '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            updated_at = None
+    return row[0], updated_at
+
+def conditional_catalog_get(scope=None, private=False):
+    """Decora um GET do catálogo com ETag forte/Last-Modified e responde 304 antes de rodar a view.
+
+    ``scope`` recebe os argumentos da rota e devolve o id do restaurante (None = catálogo inteiro).
+    A variante inclui a URL completa, o formato negociado e, em páginas HTML (``private``), o usuário
+    logado, porque o layout muda com ele.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Mensagens flash pendentes são consumidas pela renderização: não dá para responder 304
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            rid = scope(**kwargs) if scope else CATALOG_SCOPE
+            version, updated_at = catalog_version(rid)
+            if not version:
+                return view(*args, **kwargs)
+            user_key = (current_user.get_id() if current_user.is_authenticated else '-') if private else ''
+            variant = '|'.join([ETAG_SALT, str(rid), str(version), request.full_path,
+                                'ndjson' if wants_ndjson() else '', user_key or ''])
+            etag = hashlib.sha1(variant.encode('utf-8')).hexdigest()
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                # If-Modified-Since só vale sem If-None-Match; a precisão do cabeçalho é de segundos
+                since = request.if_modified_since
+                not_modified = bool(since and updated_at and updated_at <= since.replace(tzinfo=None))
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if updated_at:
+                response.last_modified = updated_at
+            # no-cache: o cliente pode guardar, mas revalida sempre (barato graças ao 304)
+            response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+            if private:
+                response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+# Cache de cardápios: cada restaurante vira um MenuSnapshot (colunas em arrays/tuplas + as quatro
+# ordenações pré-calculadas) guardado junto da versão do catálogo com que foi montado. Filtros e
+# ordenação rodam em memória; uma versão nova (trigger em menu_item/restaurant) força a remontagem.
+MENU_CACHE_MAX_RESTAURANTS = int(os.getenv('MENU_CACHE_MAX_RESTAURANTS', '256'))
+MENU_CACHE_MAX_ITEMS = int(os.getenv('MENU_CACHE_MAX_ITEMS', '50000'))
+
+MenuItemRow = namedtuple('MenuItemRow', 'id restaurant_id name description price image image_url category available')
+
+class MenuSnapshot:
+    """Itens de um restaurante em colunas paralelas; ``select`` devolve MenuItemRow já filtrados e ordenados."""
+
+    SORTS = ('name', 'price_asc', 'price_desc', 'category')
+
+    def __init__(self, restaurant_id, version, rows):
+        self.restaurant_id = restaurant_id
+        self.version = version
+        self.ids = array('q', (r.id for r in rows))
+        self.names = tuple(r.name or '' for r in rows)
+        self.descriptions = tuple(r.description for r in rows)
+        self.prices = array('d', (float(r.price or 0.0) for r in rows))
+        self.images = tuple(r.image for r in rows)
+        self.image_urls = tuple(r.image_url for r in rows)
+        self.categories = tuple(r.category for r in rows)
+        self.available = bytes(1 if r.available else 0 for r in rows)
+        ids, names, prices, categories = self.ids, self.names, self.prices, self.categories
+        positions = range(len(ids))
+        # Mesmas ordenações das consultas antigas; o id desempata para a ordem ser estável
+        self.orders = {
+            'name': array('l', sorted(positions, key=lambda i: (names[i], ids[i]))),
+            'price_asc': array('l', sorted(positions, key=lambda i: (prices[i], ids[i]))),
+            'price_desc': array('l', sorted(positions, key=lambda i: (-prices[i], ids[i]))),
+            # NULL primeiro, como no ORDER BY categoria ASC do SQLite
+            'category': array('l', sorted(positions, key=lambda i: (categories[i] is not None, categories[i] or '', names[i], ids[i]))),
+        }
+        self.category_names = sorted({c for c in categories if c})
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, i):
+        return MenuItemRow(self.ids[i], self.restaurant_id, self.names[i], self.descriptions[i], self.prices[i],
+                           self.images[i], self.image_urls[i], self.categories[i], bool(self.available[i]))
+
+    def select(self, category=None, min_price=None, max_price=None, available_only=False, sort_by='name', limit=None):
+        order = self.orders.get(sort_by) or self.orders['name']
+        items = []
+        for i in order:
+            if category and self.categories[i] != category:
+                continue
+            if min_price is not None and self.prices[i] < min_price:
+                continue
+            if max_price is not None and self.prices[i] > max_price:
+                continue
+            if available_only and not self.available[i]:
+                continue
+            items.append(self.row(i))
+            if limit and len(items) >= limit:
+                break
+        return items
+
+def menu_snapshot_query(restaurant_id):
+    """Colunas do cardápio inteiro de um restaurante; filtros e ordenações rodam sobre o snapshot."""
+    return (db.select(MenuItem.id, MenuItem.name, MenuItem.description, MenuItem.price, MenuItem.image,
+                      MenuItem.image_url, MenuItem.category, MenuItem.available)
+            .where(MenuItem.restaurant_id == restaurant_id))
+
+class MenuCache:
+    """LRU de MenuSnapshot por restaurante, válido só para a versão do catálogo em que foi montado."""
+
+    def __init__(self, max_restaurants=MENU_CACHE_MAX_RESTAURANTS, max_items=MENU_CACHE_MAX_ITEMS):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # restaurante_id -> MenuSnapshot
+        self._items = 0
+        self.max_restaurants = max_restaurants
+        self.max_items = max_items
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, restaurant_id):
+        # A versão é lida antes dos itens: se um write entrar no meio, o snapshot fica com a versão
+        # antiga e é remontado na próxima requisição (nunca o contrário)
+        version, _ = catalog_version(restaurant_id)
+        with self._lock:
+            snapshot = self._entries.get(restaurant_id)
+            if snapshot is not None and snapshot.version == version:
+                self._entries.move_to_end(restaurant_id)
+                self.stats['hits'] += 1
+                return snapshot
+            self.stats['misses'] += 1
+        rows = db.session.execute(menu_snapshot_query(restaurant_id)).all()
+        snapshot = MenuSnapshot(restaurant_id, version, rows)
+        with self._lock:
+            self._discard(restaurant_id)
+            self._entries[restaurant_id] = snapshot
+            self._items += len(snapshot)
+            while len(self._entries) > 1 and (len(self._entries) > self.max_restaurants or self._items > self.max_items):
+                self._discard(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+        return snapshot
+
+    def _discard(self, restaurant_id):
+        snapshot = self._entries.pop(restaurant_id, None)
+        if snapshot is not None:
+            self._items -= len(snapshot)
+
+    def invalidate(self, restaurant_id=None):
+        with self._lock:
+            if restaurant_id is None:
+                self._entries.clear()
+                self._items = 0
+            else:
+                self._discard(restaurant_id)
+            self.stats['invalidations'] += 1
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, restaurants=len(self._entries), items=self._items,
+                        max_restaurants=self.max_restaurants, max_items=self.max_items)
+
+menu_cache = MenuCache()
+
+# Facetas de categoria para os chips das listagens: nome, quantos resultados do filtro atual caem
+# na categoria (count) e quantos existem no catálogo (total). Os totais ficam em cache pela versão
+# do catálogo (linha 0 de catalog_version); só há consulta extra quando algum filtro está ativo.
+Facet = namedtuple('Facet', 'name count total')
+
+class CategoryFacets:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}  # tipo -> (versão, OrderedDict categoria -> total)
+
+    @staticmethod
+    def _column(kind):
+        return Restaurant.category if kind == 'restaurants' else MenuItem.category
+
+    def totals(self, kind):
+        """OrderedDict categoria -> quantidade de restaurantes ('restaurants') ou itens ('menu_items')."""
+        version, _ = catalog_version()
+        with self._lock:
+            cached = self._totals.get(kind)
+        if cached and cached[0] == version:
+            return cached[1]
+        column = self._column(kind)
+        rows = db.session.execute(
+            db.select(column, db.func.count()).where(column.isnot(None), column != '').group_by(column).order_by(column)
+        ).all()
+        totals = OrderedDict((name, count) for name, count in rows)
+        with self._lock:
+            self._totals[kind] = (version, totals)
+        return totals
+
+    def chips(self, kind, query=None, counts=None):
+        """Facetas de ``kind``; ``query`` é a consulta filtrada da view, ainda sem o filtro de categoria.
+
+        Sem ``query`` nem ``counts`` as contagens são os próprios totais (nenhum filtro ativo).
+        """
+        totals = self.totals(kind)
+        if counts is None and query is not None:
+            column = self._column(kind)
+            counts = dict(query.order_by(None).with_entities(column, db.func.count()).group_by(column).all())
+        if counts is None:
+            counts = totals
+        return [Facet(name, counts.get(name, 0), total) for name, total in totals.items()]
+
+    @staticmethod
+    def menu_chips(menu, min_price=None, max_price=None, available_only=False):
+        """Facetas do cardápio de um restaurante, contadas em memória sobre o MenuSnapshot."""
+        totals, counts = {}, {}
+        for i, name in enumerate(menu.categories):
+            if not name:
+                continue
+            totals[name] = totals.get(name, 0) + 1
+            price = menu.prices[i]
+            if (min_price is None or price >= min_price) and (max_price is None or price <= max_price) \
+                    and (not available_only or menu.available[i]):
+                counts[name] = counts.get(name, 0) + 1
+        return [Facet(name, counts.get(name, 0), totals[name]) for name in menu.category_names]
+
+    def invalidate(self):
+        with self._lock:
+            self._totals.clear()
+
+category_facets = CategoryFacets()
+
 # Rotas
 @app.route('/')
 def index():
@@ -580,11 +1961,15 @@ def index():
     category = request.args.get('category', '').strip()
     query = Restaurant.query
     if q:
-        query = query.filter(
-            (Restaurant.name.ilike(f"%{q}%")) |
-            (Restaurant.category.ilike(f"%{q}%")) |
-            (Restaurant.address.ilike(f"%{q}%"))
-        )
+        search = restaurant_search_subquery(q)
+        if search is not None:
+            query = query.join(search, Restaurant.id == search.c.id).order_by(search.c.rank)
+        else:
+            query = query.filter(
+                (Restaurant.name.ilike(f"%{q}%")) |
+                (Restaurant.category.ilike(f"%{q}%")) |
+                (Restaurant.address.ilike(f"%{q}%"))
+            )
     if category:
         query = query.filter(Restaurant.category == category)
     restaurants = query.all()
@@ -706,12 +2091,6 @@ def send_email_code(to_email, code):
         print(f"[SIMULAÇÃO] Código {code} para {to_email} via email")
         return False
 
-    def get_eta_time(self):
-        try:
-            mins = (self.restaurant.delivery_time or 0)
-            return datetime.fromtimestamp(self.created_at.timestamp() + mins * 60)
-        except Exception:
-            return self.created_at
     msg_em = EmailMessage()
     msg_em['Subject'] = 'Seu código de verificação'
     msg_em['From'] = from_email
@@ -1418,6 +2797,7 @@ def facebook_login():
     return redirect(url_for('login'))
 
 @app.route('/restaurant/<int:restaurant_id>')
+@conditional_catalog_get(scope=lambda restaurant_id: restaurant_id, private=True)
 def restaurant(restaurant_id):
     restaurant = Restaurant.query.get_or_404(restaurant_id)
     
@@ -1428,38 +2808,14 @@ def restaurant(restaurant_id):
     available_only = request.args.get('available', '').strip() == 'true'
     sort_by = request.args.get('sort', 'name')  # name, price_asc, price_desc, category
     
-    # Query base
-    query = MenuItem.query.filter_by(restaurant_id=restaurant_id)
-    
-    # Aplicar filtros
-    if category:
-        query = query.filter(MenuItem.category == category)
-    
     min_price = parse_float(min_price_raw)
     max_price = parse_float(max_price_raw)
-    if min_price is not None:
-        query = query.filter(MenuItem.price >= min_price)
-    if max_price is not None:
-        query = query.filter(MenuItem.price <= max_price)
-    
-    if available_only:
-        query = query.filter(MenuItem.available == True)
-    
-    # Aplicar ordenação
-    if sort_by == 'price_asc':
-        query = query.order_by(MenuItem.price.asc())
-    elif sort_by == 'price_desc':
-        query = query.order_by(MenuItem.price.desc())
-    elif sort_by == 'category':
-        query = query.order_by(MenuItem.category.asc(), MenuItem.name.asc())
-    else:  # name
-        query = query.order_by(MenuItem.name.asc())
     
-    menu_items = query.all()
-    
-    # Obter todas as categorias disponíveis para o filtro
-    all_categories = db.session.query(MenuItem.category).filter_by(restaurant_id=restaurant_id).distinct().all()
-    categories = [cat[0] for cat in all_categories if cat[0]]
+    # Filtros e ordenação sobre o snapshot do cardápio em cache (sem consultar menu_item)
+    menu = menu_cache.get(restaurant_id)
+    menu_items = menu.select(category=category or None, min_price=min_price, max_price=max_price,
+                             available_only=available_only, sort_by=sort_by)
+    categories = category_facets.menu_chips(menu, min_price=min_price, max_price=max_price, available_only=available_only)
     
     return render_template('restaurant.html', 
                          restaurant=restaurant, 
@@ -1478,17 +2834,186 @@ def cart():
     available_items = []
     if cart:
         try:
-            available_items = (
-                MenuItem.query
-                .filter_by(restaurant_id=cart.restaurant_id, available=True)
-                .order_by(MenuItem.name.asc())
-                .limit(8)
-                .all()
-            )
+            available_items = menu_cache.get(cart.restaurant_id).select(available_only=True, sort_by='name', limit=8)
         except Exception:
             available_items = []
     return render_template('cart.html', cart=cart, available_items=available_items)
 
+# Serviço de carrinho: cada alteração é uma transação só de comandos de escrita (o primeiro já pega o
+# lock de escrita do SQLite, sem promover uma leitura), com upserts sobre os índices únicos de
+# cart (usuario_id, restaurante_id) e cart_item (carrinho_id, item_menu_id). Cliques simultâneos
+# somam na mesma linha em vez de criar itens duplicados.
+CartTotals = namedtuple('CartTotals', 'cart_id restaurant_id item_count subtotal')
+
+def _cart_execute(sql, params):
+    statement = text(sql) if isinstance(sql, str) else sql
+    return db.session.execute(statement, params, bind_arguments={'bind': db.engines['restaurants']})
+
+def cart_add_item(user_id, menu_item_id, quantity=1):
+    """Soma ``quantity`` unidades do item ao carrinho do usuário, em um único commit.
+
+    O carrinho de outro restaurante é descartado (só existe um carrinho por vez). O preço gravado é o
+    do item no momento da primeira adição. Devolve CartTotals, ou None se o item não existir.
+    """
+    params = {
+        'user_id': user_id,
+        'item_id': menu_item_id,
+        'quantity': quantity,
+        'now': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f'),
+    }
+    other_carts = ("SELECT id FROM cart WHERE usuario_id = :user_id "
+                   "AND restaurante_id != (SELECT restaurante_id FROM menu_item WHERE id = :item_id)")
+    try:
+        _cart_execute(f"DELETE FROM cart_item WHERE carrinho_id IN ({other_carts})", params)
+        _cart_execute(f"DELETE FROM cart WHERE id IN ({other_carts})", params)
+        cart_row = _cart_execute(
+            """INSERT INTO cart (usuario_id, restaurante_id, criado_em, atualizado_em, quantidade_itens, subtotal)
+               SELECT :user_id, restaurante_id, :now, :now, 0, 0 FROM menu_item WHERE id = :item_id
+               ON CONFLICT (usuario_id, restaurante_id) DO UPDATE SET atualizado_em = excluded.atualizado_em
+               RETURNING id, restaurante_id""", params).first()
+        if cart_row is None:
+            db.session.rollback()
+            return None
+        params['cart_id'] = cart_row[0]
+        params['price'] = _cart_execute(
+            """INSERT INTO cart_item (carrinho_id, item_menu_id, quantidade, preco)
+               SELECT :cart_id, id, :quantity, preco FROM menu_item WHERE id = :item_id
+               ON CONFLICT (carrinho_id, item_menu_id) DO UPDATE SET quantidade = quantidade + excluded.quantidade
+               RETURNING preco""", params).scalar()
+        totals = _cart_execute(
+            """UPDATE cart SET quantidade_itens = quantidade_itens + :quantity,
+                   subtotal = subtotal + :quantity * :price, atualizado_em = :now
+               WHERE id = :cart_id RETURNING quantidade_itens, subtotal""", params).first()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return CartTotals(cart_row[0], cart_row[1], totals[0], round(float(totals[1]), 2))
+
+CART_BATCH_MAX_OPERATIONS = 100
+# Teto de unidades de um item no carrinho (quantidades absurdas estourariam o INTEGER do SQLite)
+CART_MAX_ITEM_QUANTITY = 99
+
+def parse_cart_batch(payload):
+    """Valida as operações de /api/cart/batch com uma única consulta IN em menu_item.
+
+    Cada operação é ``{item_id, quantity, op}`` com ``op`` 'add' (soma, padrão) ou 'set' (define; 0
+    remove). Devolve (restaurante_id, {item_id: (modo, quantidade)}, erros); operações repetidas do
+    mesmo item são combinadas na ordem em que chegaram.
+    """
+    operations = payload.get('operations') if isinstance(payload, dict) else payload
+    if not isinstance(operations, list) or not operations:
+        return None, {}, ['Informe a lista de operações']
+    if len(operations) > CART_BATCH_MAX_OPERATIONS:
+        return None, {}, [f'No máximo {CART_BATCH_MAX_OPERATIONS} operações por requisição']
+    errors = []
+    parsed = []
+    for pos, operation in enumerate(operations):
+        operation = operation if isinstance(operation, dict) else {}
+        mode = operation.get('op', 'add')
+        try:
+            item_id = int(operation.get('item_id'))
+            quantity = int(operation.get('quantity', 1))
+        except (TypeError, ValueError):
+            errors.append(f'Operação {pos}: item_id e quantity devem ser inteiros')
+            continue
+        if mode not in ('add', 'set'):
+            errors.append(f"Operação {pos}: op deve ser 'add' ou 'set'")
+        elif quantity < (1 if mode == 'add' else 0):
+            errors.append(f'Operação {pos}: quantidade inválida')
+        elif quantity > CART_MAX_ITEM_QUANTITY:
+            errors.append(f'Operação {pos}: no máximo {CART_MAX_ITEM_QUANTITY} unidades por item')
+        else:
+            parsed.append((item_id, mode, quantity))
+    rows = db.session.query(MenuItem.id, MenuItem.restaurant_id, MenuItem.available).filter(
+        MenuItem.id.in_({item_id for item_id, _, _ in parsed})).all() if parsed else []
+    restaurants = {item_id: restaurant_id for item_id, restaurant_id, _ in rows}
+    missing = sorted({item_id for item_id, _, _ in parsed if item_id not in restaurants})
+    if missing:
+        errors.append(f'Itens não encontrados: {missing}')
+    # Item indisponível ainda pode sair do carrinho (set 0), mas não entrar
+    unavailable_ids = {item_id for item_id, _, available in rows if available is False}
+    unavailable = sorted({item_id for item_id, _, quantity in parsed if item_id in unavailable_ids and quantity > 0})
+    if unavailable:
+        errors.append(f'Itens indisponíveis: {unavailable}')
+    if len(set(restaurants.values())) > 1:
+        errors.append('Todos os itens devem ser do mesmo restaurante')
+    if errors:
+        return None, {}, errors
+    changes = {}
+    for item_id, mode, quantity in parsed:
+        previous = changes.get(item_id)
+        if mode == 'add' and previous:
+            changes[item_id] = (previous[0], min(previous[1] + quantity, CART_MAX_ITEM_QUANTITY))
+        else:
+            changes[item_id] = (mode, quantity)
+    return next(iter(restaurants.values())), changes, []
+
+def cart_apply_batch(user_id, restaurant_id, changes, replace=False):
+    """Aplica as alterações de parse_cart_batch em um único commit e devolve o id do carrinho.
+
+    Com ``replace`` os itens que não aparecem em ``changes`` saem do carrinho.
+    """
+    params = {'user_id': user_id, 'restaurant_id': restaurant_id,
+              'now': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')}
+    keep_items = text("DELETE FROM cart_item WHERE carrinho_id = :cart_id AND item_menu_id NOT IN :item_ids").bindparams(
+        bindparam('item_ids', expanding=True))
+    try:
+        other_carts = "SELECT id FROM cart WHERE usuario_id = :user_id AND restaurante_id != :restaurant_id"
+        _cart_execute(f"DELETE FROM cart_item WHERE carrinho_id IN ({other_carts})", params)
+        _cart_execute(f"DELETE FROM cart WHERE id IN ({other_carts})", params)
+        cart_id = _cart_execute(
+            """INSERT INTO cart (usuario_id, restaurante_id, criado_em, atualizado_em, quantidade_itens, subtotal)
+               VALUES (:user_id, :restaurant_id, :now, :now, 0, 0)
+               ON CONFLICT (usuario_id, restaurante_id) DO UPDATE SET atualizado_em = excluded.atualizado_em
+               RETURNING id""", params).scalar()
+        if replace:
+            _cart_execute(keep_items, {'cart_id': cart_id, 'item_ids': list(changes)})
+        removals = [{'cart_id': cart_id, 'item_id': item_id} for item_id, (mode, quantity) in changes.items() if mode == 'set' and quantity == 0]
+        upserts = [{'cart_id': cart_id, 'item_id': item_id, 'quantity': quantity, 'is_set': 1 if mode == 'set' else 0,
+                    'max_quantity': CART_MAX_ITEM_QUANTITY}
+                   for item_id, (mode, quantity) in changes.items() if quantity > 0]
+        if removals:
+            _cart_execute("DELETE FROM cart_item WHERE carrinho_id = :cart_id AND item_menu_id = :item_id", removals)
+        if upserts:
+            _cart_execute(
+                """INSERT INTO cart_item (carrinho_id, item_menu_id, quantidade, preco)
+                   SELECT :cart_id, id, :quantity, preco FROM menu_item WHERE id = :item_id AND COALESCE(disponivel, 1) = 1
+                   ON CONFLICT (carrinho_id, item_menu_id) DO UPDATE SET
+                       quantidade = CASE WHEN :is_set THEN excluded.quantidade
+                                         ELSE MIN(quantidade + excluded.quantidade, :max_quantity) END""",
+                upserts)
+        # Vários itens mudaram: os totais são recalculados de uma vez a partir das linhas do carrinho
+        _cart_execute(
+            """UPDATE cart SET
+                   quantidade_itens = (SELECT COALESCE(SUM(quantidade), 0) FROM cart_item WHERE carrinho_id = cart.id),
+                   subtotal = (SELECT COALESCE(SUM(quantidade * preco), 0) FROM cart_item WHERE carrinho_id = cart.id)
+               WHERE id = :cart_id""", {'cart_id': cart_id})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return cart_id
+
+def cart_state(cart_id):
+    """Carrinho serializado para as respostas JSON (uma consulta para o carrinho e uma para os itens)."""
+    cart = Cart.query.get(cart_id)
+    if cart is None:
+        return None
+    rows = (db.session.query(CartItem.menu_item_id, MenuItem.name, CartItem.quantity, CartItem.price)
+            .join(MenuItem, MenuItem.id == CartItem.menu_item_id)
+            .filter(CartItem.cart_id == cart_id)
+            .order_by(CartItem.id.asc())
+            .all())
+    return {
+        'id': cart.id,
+        'restaurant_id': cart.restaurant_id,
+        'item_count': cart.get_item_count(),
+        'subtotal': cart.get_total(),
+        'items': [{'item_id': item_id, 'name': name, 'quantity': quantity, 'price': price, 'subtotal': round(quantity * price, 2)}
+                  for item_id, name, quantity, price in rows],
+    }
+
 @app.route('/add_to_cart', methods=['POST', 'GET'])
 @login_required
 def add_to_cart():
@@ -1510,49 +3035,15 @@ def add_to_cart():
         quantity = int(quantity_raw) if quantity_raw is not None else 1
     except Exception:
         quantity = 1
+    quantity = min(max(1, quantity), CART_MAX_ITEM_QUANTITY)
     
-    menu_item = MenuItem.query.get_or_404(item_id)
-    
-    # Buscar ou criar carrinho para este restaurante
-    cart = Cart.query.filter_by(
-        user_id=current_user.id,
-        restaurant_id=menu_item.restaurant_id
-    ).first()
-    
-    if not cart:
-        # Verificar se há carrinho de outro restaurante e limpar somente se for de outro restaurante
-        existing_cart = Cart.query.filter_by(user_id=current_user.id).order_by(Cart.updated_at.desc()).first()
-        if existing_cart and existing_cart.restaurant_id != menu_item.restaurant_id:
-            db.session.delete(existing_cart)
-            db.session.commit()
-        
-        cart = Cart(
-            user_id=current_user.id,
-            restaurant_id=menu_item.restaurant_id
-        )
-        db.session.add(cart)
-        db.session.commit()
-    
-    # Verificar se item já existe no carrinho
-    cart_item = CartItem.query.filter_by(cart_id=cart.id, menu_item_id=item_id).first()
-    
-    if cart_item:
-        cart_item.quantity += quantity
-    else:
-        cart_item = CartItem(
-            cart_id=cart.id,
-            menu_item_id=item_id,
-            quantity=quantity,
-            price=menu_item.price
-        )
-        db.session.add(cart_item)
-    
-    cart.updated_at = datetime.utcnow()
-    db.session.commit()
+    totals = cart_add_item(current_user.id, item_id, quantity)
+    if totals is None:
+        abort(404)
     
     if is_form:
         return redirect(url_for('cart'))
-    return jsonify({'success': True, 'cart_count': cart.get_item_count(), 'cart_total': cart.get_total()})
+    return jsonify({'success': True, 'cart_count': totals.item_count, 'cart_total': totals.subtotal})
 
 @app.route('/update_cart_item', methods=['POST'])
 @login_required
@@ -1578,10 +3069,11 @@ def update_cart_item():
     if not cart_item:
         return jsonify({'success': False, 'message': 'Item não encontrado no carrinho'})
     if quantity <= 0:
+        cart.apply_delta(-cart_item.quantity, -cart_item.get_subtotal())
         db.session.delete(cart_item)
     else:
+        cart.apply_delta(quantity - cart_item.quantity, (quantity - cart_item.quantity) * cart_item.price)
         cart_item.quantity = quantity
-    cart.updated_at = datetime.utcnow()
     db.session.commit()
     if is_form:
         return redirect(url_for('cart'))
@@ -1604,8 +3096,8 @@ def remove_from_cart():
         if cart_item and cart_item.cart_id != cart.id:
             cart_item = None
     if cart_item:
+        cart.apply_delta(-cart_item.quantity, -cart_item.get_subtotal())
         db.session.delete(cart_item)
-        cart.updated_at = datetime.utcnow()
         db.session.commit()
     if is_form:
         return redirect(url_for('cart'))
@@ -1620,20 +3112,294 @@ def clear_cart():
         db.session.commit()
     return jsonify({'success': True})
 
+@app.route('/api/cart/batch', methods=['POST'])
+@login_required
+def api_cart_batch():
+    # Várias adições/alterações em uma requisição: valida tudo antes, aplica em um commit e devolve o
+    # carrinho final. Corpo: {"operations": [{"item_id": 1, "quantity": 2, "op": "add"|"set"}], "replace": false}
+    payload = request.get_json(silent=True)
+    restaurant_id, changes, errors = parse_cart_batch(payload)
+    if errors:
+        return jsonify({'success': False, 'errors': errors}), 400
+    replace = bool(payload.get('replace')) if isinstance(payload, dict) else False
+    cart_id = cart_apply_batch(current_user.id, restaurant_id, changes, replace=replace)
+    return jsonify({'success': True, 'cart': cart_state(cart_id)})
+
+# Eventos de pedidos em tempo real: pub/sub em memória (por processo) alimentando streams SSE.
+# Tópicos: 'restaurant:<id>' (painel do restaurante) e 'user:<id>' (acompanhamento do cliente). Quem
+# publica são checkout, cancel_order e update_order_status, sempre depois do commit.
+SSE_HEARTBEAT_SECONDS = 15
+ORDER_STATUSES = ['pending', 'preparing', 'delivering', 'delivered', 'cancelled']
+
+class EventBus:
+    """Cada assinante recebe uma Queue limitada; quem não consome a tempo (fila cheia) perde o
+    acumulado e recebe um evento 'resync', para recarregar o estado em vez de reter memória."""
+
+    def __init__(self, max_pending=100, replay=0, replay_topics=1000):
+        self._lock = threading.Lock()
+        self._topics = {}  # tópico -> set de filas
+        self._next_id = 0
+        self.max_pending = max_pending
+        # Replay: últimos ``replay`` eventos de cada tópico (LRU de até ``replay_topics`` tópicos), para
+        # quem reconecta com Last-Event-ID. _evicted guarda o id mais alto já descartado de cada tópico.
+        self.replay = replay
+        self.replay_topics = replay_topics
+        self._history = OrderedDict()
+        self._evicted = {}
+        self._evicted_topics_upto = 0
+        self.stats = {'published': 0, 'delivered': 0, 'resyncs': 0, 'replayed': 0}
+
+    def subscribe(self, topic, last_event_id=None):
+        """Inscreve uma fila no tópico. Com ``last_event_id``, a fila já sai com os eventos perdidos
+        desde então (ou com um 'resync', se eles não estão mais no buffer)."""
+        queue = Queue(maxsize=self.max_pending)
+        with self._lock:
+            if last_event_id is not None and self.replay:
+                backlog = self._backlog(topic, last_event_id)
+                if backlog is None or len(backlog) > self.max_pending:
+                    queue.put_nowait({'id': self._next_id, 'type': 'resync', 'ts': time.time(), 'data': {}})
+                    self.stats['resyncs'] += 1
+                else:
+                    for event in backlog:
+                        queue.put_nowait(event)
+                    self.stats['replayed'] += len(backlog)
+            self._topics.setdefault(topic, set()).add(queue)
+        return queue
+
+    def _backlog(self, topic, last_event_id):
+        # None = não dá para garantir que nada se perdeu (buffer já descartou, ou ids de outro processo)
+        if last_event_id > self._next_id:
+            return None
+        history = self._history.get(topic)
+        if history is None:
+            return [] if last_event_id >= self._evicted_topics_upto else None
+        if last_event_id < self._evicted.get(topic, 0):
+            return None
+        return [event for event in history if event['id'] > last_event_id]
+
+    def _remember(self, topic, event):
+        history = self._history.get(topic)
+        if history is None:
+            history = self._history[topic] = deque(maxlen=self.replay)
+            if len(self._history) > self.replay_topics:
+                old_topic, old_history = self._history.popitem(last=False)
+                self._evicted.pop(old_topic, None)
+                self._evicted_topics_upto = max(self._evicted_topics_upto, old_history[-1]['id'])
+        else:
+            self._history.move_to_end(topic)
+            if len(history) == history.maxlen:
+                self._evicted[topic] = history[0]['id']
+        history.append(event)
+
+    def unsubscribe(self, topic, queue):
+        with self._lock:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def has_subscribers(self, topic):
+        return bool(self._topics.get(topic))
+
+    def last_id(self):
+        return self._next_id
+
+    def publish(self, topic, kind, data):
+        with self._lock:
+            self._next_id += 1
+            event = {'id': self._next_id, 'type': kind, 'ts': time.time(), 'data': data}
+            if self.replay:
+                self._remember(topic, event)
+            subscribers = list(self._topics.get(topic, ()))
+            self.stats['published'] += 1
+        delivered = 0
+        for queue in subscribers:
+            try:
+                queue.put_nowait(event)
+                delivered += 1
+            except Full:
+                try:
+                    while True:
+                        queue.get_nowait()
+                except Empty:
+                    pass
+                queue.put_nowait(dict(event, type='resync', data={}))
+                with self._lock:
+                    self.stats['resyncs'] += 1
+        with self._lock:
+            self.stats['delivered'] += delivered
+        return event
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, topics=len(self._topics), subscribers=sum(len(s) for s in self._topics.values()),
+                        replay_topics=len(self._history))
+
+order_events = EventBus()
+# Acompanhamento do cliente ('user:<id>'): só transições de status, com replay para reconexões
+customer_order_events = EventBus(replay=int(os.environ.get('ORDER_EVENTS_REPLAY', '50')),
+                                 replay_topics=int(os.environ.get('ORDER_EVENTS_REPLAY_TOPICS', '5000')))
+
+def format_sse(event):
+    data = dict(event['data'], ts=event['ts'])
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def event_stream_response(topic, bus=None, heartbeat=SSE_HEARTBEAT_SECONDS, last_event_id=None):
+    """Resposta text/event-stream com os eventos de ``topic`` até o cliente desconectar."""
+    bus = bus or order_events
+    queue = bus.subscribe(topic, last_event_id=last_event_id)
+    # A conexão fica aberta por muito tempo: devolve as conexões do pool antes de começar a transmitir
+    db.session.close()
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = queue.get(timeout=heartbeat)
+                except Empty:
+                    # Comentário SSE: mantém proxies abertos e detecta cliente desconectado
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event)
+        finally:
+            bus.unsubscribe(topic, queue)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def publish_order_event(order, kind):
+    """Publica o pedido no painel do restaurante; a linha da tabela só é renderizada se houver ouvintes."""
+    topic = f'restaurant:{order.restaurant_id}'
+    if not order_events.has_subscribers(topic):
+        return None
+    row = render_template('_restaurant_order_row.html', order=order, restaurant=order.restaurant,
+                          customers=cross_bind().map(User, [order.user_id]), statuses=ORDER_STATUSES)
+    return order_events.publish(topic, kind, {'order_id': order.id, 'status': order.status, 'html': row})
+
+def publish_customer_status(order, previous_status):
+    """Transição de status para o cliente; publica mesmo sem ouvintes, para entrar no replay."""
+    if order.status == previous_status:
+        return None
+    alert = render_template('_order_status_alert.html', order=order)
+    return customer_order_events.publish(f'user:{order.user_id}', 'order_status', {
+        'order_id': order.id, 'status': order.status, 'previous': previous_status,
+        'label': order.get_status_display(), 'html': alert})
+
+# Checkout: o carrinho é lido de uma vez (itens, produtos e restaurante na mesma consulta) e o pedido
+# é gravado numa transação curta com inserts em lote. O carrinho só é apagado se ainda estiver como
+# foi lido (atualizado_em); se mudou no meio, o snapshot é refeito.
+IDEMPOTENCY_KEY_RE = re.compile(r'^[A-Za-z0-9_.:-]{8,64}$')
+CHECKOUT_ATTEMPTS = 3
+
+class CartChanged(Exception):
+    pass
+
+def cart_snapshot_query(user_id):
+    # Itens em selectin (como order_query): com joinedload da coleção, o first() embrulha o carrinho
+    # numa subconsulta e ordena de novo o resultado do join
+    return (Cart.query
+            .options(selectinload(Cart.items).joinedload(CartItem.menu_item), joinedload(Cart.restaurant))
+            .filter_by(user_id=user_id)
+            .order_by(Cart.updated_at.desc()))
+
+def load_cart_snapshot(user_id):
+    return cart_snapshot_query(user_id).first()
+
+def find_order_by_idempotency_key(user_id, key):
+    if not key:
+        return None
+    return Order.query.filter_by(user_id=user_id, idempotency_key=key).first()
+
+def create_order_from_cart(cart, address_id, payment_method, notes='', idempotency_key=None):
+    """Grava Order + OrderItems a partir do snapshot ``cart`` e apaga o carrinho, em um commit.
+
+    Devolve (order_id, criado). Com ``idempotency_key`` já usada pelo usuário devolve o pedido
+    existente com criado=False. Levanta CartChanged se o carrinho foi alterado depois da leitura.
+    """
+    lines = [(ci.menu_item_id, ci.quantity, ci.price) for ci in cart.items]
+    # Valores saem das linhas lidas, as mesmas gravadas em order_item
+    subtotal = round(sum(quantity * price for _, quantity, price in lines), 2)
+    delivery_fee = cart.restaurant.delivery_fee or 0.0
+    # O rollback expira o snapshot (e a linha pode já não existir): campos lidos antes
+    cart_id, user_id, restaurant_id, updated_at = cart.id, cart.user_id, cart.restaurant_id, cart.updated_at
+    try:
+        # O primeiro comando já é de escrita: a transação pega o lock do SQLite logo no início. O pedido
+        # entra antes de apagar o carrinho, para que um envio duplicado caia no conflito da chave (e
+        # receba o pedido original) em vez de perder a corrida pelo carrinho.
+        order_id = db.session.execute(
+            sqlite_insert(Order.__table__).values(
+                usuario_id=user_id,
+                restaurante_id=restaurant_id,
+                endereco_id=address_id,
+                status='pending',
+                subtotal=subtotal,
+                taxa_entrega=delivery_fee,
+                total=subtotal + delivery_fee,
+                metodo_pagamento=payment_method,
+                observacoes=notes,
+                criado_em=datetime.utcnow(),
+                chave_idempotencia=idempotency_key,
+            ).on_conflict_do_nothing(index_elements=['usuario_id', 'chave_idempotencia'])
+            .returning(Order.__table__.c.id),
+            bind_arguments={'bind': db.engines['restaurants']}
+        ).scalar()
+        if order_id is None:
+            # Outra requisição com a mesma chave chegou antes: nada deste checkout é gravado
+            db.session.rollback()
+            existing = find_order_by_idempotency_key(user_id, idempotency_key)
+            return existing.id, False
+        deleted = db.session.execute(
+            db.delete(Cart).where(Cart.id == cart_id, Cart.updated_at == updated_at)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted != 1:
+            raise CartChanged()
+        db.session.execute(db.delete(CartItem).where(CartItem.cart_id == cart_id).execution_options(synchronize_session=False))
+        db.session.execute(
+            OrderItem.__table__.insert(),
+            [{'pedido_id': order_id, 'item_menu_id': item_id, 'quantidade': quantity, 'preco': price}
+             for item_id, quantity, price in lines],
+            bind_arguments={'bind': db.engines['restaurants']}
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return order_id, True
+
 @app.route('/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout():
-    cart = Cart.query.filter_by(user_id=current_user.id).first()
-    if not cart or not cart.items:
+    idempotency_key = (request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or '').strip() or None
+    if idempotency_key and not IDEMPOTENCY_KEY_RE.match(idempotency_key):
+        idempotency_key = None
+    if request.method == 'POST':
+        # Formulário enviado duas vezes: o segundo envio cai no pedido criado pelo primeiro
+        existing = find_order_by_idempotency_key(current_user.id, idempotency_key)
+        if existing:
+            return redirect(url_for('order_invoice', order_id=existing.id))
+
+    cart = load_cart_snapshot(current_user.id)
+    if not cart or not cart.get_item_count():
+        # O primeiro envio pode ter fechado o pedido (e apagado o carrinho) logo após a checagem acima
+        existing = find_order_by_idempotency_key(current_user.id, idempotency_key) if request.method == 'POST' else None
+        if existing:
+            return redirect(url_for('order_invoice', order_id=existing.id))
         flash('Seu carrinho está vazio!', 'warning')
         return redirect(url_for('index'))
     
     # Buscar endereços do usuário
     addresses = UserAddress.query.filter_by(user_id=current_user.id).all()
-    default_address = UserAddress.query.filter_by(
-        user_id=current_user.id,
-        is_default=True
-    ).first()
+    default_address = next((a for a in addresses if a.is_default), None)
+    form_key = idempotency_key or uuid.uuid4().hex
     
     if request.method == 'POST':
         address_id = request.form.get('address_id')
@@ -1646,71 +3412,68 @@ def checkout():
         
         if not address_id:
             flash('Selecione um endereço de entrega!', 'danger')
-            return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address)
+            return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address, idempotency_key=form_key)
         
         if not payment_method:
             flash('Selecione uma forma de pagamento!', 'danger')
-            return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address)
+            return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address, idempotency_key=form_key)
         if payment_method in ('credit_card', 'debit_card'):
             if not card_name or not card_number or not card_expiry or not card_cvv:
                 flash('Informe os dados do cartão.', 'danger')
-                return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address)
-        
-        # Calcular valores
-        subtotal = cart.get_total()
-        delivery_fee = cart.restaurant.delivery_fee
-        total = subtotal + delivery_fee
+                return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address, idempotency_key=form_key)
         
         # Validar pagamento (sandbox)
+        total = cart.get_total() + (cart.restaurant.delivery_fee or 0.0)
         if not validate_payment(payment_method, total):
             flash('Falha na validação do pagamento. Verifique o método selecionado e tente novamente.', 'danger')
-            return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address)
-
-        # Criar pedido
-        order = Order(
-            user_id=current_user.id,
-            restaurant_id=cart.restaurant_id,
-            address_id=address_id,
-            subtotal=subtotal,
-            delivery_fee=delivery_fee,
-            total=total,
-            payment_method=payment_method,
-            notes=notes
-        )
-        db.session.add(order)
-        db.session.flush()  # Para obter o ID do pedido
-        
-        # Criar itens do pedido
-        for cart_item in cart.items:
-            order_item = OrderItem(
-                order_id=order.id,
-                menu_item_id=cart_item.menu_item_id,
-                quantity=cart_item.quantity,
-                price=cart_item.price
-            )
-            db.session.add(order_item)
-        
-        # Limpar carrinho
-        db.session.delete(cart)
-        db.session.commit()
+            return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address, idempotency_key=form_key)
+
+        for attempt in range(CHECKOUT_ATTEMPTS):
+            try:
+                order_id, created = create_order_from_cart(cart, address_id, payment_method, notes, idempotency_key)
+                break
+            except CartChanged:
+                # O carrinho mudou entre a leitura e a gravação: relê e tenta de novo
+                db.session.expire_all()
+                cart = load_cart_snapshot(current_user.id)
+                if not cart or not cart.get_item_count():
+                    existing = find_order_by_idempotency_key(current_user.id, idempotency_key)
+                    if existing:
+                        return redirect(url_for('order_invoice', order_id=existing.id))
+                    flash('Seu carrinho está vazio!', 'warning')
+                    return redirect(url_for('index'))
+        else:
+            flash('Seu carrinho foi alterado durante o checkout. Revise e confirme novamente.', 'warning')
+            return redirect(url_for('checkout'))
         
+        if created:
+            publish_order_event(Order.query.get(order_id), 'order_created')
         flash('Pedido realizado com sucesso!', 'success')
-        return redirect(url_for('order_invoice', order_id=order.id))
+        return redirect(url_for('order_invoice', order_id=order_id))
     
-    return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address)
+    return render_template('checkout.html', cart=cart, addresses=addresses, default_address=default_address, idempotency_key=form_key)
 
 @app.route('/orders')
 @login_required
 def orders():
-    user_orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
-    address_by_order = {}
-    for o in user_orders:
-        try:
-            address_by_order[o.id] = UserAddress.query.get(o.address_id)
-        except Exception:
-            address_by_order[o.id] = None
+    page = keyset_paginate(order_query().filter_by(user_id=current_user.id), order_sort_keys(),
+                           request.args.get('cursor'), parse_page_size(request.args.get('limit')), signature='created_at')
+    user_orders = page.items
+    addresses = cross_bind().want_orders(user_orders).map(UserAddress, [o.address_id for o in user_orders])
+    address_by_order = {o.id: addresses.get(o.address_id) for o in user_orders}
     cart = Cart.query.filter_by(user_id=current_user.id).order_by(Cart.updated_at.desc()).first()
-    return render_template('orders.html', orders=user_orders, address_by_order=address_by_order, cart=cart)
+    # Stream de status só na primeira página e se houver pedido em aberto nela
+    live = not request.args.get('cursor') and any(o.status not in ('delivered', 'cancelled') for o in user_orders)
+    return render_template('orders.html', orders=user_orders, page=page, address_by_order=address_by_order, cart=cart, live=live,
+                           last_event_id=customer_order_events.last_id())
+
+@app.route('/orders/stream')
+@login_required
+def orders_stream():
+    # SSE do cliente: 'order_status' a cada transição dos seus pedidos. O navegador reenvia Last-Event-ID
+    # ao reconectar; clientes sem esse cabeçalho podem usar ?last_event_id=
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    return event_stream_response(f'user:{current_user.id}', bus=customer_order_events, last_event_id=last_event_id)
 
 @app.route('/orders/<int:order_id>/reorder', methods=['POST'])
 @login_required
@@ -1728,10 +3491,12 @@ def reorder_order(order_id):
         cart = Cart(user_id=current_user.id, restaurant_id=order.restaurant_id)
         db.session.add(cart)
         db.session.commit()
+    # Itens e totais trocados no mesmo commit
     CartItem.query.filter_by(cart_id=cart.id).delete()
-    db.session.commit()
     for oi in order.items:
         db.session.add(CartItem(cart_id=cart.id, menu_item_id=oi.menu_item_id, quantity=oi.quantity, price=oi.price))
+    cart.item_count = sum(oi.quantity for oi in order.items)
+    cart.subtotal = sum(oi.quantity * oi.price for oi in order.items)
     cart.updated_at = datetime.utcnow()
     db.session.commit()
     flash('Itens adicionados ao carrinho a partir do pedido.', 'success')
@@ -1762,6 +3527,8 @@ def cancel_order(order_id):
         return redirect(url_for('orders'))
     order.status = 'cancelled'
     db.session.commit()
+    publish_order_event(order, 'order_status')
+    publish_customer_status(order, 'pending')
     flash(f'Pedido #{order.id} foi cancelado.', 'success')
     return redirect(url_for('orders'))
 
@@ -1773,9 +3540,21 @@ def restaurant_orders(restaurant_id):
     if restaurant.owner_id != current_user.id and not current_user.is_admin:
         flash('Você não tem permissão para ver os pedidos deste restaurante.', 'danger')
         return redirect(url_for('index'))
-    orders = Order.query.filter_by(restaurant_id=restaurant_id).order_by(Order.created_at.desc()).all()
-    statuses = ['pending', 'preparing', 'delivering', 'delivered', 'cancelled']
-    return render_template('restaurant_orders.html', restaurant=restaurant, orders=orders, statuses=statuses)
+    page = keyset_paginate(order_query().filter_by(restaurant_id=restaurant_id), order_sort_keys(),
+                           request.args.get('cursor'), parse_page_size(request.args.get('limit')), signature='created_at')
+    # Clientes ficam em cliente.db (sem join possível): uma consulta IN para a página inteira
+    customers = cross_bind().map(User, [o.user_id for o in page.items])
+    return render_template('restaurant_orders.html', restaurant=restaurant, orders=page.items, page=page, customers=customers,
+                           statuses=ORDER_STATUSES, live=not request.args.get('cursor'))
+
+@app.route('/restaurant/<int:restaurant_id>/orders/stream')
+@login_required
+def restaurant_orders_stream(restaurant_id):
+    # SSE do painel: 'order_created' e 'order_status' trazem a linha da tabela já renderizada
+    restaurant = Restaurant.query.get_or_404(restaurant_id)
+    if restaurant.owner_id != current_user.id and not current_user.is_admin:
+        return jsonify({'error': 'Sem permissão'}), 403
+    return event_stream_response(f'restaurant:{restaurant_id}')
 
 # Atualização de status do pedido (owner/admin)
 @app.route('/orders/<int:order_id>/status', methods=['POST'])
@@ -1787,8 +3566,7 @@ def update_order_status(order_id):
         flash('Você não tem permissão para atualizar o status deste pedido.', 'danger')
         return redirect(url_for('orders'))
     new_status = request.form.get('status')
-    allowed_statuses = ['pending', 'preparing', 'delivering', 'delivered', 'cancelled']
-    if new_status not in allowed_statuses:
+    if new_status not in ORDER_STATUSES:
         flash('Status inválido.', 'warning')
         return redirect(url_for('restaurant_orders', restaurant_id=order.restaurant_id))
     # Regras de transição
@@ -1812,6 +3590,8 @@ def update_order_status(order_id):
             return redirect(url_for('restaurant_orders', restaurant_id=order.restaurant_id))
     order.status = new_status
     db.session.commit()
+    publish_order_event(order, 'order_status')
+    publish_customer_status(order, current)
     flash(f'Status do pedido #{order.id} atualizado para {new_status}.', 'success')
     next_url = request.form.get('next') or url_for('restaurant_orders', restaurant_id=order.restaurant_id)
     return redirect(next_url)
@@ -1820,7 +3600,7 @@ def update_order_status(order_id):
 @app.route('/orders/<int:order_id>/invoice')
 @login_required
 def order_invoice(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = order_query().filter_by(id=order_id).first_or_404()
     
     # Verificar permissões: dono do pedido, dono do restaurante ou admin
     if (order.user_id != current_user.id and 
@@ -1847,8 +3627,9 @@ def order_invoice(order_id):
     invoice_number = f"NF-{order.id:06d}"
     
     # Resolver dados de cliente e endereço em base de usuários
-    order_user = User.query.get(order.user_id)
-    order_address = UserAddress.query.get(order.address_id)
+    refs = cross_bind().want_orders([order])
+    order_user = refs.get(User, order.user_id)
+    order_address = refs.get(UserAddress, order.address_id)
     return render_template('invoice.html', 
                          order=order,
                          order_user=order_user,
@@ -1871,7 +3652,8 @@ def list_restaurants():
     radius_km_raw = request.args.get('radius_km', '').strip()
     user_lat_raw = request.args.get('user_lat', '').strip()
     user_lon_raw = request.args.get('user_lon', '').strip()
-    sort_by = request.args.get('sort', 'name')  # name, rating, delivery_time, delivery_fee
+    # 'sort_by' é o nome usado pelos links de ordenação do template
+    sort_by = request.args.get('sort') or request.args.get('sort_by') or ('relevance' if q else 'name')  # relevance, name, rating, delivery_time, delivery_fee
 
     def parse_float(s):
         if not s:
@@ -1903,6 +3685,14 @@ def list_restaurants():
         session['user_lon'] = user_lon
 
     query = Restaurant.query
+
+    # "Próximos a mim": restringe aos restaurantes do índice espacial dentro do raio
+    nearby_distances = None
+    if nearby_flag:
+        user_coords = resolve_user_coords(user_lat, user_lon)
+        if user_coords:
+            nearby_distances = restaurants_within_radius(user_coords[0], user_coords[1], radius_km)
+            query = query.filter(Restaurant.id.in_(list(nearby_distances)))
     
     # Filtro de favoritos
     if favorites_only:
@@ -1910,15 +3700,17 @@ def list_restaurants():
         query = query.filter(Restaurant.id.in_(favorite_ids))
     
     # Filtros existentes
+    search = None
     if q:
-        query = query.filter(
-            (Restaurant.name.ilike(f'%{q}%')) |
-            (Restaurant.category.ilike(f'%{q}%')) |
-            (Restaurant.address.ilike(f'%{q}%'))
-        )
-    if category:
-        query = query.filter(Restaurant.category == category)
-
+        search = restaurant_search_subquery(q)
+        if search is not None:
+            query = query.join(search, Restaurant.id == search.c.id)
+        else:
+            query = query.filter(
+                (Restaurant.name.ilike(f'%{q}%')) |
+                (Restaurant.category.ilike(f'%{q}%')) |
+                (Restaurant.address.ilike(f'%{q}%'))
+            )
     min_fee = parse_float(min_fee_raw)
     max_fee = parse_float(max_fee_raw)
     if min_fee is not None:
@@ -1934,44 +3726,21 @@ def list_restaurants():
     if min_rating is not None:
         query = query.filter(Restaurant.rating >= min_rating)
 
-    # Ordenação
-    if sort_by == 'rating':
-        query = query.order_by(Restaurant.rating.desc())
-    elif sort_by == 'delivery_time':
-        query = query.order_by(Restaurant.delivery_time.asc())
-    elif sort_by == 'delivery_fee':
-        query = query.order_by(Restaurant.delivery_fee.asc())
-    else:  # name
-        query = query.order_by(Restaurant.name.asc())
-
-    restaurants = query.all()
+    # Chips de categoria contados sobre os demais filtros (a categoria escolhida não zera as outras)
+    filtered = any([q, favorites_only, nearby_distances is not None, min_fee is not None, max_fee is not None,
+                    max_time is not None, min_rating is not None])
+    categories = category_facets.chips('restaurants', query if filtered else None)
+    if category:
+        query = query.filter(Restaurant.category == category)
 
-    # Aplica filtro "Próximos a mim" usando geocodificação do endereço padrão do usuário
-    if nearby_flag:
-        user_coords = None
-        if user_lat is not None and user_lon is not None:
-            user_coords = (user_lat, user_lon)
-        elif session.get('user_lat') is not None and session.get('user_lon') is not None:
-            user_coords = (session.get('user_lat'), session.get('user_lon'))
-        elif current_user.is_authenticated:
-            default_address = UserAddress.query.filter_by(user_id=current_user.id, is_default=True).first()
-            if not default_address:
-                default_address = UserAddress.query.filter_by(user_id=current_user.id).first()
-            if default_address:
-                full_addr = f"{default_address.street}, {default_address.number} - {default_address.neighborhood}, {default_address.city} - {default_address.state}, {default_address.zip_code}, Brasil"
-                user_coords = geocode_address(full_addr)
-        if user_coords:
-            u_lat, u_lon = user_coords
-            nearby_list = []
-            for r in restaurants:
-                r_coords = get_restaurant_coords(r)
-                if not r_coords:
-                    continue
-                r_lat, r_lon = r_coords
-                dist_km = haversine_km(u_lat, u_lon, r_lat, r_lon)
-                if dist_km <= radius_km:
-                    nearby_list.append(r)
-            restaurants = nearby_list
+    # Ordenação + página (keyset; relevância usa deslocamento, o rank não é uma chave estável)
+    if sort_by == 'relevance' and search is not None:
+        query = query.order_by(search.c.rank, Restaurant.name.asc())
+        keys = None
+    else:
+        keys = restaurant_sort_keys(sort_by)
+    page = keyset_paginate(query, keys, request.args.get('cursor'), parse_page_size(request.args.get('limit')), signature=sort_by)
+    restaurants = page.items
     
     # Obter IDs dos restaurantes favoritos do usuário atual
     user_favorites = set()
@@ -1981,13 +3750,12 @@ def list_restaurants():
             RestaurantFavorite.query.filter_by(user_id=current_user.id).all()
         )
     
-    categories = [row[0] for row in db.session.query(Restaurant.category).distinct().order_by(Restaurant.category).all()]
-
     tmpl_user_lat = user_lat_raw or (str(session.get('user_lat')) if session.get('user_lat') is not None else '')
     tmpl_user_lon = user_lon_raw or (str(session.get('user_lon')) if session.get('user_lon') is not None else '')
     return render_template(
         'restaurants.html',
         restaurants=restaurants,
+        page=page,
         q=q,
         categories=categories,
         selected_category=category,
@@ -2035,6 +3803,7 @@ def create_restaurant():
             )
             db.session.add(restaurant)
             db.session.commit()
+            geocode_queue.enqueue('restaurant', restaurant.id)
             flash('Restaurante criado com sucesso!', 'success')
             return redirect(url_for('list_restaurants'))
         except Exception as e:
@@ -2055,6 +3824,7 @@ def edit_restaurant(restaurant_id):
         return redirect(url_for('list_restaurants'))
     
     if request.method == 'POST':
+        previous_address = restaurant.address
         # Atualiza somente os campos presentes no formulário para evitar sobrescrever com None
         if 'name' in request.form:
             restaurant.name = request.form.get('name')
@@ -2081,8 +3851,15 @@ def edit_restaurant(restaurant_id):
                 pass
         if 'logo' in request.form:
             restaurant.logo = request.form.get('logo')
+        address_changed = restaurant.address != previous_address
+        if address_changed:
+            # Coordenadas antigas deixam de valer; a fila geocodifica o novo endereço
+            RestaurantGeo.query.filter_by(restaurant_id=restaurant.id).delete()
         
         db.session.commit()
+        menu_cache.invalidate(restaurant.id)
+        if address_changed:
+            geocode_queue.enqueue('restaurant', restaurant.id)
         
         flash('Restaurante atualizado com sucesso!', 'success')
         return redirect(url_for('list_restaurants'))
@@ -2105,31 +3882,100 @@ def delete_restaurant(restaurant_id):
     # Excluir o restaurante
     db.session.delete(restaurant)
     db.session.commit()
+    menu_cache.invalidate(restaurant_id)
     
     flash('Restaurante excluído com sucesso!', 'success')
     return redirect(url_for('list_restaurants'))
 
 # API JSON para CRUD de Restaurantes (suporta Mobile)
+# Serialização em streaming: lê colunas (sem montar objetos ORM) em lotes e envia JSON ou NDJSON
+# aos poucos, então a memória não cresce com o tamanho do catálogo.
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+RESTAURANT_API_COLUMNS = [
+    ('id', Restaurant.id),
+    ('owner_id', Restaurant.owner_id),
+    ('name', Restaurant.name),
+    ('description', Restaurant.description),
+    ('category', Restaurant.category),
+    ('delivery_fee', Restaurant.delivery_fee),
+    ('delivery_time', Restaurant.delivery_time),
+    ('rating', Restaurant.rating),
+    ('logo', Restaurant.logo),
+    ('address', Restaurant.address),
+    ('phone', Restaurant.phone),
+    ('image_url', Restaurant.image_url),
+]
+
+def wants_ndjson():
+    if (request.args.get('format') or '').lower() == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def stream_rows_response(columns, order_by=None, where=None, batch_size=STREAM_BATCH_SIZE):
+    """Resposta em streaming com uma linha por registro: ``columns`` = [(chave_json, coluna)]."""
+    keys = [key for key, _ in columns]
+    stmt = db.select(*[col for _, col in columns])
+    if where is not None:
+        stmt = stmt.where(where)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    stmt = stmt.execution_options(yield_per=batch_size)
+    ndjson = wants_ndjson()
+    dumps = lambda row: json.dumps(dict(zip(keys, row)), ensure_ascii=False, separators=(',', ':'), default=str)
+
+    def generate():
+        result = db.session.execute(stmt)
+        first = True
+        if not ndjson:
+            yield '['
+        for batch in result.partitions():
+            if ndjson:
+                yield ''.join(dumps(row) + '\n' for row in batch)
+            else:
+                chunk = ','.join(dumps(row) for row in batch)
+                yield chunk if first else ',' + chunk
+                first = False
+        if not ndjson:
+            yield ']'
+
+    mimetype = NDJSON_MIMETYPE if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def restaurant_to_dict(r):
+    return {
+        'id': r.id,
+        'owner_id': r.owner_id,
+        'name': r.name,
+        'description': r.description,
+        'category': r.category,
+        'delivery_fee': r.delivery_fee,
+        'delivery_time': r.delivery_time,
+        'rating': r.rating,
+        'logo': r.logo,
+        'address': r.address,
+        'phone': r.phone,
+        'image_url': r.image_url,
+    }
+
 @app.route('/api/restaurants', methods=['GET'])
+@conditional_catalog_get()
 def api_list_restaurants():
-    restaurants = Restaurant.query.all()
-    data = []
-    for r in restaurants:
-        data.append({
-            'id': r.id,
-            'owner_id': r.owner_id,
-            'name': r.name,
-            'description': r.description,
-            'category': r.category,
-            'delivery_fee': r.delivery_fee,
-            'delivery_time': r.delivery_time,
-            'rating': r.rating,
-            'logo': r.logo,
-            'address': r.address,
-            'phone': r.phone,
-            'image_url': r.image_url,
+    # Com limit/cursor responde uma página (envelope com cursores opacos); sem eles, a lista completa
+    # de sempre (em streaming), para clientes antigos
+    if 'limit' in request.args or 'cursor' in request.args:
+        sort_by = request.args.get('sort') or 'name'  # name, rating, delivery_time, delivery_fee
+        page = keyset_paginate(Restaurant.query, restaurant_sort_keys(sort_by), request.args.get('cursor'),
+                               parse_page_size(request.args.get('limit')), signature=sort_by)
+        return jsonify({
+            'items': [restaurant_to_dict(r) for r in page.items],
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor,
+            'limit': page.limit,
         })
-    return jsonify(data)
+    # Lista completa: JSON array (padrão) ou NDJSON (?format=ndjson ou Accept: application/x-ndjson)
+    return stream_rows_response(RESTAURANT_API_COLUMNS, order_by=Restaurant.id)
 
 @app.route('/api/restaurants', methods=['POST'])
 def api_create_restaurant():
@@ -2153,16 +3999,24 @@ def api_create_restaurant():
     )
     db.session.add(r)
     db.session.commit()
+    geocode_queue.enqueue('restaurant', r.id)
     return jsonify({'id': r.id}), 201
 
 @app.route('/api/restaurants/<int:restaurant_id>', methods=['PUT'])
 def api_update_restaurant(restaurant_id):
     r = Restaurant.query.get_or_404(restaurant_id)
     payload = request.get_json(force=True, silent=True) or {}
+    previous_address = r.address
     for field in ['name','description','category','delivery_fee','delivery_time','rating','logo','address','phone','image_url']:
         if field in payload:
             setattr(r, field, payload[field])
+    address_changed = r.address != previous_address
+    if address_changed:
+        RestaurantGeo.query.filter_by(restaurant_id=r.id).delete()
     db.session.commit()
+    menu_cache.invalidate(r.id)
+    if address_changed:
+        geocode_queue.enqueue('restaurant', r.id)
     return jsonify({'status': 'ok'})
 
 @app.route('/api/restaurants/<int:restaurant_id>', methods=['DELETE'])
@@ -2170,6 +4024,7 @@ def api_delete_restaurant(restaurant_id):
     r = Restaurant.query.get_or_404(restaurant_id)
     db.session.delete(r)
     db.session.commit()
+    menu_cache.invalidate(restaurant_id)
     return jsonify({'status': 'deleted'})
 
 # CRUD de Refeições/Lanches
@@ -2214,6 +4069,7 @@ def create_menu_item(restaurant_id):
         
         db.session.add(menu_item)
         db.session.commit()
+        menu_cache.invalidate(restaurant_id)
         
         flash('Item adicionado com sucesso!', 'success')
         return redirect(url_for('list_menu_items', restaurant_id=restaurant_id))
@@ -2245,6 +4101,7 @@ def edit_menu_item(item_id):
         menu_item.category = request.form.get('category')
         
         db.session.commit()
+        menu_cache.invalidate(restaurant.id)
         
         flash('Item atualizado com sucesso!', 'success')
         return redirect(url_for('list_menu_items', restaurant_id=restaurant.id))
@@ -2264,6 +4121,7 @@ def delete_menu_item(item_id):
     
     db.session.delete(menu_item)
     db.session.commit()
+    menu_cache.invalidate(restaurant.id)
     
     flash('Item excluído com sucesso!', 'success')
     return redirect(url_for('list_menu_items', restaurant_id=restaurant.id))
@@ -2305,6 +4163,7 @@ def create_address():
             )
             db.session.add(address)
             db.session.commit()
+            geocode_queue.enqueue('address', address.id)
         except Exception as e:
             db.session.rollback()
             flash('Erro ao salvar endereço: ' + str(e), 'danger')
@@ -2330,6 +4189,7 @@ def edit_address(address_id):
         if is_default and not address.is_default:
             UserAddress.query.filter_by(user_id=current_user.id, is_default=True).update({'is_default': False})
         
+        previous_query = address.get_geocode_query()
         address.name = request.form.get('name')
         address.street = request.form.get('street')
         address.number = request.form.get('number')
@@ -2340,8 +4200,13 @@ def edit_address(address_id):
         address.zip_code = request.form.get('zip_code')
         address.reference = request.form.get('reference')
         address.is_default = is_default
+        location_changed = address.get_geocode_query() != previous_query or address.geocoded_at is None
+        if location_changed:
+            address.lat = address.lon = address.geocoded_at = None
         
         db.session.commit()
+        if location_changed:
+            geocode_queue.enqueue('address', address.id)
         
         flash('Endereço atualizado com sucesso!', 'success')
         return redirect(url_for('list_addresses'))
@@ -2396,8 +4261,9 @@ def set_default_address(address_id):
 def list_users():
     if not current_user.is_admin:
         return redirect(url_for('index'))
-    users = User.query.all()
-    return render_template('users.html', users=users)
+    page = keyset_paginate(User.query, [KeysetKey(User.id, lambda u: u.id)], request.args.get('cursor'),
+                           parse_page_size(request.args.get('limit'), default=50), signature='id')
+    return render_template('users.html', users=page.items, page=page)
 
 @app.route('/users/<int:user_id>')
 @login_required
@@ -2545,85 +4411,135 @@ def list_favorites():
     return render_template('favorites.html', restaurants=favorites)
 
 
-# Inicialização resiliente do banco de dados
-with app.app_context():
-    # Tenta criar as tabelas conforme os modelos definidos, separando por bind
-    try:
-        users_tables = [User.__table__, OAuth.__table__, UserAddress.__table__]
-        db.Model.metadata.create_all(bind=db.engine, tables=users_tables)
-        rest_engine = db.get_engine(app, bind='restaurants')
-        rest_tables = [
-            Restaurant.__table__, MenuItem.__table__,
-            Cart.__table__, CartItem.__table__,
-            Order.__table__, OrderItem.__table__,
-            RestaurantFavorite.__table__, ProductFavorite.__table__,
-            RestaurantGeo.__table__
-        ]
-        db.Model.metadata.create_all(bind=rest_engine, tables=rest_tables)
-    except Exception:
-        pass
-    try:
-        # Seed de dados de demonstração para facilitar testes em uma instalação limpa
-        if User.query.count() == 0 and Restaurant.query.count() == 0:
-            demo_user = User(
-                name='Demo Restaurante',
-                email='demo@restaurant.com',
-                password=generate_password_hash('123456', method='pbkdf2:sha256'),
-                address='Rua Exemplo, 123',
-                phone='(11) 99999-9999',
-                is_restaurant=True
-            )
-            db.session.add(demo_user)
-            db.session.commit()
+# Consultas quentes cujo plano não pode voltar a ser full scan (verificadas por /debug/query-plans
+# e pelo comando `flask check-query-plans`)
+def hot_query_plans_checks():
+    """Consultas das rotas quentes, montadas pelos mesmos construtores que as rotas usam.
 
-            demo_restaurant = Restaurant(
-                owner_id=demo_user.id,
-                name='Pizzaria Demo',
-                description='A melhor pizza da cidade',
-                category='Italiana',
-                delivery_fee=5.99,
-                delivery_time=30,
-                rating=4.5,
-                logo=None,
-                address='Rua Pizza, 456',
-                phone='(11) 88888-8888',
-                image_url='/static/images/restaurant-bg.jpg'
-            )
-            db.session.add(demo_restaurant)
-            db.session.commit()
+    Listas paginadas entram na primeira página e numa página seguinte (condição keyset do cursor).
+    """
+    after = datetime(2024, 1, 1)
+    restaurants = Restaurant.query
+    products = product_list_query()
+    return [
+        # /restaurant/<id>: o cardápio sai do snapshot; categoria, preço e "disponível" filtram em memória
+        ('restaurant_menu', menu_snapshot_query(1)),
+        ('restaurant_menu_admin', MenuItem.query.filter_by(restaurant_id=1)),
+        ('restaurants_name', keyset_page_query(restaurants, restaurant_sort_keys('name'))),
+        ('restaurants_name_next', keyset_page_query(restaurants, restaurant_sort_keys('name'), ['Pizzaria', 1])),
+        ('restaurants_rating_next', keyset_page_query(restaurants, restaurant_sort_keys('rating'), [4.5, 1])),
+        ('restaurants_delivery_time_next', keyset_page_query(restaurants, restaurant_sort_keys('delivery_time'), [30, 1])),
+        ('restaurants_delivery_fee_next', keyset_page_query(restaurants, restaurant_sort_keys('delivery_fee'), [5.0, 1])),
+        ('restaurants_category', keyset_page_query(restaurants.filter(Restaurant.category == 'Pizza'), restaurant_sort_keys('name'))),
+        ('restaurants_by_owner', Restaurant.query.filter_by(owner_id=1)),
+        ('products_name_next', keyset_page_query(products, product_sort_keys('name'), ['Pizza', 1])),
+        ('products_price_available', keyset_page_query(products.filter(MenuItem.available == True), product_sort_keys('price_asc'))),
+        ('products_price_desc_next', keyset_page_query(products, product_sort_keys('price_desc'), [50.0, 1])),
+        ('orders', keyset_page_query(order_query().filter_by(user_id=1), order_sort_keys())),
+        ('orders_next', keyset_page_query(order_query().filter_by(user_id=1), order_sort_keys(), [after, 1])),
+        ('restaurant_orders_next', keyset_page_query(order_query().filter_by(restaurant_id=1), order_sort_keys(), [after, 1])),
+        # selectinload(Order.items).joinedload(OrderItem.menu_item) de order_query()
+        ('order_items', OrderItem.query.options(joinedload(OrderItem.menu_item)).filter(OrderItem.order_id.in_([1, 2]))),
+        ('order_idempotency', Order.query.filter_by(user_id=1, idempotency_key='k')),
+        ('cart_snapshot', cart_snapshot_query(1).limit(1)),
+        # selectinload(Cart.items).joinedload(CartItem.menu_item) de cart_snapshot_query()
+        ('cart_snapshot_items', CartItem.query.options(joinedload(CartItem.menu_item)).filter(CartItem.cart_id.in_([1]))),
+        ('cart_restaurant', Cart.query.filter_by(user_id=1, restaurant_id=1)),
+        ('cart_item', CartItem.query.filter_by(cart_id=1, menu_item_id=1)),
+        ('cart_items', CartItem.query.filter_by(cart_id=1)),
+        ('default_address', default_address_query(1).limit(1)),
+        ('checkout_addresses', UserAddress.query.filter_by(user_id=1)),
+    ]
 
-            demo_item = MenuItem(
-                restaurant_id=demo_restaurant.id,
-                name='Pizza Margherita',
-                description='Clássica com tomate, mozzarella e manjericão',
-                price=39.90,
-                image_url='/static/images/food-placeholder.jpg',
-                category='Pizza',
-                available=True
-            )
-            db.session.add(demo_item)
-            db.session.commit()
-    except Exception:
-        # Em caso de incompatibilidade de esquema (ex.: migração de colunas para português), força recriação
-        try:
-            db.drop_all()
-            db.drop_all(bind='restaurants')
-        except Exception:
-            pass
-        try:
-            users_tables = [User.__table__, OAuth.__table__, UserAddress.__table__]
-            db.Model.metadata.create_all(bind=db.engine, tables=users_tables)
-            rest_engine = db.get_engine(app, bind='restaurants')
-            rest_tables = [
-                Restaurant.__table__, MenuItem.__table__,
-                Cart.__table__, CartItem.__table__,
-                Order.__table__, OrderItem.__table__,
-                RestaurantFavorite.__table__, ProductFavorite.__table__,
-                RestaurantGeo.__table__
-            ]
-            db.Model.metadata.create_all(bind=rest_engine, tables=rest_tables)
-        except Exception:
-            pass
+def explain_query_plans():
+    """Roda EXPLAIN QUERY PLAN nas consultas quentes; full scan de tabela ou sort temporário é regressão."""
+    results = []
+    for name, query in hot_query_plans_checks():
+        mapper = query.column_descriptions[0]['entity']
+        engine = db.engines[getattr(mapper, '__bind_key__', None)]
+        statement = getattr(query, 'statement', query)  # Query do ORM ou select() já pronto
+        sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+        with engine.connect() as conn:
+            plan = [row[3] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        problems = [step for step in plan if re.match(r'^SCAN \S+$', step) or 'TEMP B-TREE' in step]
+        results.append({'query': name, 'plan': plan, 'ok': not problems, 'problems': problems})
+    return results
+
+# Esquema versionado: as migrações (pacote migrations/) rodam só via `flask migrate`,
+# nunca na importação do app, então subir um worker não faz DDL nem contagens.
+MIGRATION_BINDS = [None, 'restaurants']
+
+def migrate_databases(echo=None):
+    applied = []
+    for bind_key in MIGRATION_BINDS:
+        applied += migrations.upgrade(db.engines[bind_key], bind_key, echo=echo)
+    # Índices opcionais (FTS5) podem ter acabado de ser criados
+    _search_index_state['available'] = None
+    suggest_index.invalidate()
+    menu_cache.invalidate()
+    category_facets.invalidate()
+    return applied
+
+def seed_demo_data():
+    """Cria usuário, restaurante e item de demonstração se os bancos estiverem vazios."""
+    if User.query.first() is not None or Restaurant.query.first() is not None:
+        return False
+    demo_user = User(
+        name='Demo Restaurante',
+        email='demo@restaurant.com',
+        password=generate_password_hash('123456', method='pbkdf2:sha256'),
+        address='Rua Exemplo, 123',
+        phone='(11) 99999-9999',
+        is_restaurant=True
+    )
+    db.session.add(demo_user)
+    db.session.commit()
+
+    demo_restaurant = Restaurant(
+        owner_id=demo_user.id,
+        name='Pizzaria Demo',
+        description='A melhor pizza da cidade',
+        category='Italiana',
+        delivery_fee=5.99,
+        delivery_time=30,
+        rating=4.5,
+        logo=None,
+        address='Rua Pizza, 456',
+        phone='(11) 88888-8888',
+        image_url='/static/images/restaurant-bg.jpg'
+    )
+    db.session.add(demo_restaurant)
+    db.session.commit()
+
+    demo_item = MenuItem(
+        restaurant_id=demo_restaurant.id,
+        name='Pizza Margherita',
+        description='Clássica com tomate, mozzarella e manjericão',
+        price=39.90,
+        image_url='/static/images/food-placeholder.jpg',
+        category='Pizza',
+        available=True
+    )
+    db.session.add(demo_item)
+    db.session.commit()
+    return True
+
+@app.cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='Só mostra a versão atual e as migrações pendentes.')
+@click.option('--seed-demo', is_flag=True, help='Depois de migrar, cria dados de demonstração se os bancos estiverem vazios.')
+def migrate_command(show_status, seed_demo):
+    """Aplica as migrações de esquema pendentes nos dois bancos."""
+    if show_status:
+        for bind_key in MIGRATION_BINDS:
+            engine = db.engines[bind_key]
+            pending = migrations.pending(engine, bind_key)
+            click.echo(f"[{bind_key or 'default'}] versão {migrations.current_version(engine)}, "
+                       f"{len(pending)} pendente(s): {', '.join(f'{m.VERSION:04d}' for m in pending) or '-'}")
+        return
+    applied = migrate_databases(echo=click.echo)
+    click.echo(f'{len(applied)} migração(ões) aplicada(s).' if applied else 'Esquema já está atualizado.')
+    if seed_demo and seed_demo_data():
+        click.echo('Dados de demonstração criados.')
 
 @app.route('/products')
 def list_products():
@@ -2633,7 +4549,7 @@ def list_products():
     available_only = request.args.get('available', '').strip() == 'true'
     min_price_raw = request.args.get('min_price', '').strip()
     max_price_raw = request.args.get('max_price', '').strip()
-    sort_by = request.args.get('sort', 'name')  # name, price_asc, price_desc
+    sort_by = request.args.get('sort') or ('relevance' if q else 'name')  # relevance, name, price_asc, price_desc
     nearby_flag = request.args.get('nearby', '').strip() == 'true'
     favorites_only = request.args.get('favorites', '').strip() == 'true' or request.args.get('favorites_only', '').strip() in ('1','true')
     radius_km_raw = request.args.get('radius_km', '').strip()
@@ -2656,20 +4572,34 @@ def list_products():
         session['user_lon'] = user_lon
 
     # Query base: join com restaurante para permitir busca por nome do restaurante
-    query = db.session.query(MenuItem, Restaurant).join(Restaurant, MenuItem.restaurant_id == Restaurant.id)
+    query = product_list_query()
+
+    # Proximidade: RestaurantGeo entra no próprio join, com pré-filtro por bounding box.
+    # As coordenadas chegam junto de cada linha, sem consulta extra por restaurante.
+    user_coords = None
+    if nearby_flag:
+        user_coords = resolve_user_coords(user_lat, user_lon)
+        if user_coords:
+            min_lat, max_lat, min_lon, max_lon = geo_bounding_box(user_coords[0], user_coords[1], radius_km)
+            query = query.join(RestaurantGeo, RestaurantGeo.restaurant_id == Restaurant.id).filter(
+                RestaurantGeo.lat.between(min_lat, max_lat),
+                RestaurantGeo.lon.between(min_lon, max_lon)
+            ).add_columns(RestaurantGeo.lat, RestaurantGeo.lon)
 
     # Filtros de texto e categoria
+    search = None
     if q:
-        like_q = f"%{q}%"
-        query = query.filter(
-            (MenuItem.name.ilike(like_q)) |
-            (MenuItem.description.ilike(like_q)) |
-            (Restaurant.name.ilike(like_q)) |
-            (Restaurant.category.ilike(like_q))
-        )
-    if category:
-        query = query.filter(MenuItem.category == category)
-
+        search = menu_item_search_subquery(q)
+        if search is not None:
+            query = query.join(search, MenuItem.id == search.c.id)
+        else:
+            like_q = f"%{q}%"
+            query = query.filter(
+                (MenuItem.name.ilike(like_q)) |
+                (MenuItem.description.ilike(like_q)) |
+                (Restaurant.name.ilike(like_q)) |
+                (Restaurant.category.ilike(like_q))
+            )
     # Filtros de preço e disponibilidade
     if min_price is not None:
         query = query.filter(MenuItem.price >= min_price)
@@ -2678,13 +4608,12 @@ def list_products():
     if available_only:
         query = query.filter(MenuItem.available == True)
 
-    # Ordenação
-    if sort_by == 'price_asc':
-        query = query.order_by(MenuItem.price.asc())
-    elif sort_by == 'price_desc':
-        query = query.order_by(MenuItem.price.desc())
-    else:  # name
-        query = query.order_by(MenuItem.name.asc())
+    # Ordenação (chaves keyset; relevância usa deslocamento, o rank não é uma chave estável)
+    if sort_by == 'relevance' and search is not None:
+        query = query.order_by(search.c.rank, MenuItem.name.asc())
+        keys = None
+    else:
+        keys = product_sort_keys(sort_by)
 
     # Filtro de favoritos (se solicitado e usuário autenticado)
     user_favorite_item_ids = set()
@@ -2701,7 +4630,7 @@ def list_products():
                     'products.html',
                     items=[],
                     q=q,
-                    categories=[row[0] for row in db.session.query(MenuItem.category).distinct().order_by(MenuItem.category).all() if row[0]],
+                    categories=category_facets.chips('menu_items', counts={}),
                     selected_category=category,
                     min_price=min_price_raw,
                     max_price=max_price_raw,
@@ -2720,7 +4649,7 @@ def list_products():
             'products.html',
             items=[],
             q=q,
-            categories=[row[0] for row in db.session.query(MenuItem.category).distinct().order_by(MenuItem.category).all() if row[0]],
+            categories=category_facets.chips('menu_items', counts={}),
             selected_category=category,
             min_price=min_price_raw,
             max_price=max_price_raw,
@@ -2734,48 +4663,45 @@ def list_products():
             user_lon=user_lon_raw
         )
 
-    results = query.all()
+    # Chips de categoria contados sobre os demais filtros; no "Próximos a mim" a contagem usa a
+    # bounding box (o corte exato pelo raio acontece só nas linhas da página)
+    filtered = any([q, favorites_only, user_coords, min_price is not None, max_price is not None, available_only])
+    item_categories = category_facets.chips('menu_items', query if filtered else None)
+    if category:
+        query = query.filter(MenuItem.category == category)
 
-    # Proximidade: geocodificar endereço padrão do usuário e filtrar por raio
-    items_data = []
-    user_coords = None
-    if nearby_flag:
-        if user_lat is not None and user_lon is not None:
-            user_coords = (user_lat, user_lon)
-        elif session.get('user_lat') is not None and session.get('user_lon') is not None:
-            user_coords = (session.get('user_lat'), session.get('user_lon'))
-        elif current_user.is_authenticated:
-            default_address = UserAddress.query.filter_by(user_id=current_user.id, is_default=True).first()
-            if not default_address:
-                default_address = UserAddress.query.filter_by(user_id=current_user.id).first()
-            if default_address:
-                full_addr = f"{default_address.street}, {default_address.number} - {default_address.neighborhood}, {default_address.city} - {default_address.state}, {default_address.zip_code}, Brasil"
-                user_coords = geocode_address(full_addr)
-
-    for item, restaurant in results:
-        distance_km = None
-        if user_coords and restaurant.address:
-            r_coords = get_restaurant_coords(restaurant)
-            if r_coords:
-                distance_km = haversine_km(user_coords[0], user_coords[1], r_coords[0], r_coords[1])
-        # Se proximidade está ativada, filtra pelo raio
-        if nearby_flag and user_coords is not None:
-            if distance_km is None or distance_km > radius_km:
-                continue
-        items_data.append({
-            'item': item,
-            'restaurant': restaurant,
-            'distance_km': distance_km
-        })
+    # Distância calculada uma única vez por restaurante distinto (não por item), a cada bloco lido
+    distance_by_restaurant = {}
+
+    def within_radius(rows):
+        pending = {restaurant.id: (r_lat, r_lon) for _, restaurant, r_lat, r_lon in rows if restaurant.id not in distance_by_restaurant}
+        if pending:
+            restaurant_ids = list(pending)
+            dists = haversine_km_batch(
+                user_coords[0], user_coords[1],
+                [pending[rid][0] for rid in restaurant_ids],
+                [pending[rid][1] for rid in restaurant_ids]
+            )
+            distance_by_restaurant.update((rid, float(d)) for rid, d in zip(restaurant_ids, dists))
+        return [row for row in rows if distance_by_restaurant[row[1].id] <= radius_km]
+
+    page = keyset_paginate(query, keys, request.args.get('cursor'), parse_page_size(request.args.get('limit')),
+                           signature=sort_by, rows_filter=within_radius if user_coords else None)
 
-    # Categorias distintas para chips/filtros
-    item_categories = [row[0] for row in db.session.query(MenuItem.category).distinct().order_by(MenuItem.category).all() if row[0]]
+    items_data = []
+    if user_coords:
+        for item, restaurant, _, _ in page.items:
+            items_data.append({'item': item, 'restaurant': restaurant, 'distance_km': distance_by_restaurant[restaurant.id]})
+    else:
+        for item, restaurant in page.items:
+            items_data.append({'item': item, 'restaurant': restaurant, 'distance_km': None})
 
     tmpl_user_lat = user_lat_raw or (str(session.get('user_lat')) if session.get('user_lat') is not None else '')
     tmpl_user_lon = user_lon_raw or (str(session.get('user_lon')) if session.get('user_lon') is not None else '')
     return render_template(
         'products.html',
         items=items_data,
+        page=page,
         q=q,
         categories=item_categories,
         selected_category=category,
@@ -2845,31 +4771,64 @@ def debug_db_info():
         'orders': Order.query.count(),
         'order_items': OrderItem.query.count()
     }
-    return jsonify({'ok': True, 'uri': uri, 'db_users_path': users_db_path, 'db_restaurants_path': restaurants_db_path, 'counts': counts})
+    pragmas = {bind_key or 'default': read_sqlite_pragmas(engine) for bind_key, engine in db.engines.items() if engine.dialect.name == 'sqlite'}
+    return jsonify({'ok': True, 'uri': uri, 'db_users_path': users_db_path, 'db_restaurants_path': restaurants_db_path, 'counts': counts, 'pragmas': pragmas})
 
 @app.route('/debug/backfill-restaurant-geo', methods=['POST'])
 @app.route('/debug/backfill_restaurant_geo', methods=['POST'])
 def debug_backfill_restaurant_geo():
+    """Agenda na fila de geocodificação os restaurantes ainda sem coordenadas."""
     try:
-        updated = 0
-        for r in Restaurant.query.all():
-            if not r.address:
-                continue
-            rec = RestaurantGeo.query.filter_by(restaurant_id=r.id).first()
-            if rec:
-                continue
-            coords = geocode_address(r.address)
-            if not coords:
-                continue
-            lat, lon = coords
-            db.session.add(RestaurantGeo(restaurant_id=r.id, lat=lat, lon=lon))
-            updated += 1
+        missing = (
+            db.session.query(Restaurant.id)
+            .outerjoin(RestaurantGeo, RestaurantGeo.restaurant_id == Restaurant.id)
+            .filter(RestaurantGeo.id.is_(None), Restaurant.address.isnot(None))
+            .order_by(Restaurant.id.asc())
+            .all()
+        )
+        queued = sum(1 for (rid,) in missing if geocode_queue.enqueue('restaurant', rid))
+        return jsonify({'ok': True, 'queued': queued, 'pending': geocode_queue.pending_count()}), 202
+    except Exception as e:
+        return jsonify({'ok': False, 'error': str(e)})
+
+@app.route('/debug/geocode-cache')
+def debug_geocode_cache():
+    stats = dict(geocode_cache_stats)
+    lookups = stats['memory_hits'] + stats['db_hits'] + stats['negative_hits'] + stats['misses']
+    hits = lookups - stats['misses']
+    try:
+        persisted = GeocodeCache.query.count()
+    except Exception:
+        persisted = None
+    return jsonify({
+        'ok': True,
+        'stats': stats,
+        'lookups': lookups,
+        'hit_ratio': round(hits / lookups, 4) if lookups else None,
+        'memory_entries': len(geocode_memory_cache),
+        'persisted_entries': persisted,
+        'queue': geocode_queue.info()
+    })
+
+@app.route('/debug/geocode-cache/clear', methods=['POST'])
+def debug_geocode_cache_clear():
+    try:
+        geocode_memory_cache.clear()
+        deleted = GeocodeCache.query.delete()
         db.session.commit()
-        return jsonify({'ok': True, 'updated': updated})
+        return jsonify({'ok': True, 'deleted': deleted})
     except Exception as e:
         db.session.rollback()
         return jsonify({'ok': False, 'error': str(e)})
 
+@app.route('/debug/events')
+def debug_events():
+    return jsonify({'ok': True, 'events': order_events.info(), 'customer_events': customer_order_events.info()})
+
+@app.route('/debug/menu-cache')
+def debug_menu_cache():
+    return jsonify({'ok': True, 'cache': menu_cache.info()})
+
 @app.route('/api/db-counts')
 def api_db_counts():
     counts = {
@@ -2881,79 +4840,60 @@ def api_db_counts():
     }
     return jsonify({'ok': True, 'counts': counts})
 
+@app.cli.command('backfill-address-geo')
+@click.option('--all', 'redo_all', is_flag=True, help='Geocodifica novamente todos os endereços, não só os pendentes.')
+def backfill_address_geo(redo_all):
+    """Preenche latitude/longitude dos endereços de usuários."""
+    query = UserAddress.query
+    if not redo_all:
+        query = query.filter(UserAddress.geocoded_at.is_(None))
+    updated = failed = 0
+    for address in query.order_by(UserAddress.id.asc()).all():
+        if geocode_user_address(address):
+            updated += 1
+        else:
+            failed += 1
+        db.session.commit()
+    click.echo(f'Endereços geocodificados: {updated} | sem resultado: {failed}')
+
+@app.route('/debug/query-plans')
+def debug_query_plans():
+    results = explain_query_plans()
+    return jsonify({'ok': all(r['ok'] for r in results), 'queries': results})
+
+@app.cli.command('check-query-plans')
+def check_query_plans():
+    """Falha se alguma consulta quente voltar a fazer full scan."""
+    results = explain_query_plans()
+    for r in results:
+        click.echo(f"{'OK  ' if r['ok'] else 'FALHA'} {r['query']}: {' | '.join(r['plan'])}")
+    if not all(r['ok'] for r in results):
+        raise SystemExit(1)
+
 # Ferramentas para apresentação: resetar banco e popular dados demo
 @app.route('/debug/reset-db', methods=['POST'])
 def debug_reset_db():
     users_db = db.engine.url.database
     restaurants_engine = db.get_engine(app, bind='restaurants')
     restaurants_db = restaurants_engine.url.database if restaurants_engine else None
-    # Remover bancos
-    for path in [users_db, restaurants_db]:
+    # Fecha conexões abertas antes de remover os arquivos
+    db.session.remove()
+    for engine in db.engines.values():
+        engine.dispose()
+    # Remover bancos (inclusive os arquivos -wal/-shm do modo WAL)
+    for path in [p + suffix for p in (users_db, restaurants_db) if p for suffix in ('', '-wal', '-shm')]:
         if path and os.path.exists(path):
             try:
                 os.remove(path)
             except Exception:
                 pass
-    # Recriar esquemas separando por bind
-    try:
-        users_tables = [User.__table__, OAuth.__table__, UserAddress.__table__]
-        db.Model.metadata.create_all(bind=db.engine, tables=users_tables)
-        rest_engine = db.get_engine(app, bind='restaurants')
-        rest_tables = [
-            Restaurant.__table__, MenuItem.__table__,
-            Cart.__table__, CartItem.__table__,
-            Order.__table__, OrderItem.__table__,
-            RestaurantFavorite.__table__, ProductFavorite.__table__
-        ]
-        db.Model.metadata.create_all(bind=rest_engine, tables=rest_tables)
-    except Exception:
-        pass
+    # Recriar esquemas pelas migrações versionadas
+    migrate_databases()
     return jsonify({'status': 'ok', 'message': 'Bancos resetados e recriados.'})
 
 @app.route('/debug/seed-demo', methods=['POST'])
 def debug_seed_demo():
-    if User.query.count() == 0 and Restaurant.query.count() == 0:
-        demo_user = User(
-            name='Demo Restaurante',
-            email='demo@restaurant.com',
-            password=generate_password_hash('123456', method='pbkdf2:sha256'),
-            address='Rua Exemplo, 123',
-            phone='(11) 99999-9999',
-            is_restaurant=True
-        )
-        db.session.add(demo_user)
-        db.session.commit()
-
-        demo_restaurant = Restaurant(
-            owner_id=demo_user.id,
-            name='Pizzaria Demo',
-            description='A melhor pizza da cidade',
-            category='Italiana',
-            delivery_fee=5.99,
-            delivery_time=30,
-            rating=4.5,
-            logo=None,
-            address='Rua Pizza, 456',
-            phone='(11) 88888-8888',
-            image_url='/static/images/restaurant-bg.jpg'
-        )
-        db.session.add(demo_restaurant)
-        db.session.commit()
-
-        demo_item = MenuItem(
-            restaurant_id=demo_restaurant.id,
-            name='Pizza Margherita',
-            description='Clássica com tomate, mozzarella e manjericão',
-            price=39.90,
-            image_url='/static/images/food-placeholder.jpg',
-            category='Pizza',
-            available=True
-        )
-        db.session.add(demo_item)
-        db.session.commit()
-        created = True
-    else:
-        created = False
+    created = seed_demo_data()
     return jsonify({'status': 'ok', 'seeded': created})
     counts = {
         'users': User.query.count(),
@@ -3103,6 +5043,10 @@ def debug_fix_images():
         return jsonify({'ok': False, 'error': str(e)})
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento: aplica migrações pendentes antes de subir (workers usam `flask migrate`)
+    with app.app_context():
+        migrate_databases(echo=print)
+        seed_demo_data()
     ssl_ctx = 'adhoc' if str(os.environ.get('USE_HTTPS_DEV', '')).strip().lower() in ('1','true','yes','on') else None
     app.run(host='127.0.0.1', port=int(os.environ.get('PORT', 5000)), debug=True, use_reloader=False, ssl_context=ssl_ctx)
 @app.route('/account/disconnect-google', methods=['POST'])
@@ -0,0 +1,115 @@
+"""Migrações versionadas de esquema, uma sequência independente por bind.
+
+Cada módulo ``vNNNN_<bind>_<descricao>.py`` deste pacote define:
+
+- ``BIND``: ``None`` para o banco de clientes (cliente.db) ou ``'restaurants'`` (restaurante.db)
+- ``VERSION``: inteiro crescente dentro do bind
+- ``DESCRIPTION``: texto curto gravado em schema_version
+- ``upgrade(conn)``: recebe uma conexão sqlite3 já dentro da transação
+
+As migrações rodam só pelo comando ``flask migrate`` (ou ``python app.py`` em desenvolvimento),
+nunca na importação do app. Cada versão é aplicada em uma transação própria junto com o
+registro em schema_version, então uma falha não deixa o banco pela metade.
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+
+SCHEMA_VERSION_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    versao INTEGER NOT NULL PRIMARY KEY,
+    descricao VARCHAR(200) NOT NULL,
+    aplicada_em DATETIME NOT NULL
+)"""
+
+
+def load_migrations(bind_key):
+    """Migrações do bind, ordenadas por versão."""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith('v'):
+            continue
+        module = importlib.import_module(f'{__name__}.{info.name}')
+        if getattr(module, 'BIND', None) == bind_key:
+            found.append(module)
+    found.sort(key=lambda m: m.VERSION)
+    versions = [m.VERSION for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f'Versões de migração duplicadas no bind {bind_key!r}: {versions}')
+    return found
+
+
+def column_names(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+
+
+def table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def execute_optional(conn, statements, label):
+    """Executa DDL que depende de módulos opcionais do SQLite (rtree, fts5).
+
+    Se o módulo não existir, desfaz só este bloco (savepoint) e segue: o app tem fallback.
+    """
+    conn.execute('SAVEPOINT opcional')
+    try:
+        for stmt in statements:
+            conn.execute(stmt)
+    except Exception as e:
+        conn.execute('ROLLBACK TO opcional')
+        print(f'[MIGRAÇÃO] {label} indisponível neste SQLite: {e}')
+    conn.execute('RELEASE opcional')
+
+
+def _open(engine):
+    fairy = engine.raw_connection()
+    raw = fairy.driver_connection
+    previous = raw.isolation_level
+    raw.isolation_level = None  # BEGIN/COMMIT explícitos: DDL do SQLite também é transacional
+    return fairy, raw, previous
+
+
+def current_version(engine):
+    fairy, raw, previous = _open(engine)
+    try:
+        if not table_exists(raw, 'schema_version'):
+            return 0
+        return raw.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version').fetchone()[0]
+    finally:
+        raw.isolation_level = previous
+        fairy.close()
+
+
+def pending(engine, bind_key):
+    version = current_version(engine)
+    return [m for m in load_migrations(bind_key) if m.VERSION > version]
+
+
+def upgrade(engine, bind_key, target=None, echo=print):
+    """Aplica as migrações pendentes do bind (até ``target``, se informado). Retorna as aplicadas."""
+    applied = []
+    fairy, raw, previous = _open(engine)
+    try:
+        raw.execute(SCHEMA_VERSION_DDL)
+        version = raw.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version').fetchone()[0]
+        for module in load_migrations(bind_key):
+            if module.VERSION <= version or (target is not None and module.VERSION > target):
+                continue
+            raw.execute('BEGIN IMMEDIATE')
+            try:
+                module.upgrade(raw)
+                raw.execute(
+                    'INSERT INTO schema_version (versao, descricao, aplicada_em) VALUES (?, ?, ?)',
+                    (module.VERSION, module.DESCRIPTION, datetime.utcnow().isoformat(sep=' '))
+                )
+                raw.execute('COMMIT')
+            except Exception:
+                raw.execute('ROLLBACK')
+                raise
+            applied.append(module)
+            if echo:
+                echo(f'[{bind_key or "default"}] {module.VERSION:04d} {module.DESCRIPTION}')
+    finally:
+        raw.isolation_level = previous
+        fairy.close()
+    return applied
@@ -0,0 +1,62 @@
+"""Esquema inicial do banco de clientes (cliente.db), equivalente ao antigo create_all."""
+import importlib.util
+
+BIND = None
+VERSION = 1
+DESCRIPTION = 'esquema inicial: user, oauth, user_address'
+
+
+def upgrade(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS user (
+        id INTEGER NOT NULL,
+        nome VARCHAR(100) NOT NULL,
+        email VARCHAR(100),
+        senha VARCHAR(200),
+        endereco VARCHAR(200),
+        telefone VARCHAR(20),
+        eh_restaurante BOOLEAN,
+        eh_admin BOOLEAN,
+        id_social VARCHAR(100),
+        provedor_social VARCHAR(20),
+        codigo_verificacao VARCHAR(6),
+        codigo_verificacao_expira_em DATETIME,
+        verificado BOOLEAN,
+        PRIMARY KEY (id),
+        UNIQUE (email),
+        UNIQUE (id_social)
+    )""")
+    # Com flask_dance instalado o modelo OAuth usa a tabela do OAuthConsumerMixin
+    if importlib.util.find_spec('flask_dance') is not None:
+        conn.execute("""CREATE TABLE IF NOT EXISTS flask_dance_oauth (
+            id INTEGER NOT NULL,
+            provider VARCHAR(50) NOT NULL,
+            created_at DATETIME NOT NULL,
+            token JSON NOT NULL,
+            user_id INTEGER,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES user (id)
+        )""")
+    else:
+        conn.execute("""CREATE TABLE IF NOT EXISTS o_auth (
+            id INTEGER NOT NULL,
+            user_id INTEGER,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES user (id)
+        )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS user_address (
+        id INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        nome VARCHAR(100) NOT NULL,
+        rua VARCHAR(200) NOT NULL,
+        numero VARCHAR(20) NOT NULL,
+        complemento VARCHAR(100),
+        bairro VARCHAR(100) NOT NULL,
+        cidade VARCHAR(100) NOT NULL,
+        estado VARCHAR(50) NOT NULL,
+        cep VARCHAR(20) NOT NULL,
+        referencia VARCHAR(200),
+        padrao BOOLEAN,
+        criado_em DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(usuario_id) REFERENCES user (id)
+    )""")
@@ -0,0 +1,108 @@
+"""Esquema inicial do banco de restaurantes (restaurante.db), equivalente ao antigo create_all."""
+BIND = 'restaurants'
+VERSION = 1
+DESCRIPTION = 'esquema inicial: restaurantes, cardápio, carrinho, pedidos, favoritos, geo'
+
+
+def upgrade(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS restaurant (
+        id INTEGER NOT NULL,
+        id_dono INTEGER NOT NULL,
+        nome VARCHAR(100) NOT NULL,
+        descricao TEXT,
+        categoria VARCHAR(50),
+        taxa_entrega FLOAT,
+        tempo_entrega INTEGER,
+        avaliacao FLOAT,
+        logo VARCHAR(200),
+        endereco VARCHAR(200) NOT NULL,
+        telefone VARCHAR(20),
+        url_imagem VARCHAR(200),
+        PRIMARY KEY (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS menu_item (
+        id INTEGER NOT NULL,
+        restaurante_id INTEGER NOT NULL,
+        nome VARCHAR(100) NOT NULL,
+        descricao TEXT,
+        preco FLOAT NOT NULL,
+        imagem VARCHAR(200),
+        url_imagem VARCHAR(200),
+        categoria VARCHAR(50),
+        disponivel BOOLEAN,
+        PRIMARY KEY (id),
+        FOREIGN KEY(restaurante_id) REFERENCES restaurant (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS cart (
+        id INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        restaurante_id INTEGER NOT NULL,
+        criado_em DATETIME,
+        atualizado_em DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(restaurante_id) REFERENCES restaurant (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS cart_item (
+        id INTEGER NOT NULL,
+        carrinho_id INTEGER NOT NULL,
+        item_menu_id INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL,
+        preco FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(carrinho_id) REFERENCES cart (id),
+        FOREIGN KEY(item_menu_id) REFERENCES menu_item (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS "order" (
+        id INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        restaurante_id INTEGER NOT NULL,
+        endereco_id INTEGER NOT NULL,
+        status VARCHAR(20),
+        subtotal FLOAT NOT NULL,
+        taxa_entrega FLOAT NOT NULL,
+        total FLOAT NOT NULL,
+        metodo_pagamento VARCHAR(50) NOT NULL,
+        observacoes TEXT,
+        criado_em DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(restaurante_id) REFERENCES restaurant (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS order_item (
+        id INTEGER NOT NULL,
+        pedido_id INTEGER NOT NULL,
+        item_menu_id INTEGER NOT NULL,
+        quantidade INTEGER NOT NULL,
+        preco FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(pedido_id) REFERENCES "order" (id),
+        FOREIGN KEY(item_menu_id) REFERENCES menu_item (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS restaurant_favorite (
+        id INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        restaurante_id INTEGER NOT NULL,
+        criado_em DATETIME,
+        PRIMARY KEY (id),
+        CONSTRAINT unique_user_restaurant_favorite UNIQUE (usuario_id, restaurante_id),
+        FOREIGN KEY(restaurante_id) REFERENCES restaurant (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS product_favorite (
+        id INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        item_menu_id INTEGER NOT NULL,
+        criado_em DATETIME,
+        PRIMARY KEY (id),
+        CONSTRAINT unique_user_item_favorite UNIQUE (usuario_id, item_menu_id),
+        FOREIGN KEY(item_menu_id) REFERENCES menu_item (id)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS restaurant_geo (
+        id INTEGER NOT NULL,
+        restaurant_id INTEGER NOT NULL,
+        lat FLOAT NOT NULL,
+        lon FLOAT NOT NULL,
+        created_at DATETIME,
+        updated_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (restaurant_id),
+        FOREIGN KEY(restaurant_id) REFERENCES restaurant (id)
+    )""")
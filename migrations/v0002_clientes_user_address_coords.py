@@ -0,0 +1,13 @@
+"""Coordenadas pré-calculadas dos endereços de usuários."""
+from migrations import column_names
+
+BIND = None
+VERSION = 2
+DESCRIPTION = 'user_address: latitude, longitude, geocodificado_em'
+
+
+def upgrade(conn):
+    existing = column_names(conn, 'user_address')
+    for name, col_type in (('latitude', 'FLOAT'), ('longitude', 'FLOAT'), ('geocodificado_em', 'DATETIME')):
+        if name not in existing:
+            conn.execute(f'ALTER TABLE user_address ADD COLUMN {name} {col_type}')
@@ -0,0 +1,17 @@
+"""Cache persistente de geocodificação (positivos e negativos, com expiração)."""
+BIND = 'restaurants'
+VERSION = 2
+DESCRIPTION = 'geocode_cache'
+
+
+def upgrade(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS geocode_cache (
+        id INTEGER NOT NULL,
+        chave VARCHAR(300) NOT NULL,
+        encontrado BOOLEAN NOT NULL,
+        dados TEXT,
+        expira_em DATETIME NOT NULL,
+        criado_em DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (chave)
+    )""")
@@ -0,0 +1,8 @@
+"""Índices das consultas quentes do banco de clientes."""
+BIND = None
+VERSION = 3
+DESCRIPTION = 'índice de endereço padrão por usuário'
+
+
+def upgrade(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_user_address_usuario_padrao ON user_address (usuario_id, padrao)')
@@ -0,0 +1,29 @@
+"""Índice espacial R*Tree sobre restaurant_geo, mantido por triggers.
+
+Sem o módulo rtree no SQLite, fica só o índice (lat, lon) e a busca usa bounding box.
+"""
+from migrations import execute_optional
+
+BIND = 'restaurants'
+VERSION = 3
+DESCRIPTION = 'índice espacial restaurant_geo_rtree'
+
+RTREE_DDL = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS restaurant_geo_rtree USING rtree(restaurant_id, min_lat, max_lat, min_lon, max_lon)',
+    """CREATE TRIGGER IF NOT EXISTS restaurant_geo_rtree_ai AFTER INSERT ON restaurant_geo BEGIN
+        INSERT OR REPLACE INTO restaurant_geo_rtree VALUES (new.restaurant_id, new.lat, new.lat, new.lon, new.lon);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurant_geo_rtree_au AFTER UPDATE ON restaurant_geo BEGIN
+        DELETE FROM restaurant_geo_rtree WHERE restaurant_id = old.restaurant_id;
+        INSERT OR REPLACE INTO restaurant_geo_rtree VALUES (new.restaurant_id, new.lat, new.lat, new.lon, new.lon);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurant_geo_rtree_ad AFTER DELETE ON restaurant_geo BEGIN
+        DELETE FROM restaurant_geo_rtree WHERE restaurant_id = old.restaurant_id;
+    END""",
+    'INSERT OR REPLACE INTO restaurant_geo_rtree SELECT restaurant_id, lat, lat, lon, lon FROM restaurant_geo',
+]
+
+
+def upgrade(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_restaurant_geo_lat_lon ON restaurant_geo (lat, lon)')
+    execute_optional(conn, RTREE_DDL, 'R*Tree')
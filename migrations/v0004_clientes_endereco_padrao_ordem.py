@@ -0,0 +1,9 @@
+"""Endereço padrão na ordem de default_address_query (padrão primeiro, depois o mais antigo)."""
+BIND = None
+VERSION = 4
+DESCRIPTION = 'índice (usuario_id, padrao DESC, id) de endereços'
+
+
+def upgrade(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_user_address_usuario_padrao_id ON user_address (usuario_id, padrao DESC, id)')
+    conn.execute('DROP INDEX IF EXISTS ix_user_address_usuario_padrao')
@@ -0,0 +1,52 @@
+"""Busca textual FTS5 (restaurant_fts e menu_item_fts), mantida por triggers.
+
+unicode61 com remove_diacritics faz "açaí" casar com "acai"; prefix acelera buscas por prefixo.
+Sem FTS5 no SQLite, as telas de busca continuam usando LIKE.
+"""
+from migrations import execute_optional
+
+BIND = 'restaurants'
+VERSION = 4
+DESCRIPTION = 'busca textual restaurant_fts e menu_item_fts'
+
+SEARCH_TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+SEARCH_INDEX_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS restaurant_fts USING fts5(nome, categoria, endereco, descricao, {SEARCH_TOKENIZE})",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS menu_item_fts USING fts5(nome, descricao, categoria, restaurante_nome, restaurante_categoria, {SEARCH_TOKENIZE})",
+    """CREATE TRIGGER IF NOT EXISTS restaurant_fts_ai AFTER INSERT ON restaurant BEGIN
+        INSERT INTO restaurant_fts(rowid, nome, categoria, endereco, descricao) VALUES (new.id, new.nome, new.categoria, new.endereco, new.descricao);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurant_fts_au AFTER UPDATE ON restaurant BEGIN
+        DELETE FROM restaurant_fts WHERE rowid = old.id;
+        INSERT INTO restaurant_fts(rowid, nome, categoria, endereco, descricao) VALUES (new.id, new.nome, new.categoria, new.endereco, new.descricao);
+        UPDATE menu_item_fts SET restaurante_nome = new.nome, restaurante_categoria = new.categoria
+            WHERE (old.nome IS NOT new.nome OR old.categoria IS NOT new.categoria)
+            AND rowid IN (SELECT id FROM menu_item WHERE restaurante_id = new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurant_fts_ad AFTER DELETE ON restaurant BEGIN
+        DELETE FROM restaurant_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_fts_ai AFTER INSERT ON menu_item BEGIN
+        INSERT INTO menu_item_fts(rowid, nome, descricao, categoria, restaurante_nome, restaurante_categoria)
+            SELECT new.id, new.nome, new.descricao, new.categoria, r.nome, r.categoria FROM (SELECT 1) LEFT JOIN restaurant r ON r.id = new.restaurante_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_fts_au AFTER UPDATE ON menu_item BEGIN
+        DELETE FROM menu_item_fts WHERE rowid = old.id;
+        INSERT INTO menu_item_fts(rowid, nome, descricao, categoria, restaurante_nome, restaurante_categoria)
+            SELECT new.id, new.nome, new.descricao, new.categoria, r.nome, r.categoria FROM (SELECT 1) LEFT JOIN restaurant r ON r.id = new.restaurante_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS menu_item_fts_ad AFTER DELETE ON menu_item BEGIN
+        DELETE FROM menu_item_fts WHERE rowid = old.id;
+    END""",
+]
+SEARCH_INDEX_REBUILD = [
+    'DELETE FROM restaurant_fts',
+    'INSERT INTO restaurant_fts(rowid, nome, categoria, endereco, descricao) SELECT id, nome, categoria, endereco, descricao FROM restaurant',
+    'DELETE FROM menu_item_fts',
+    """INSERT INTO menu_item_fts(rowid, nome, descricao, categoria, restaurante_nome, restaurante_categoria)
+        SELECT m.id, m.nome, m.descricao, m.categoria, r.nome, r.categoria FROM menu_item m LEFT JOIN restaurant r ON r.id = m.restaurante_id""",
+]
+
+
+def upgrade(conn):
+    execute_optional(conn, SEARCH_INDEX_DDL + SEARCH_INDEX_REBUILD, 'FTS5')
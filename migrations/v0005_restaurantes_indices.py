@@ -0,0 +1,25 @@
+"""Índices compostos das consultas quentes (cardápio, pedidos, carrinho, checkout)."""
+BIND = 'restaurants'
+VERSION = 5
+DESCRIPTION = 'índices compostos de cardápio, pedidos e carrinho'
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_restaurant_categoria ON restaurant (categoria)',
+    'CREATE INDEX IF NOT EXISTS ix_restaurant_id_dono ON restaurant (id_dono)',
+    'CREATE INDEX IF NOT EXISTS ix_menu_item_restaurante_categoria_nome ON menu_item (restaurante_id, categoria, nome)',
+    'CREATE INDEX IF NOT EXISTS ix_menu_item_restaurante_preco ON menu_item (restaurante_id, preco)',
+    'CREATE INDEX IF NOT EXISTS ix_menu_item_categoria ON menu_item (categoria)',
+    'CREATE INDEX IF NOT EXISTS ix_menu_item_preco ON menu_item (preco)',
+    'CREATE INDEX IF NOT EXISTS ix_cart_usuario_atualizado ON cart (usuario_id, atualizado_em)',
+    'CREATE INDEX IF NOT EXISTS ix_cart_usuario_restaurante ON cart (usuario_id, restaurante_id)',
+    'CREATE INDEX IF NOT EXISTS ix_cart_item_carrinho_item ON cart_item (carrinho_id, item_menu_id)',
+    'CREATE INDEX IF NOT EXISTS ix_cart_item_item_menu ON cart_item (item_menu_id)',
+    'CREATE INDEX IF NOT EXISTS ix_order_usuario_criado ON "order" (usuario_id, criado_em)',
+    'CREATE INDEX IF NOT EXISTS ix_order_restaurante_criado ON "order" (restaurante_id, criado_em)',
+    'CREATE INDEX IF NOT EXISTS ix_order_item_pedido ON order_item (pedido_id)',
+]
+
+
+def upgrade(conn):
+    for ddl in INDEXES:
+        conn.execute(ddl)
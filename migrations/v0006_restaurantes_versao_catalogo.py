@@ -0,0 +1,40 @@
+"""Versões do catálogo para ETag/Last-Modified e caches: uma linha por restaurante e a linha 0
+(catálogo inteiro), incrementadas por triggers a cada escrita em restaurant ou menu_item."""
+BIND = 'restaurants'
+VERSION = 6
+DESCRIPTION = 'catalog_version mantida por triggers'
+
+
+def _bump(rid):
+    return f"""INSERT INTO catalog_version (restaurante_id, versao, atualizado_em) VALUES ({rid}, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(restaurante_id) DO UPDATE SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP;"""
+
+
+TRIGGERS = [
+    ('restaurant_version_ai', 'AFTER INSERT ON restaurant', ['new.id']),
+    ('restaurant_version_au', 'AFTER UPDATE ON restaurant', ['new.id']),
+    ('restaurant_version_ad', 'AFTER DELETE ON restaurant', ['old.id']),
+    ('menu_item_version_ai', 'AFTER INSERT ON menu_item', ['new.restaurante_id']),
+    ('menu_item_version_au', 'AFTER UPDATE ON menu_item', ['old.restaurante_id', 'new.restaurante_id']),
+    ('menu_item_version_ad', 'AFTER DELETE ON menu_item', ['old.restaurante_id']),
+]
+
+
+def upgrade(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS catalog_version (
+        restaurante_id INTEGER NOT NULL PRIMARY KEY,
+        versao INTEGER NOT NULL,
+        atualizado_em DATETIME NOT NULL
+    )""")
+    for name, event, targets in TRIGGERS:
+        # Para o update de menu_item que troca de restaurante, os dois restaurantes mudam
+        bumps = [_bump(targets[0])]
+        if len(targets) > 1:
+            bumps.append(f"""INSERT INTO catalog_version (restaurante_id, versao, atualizado_em)
+            SELECT {targets[1]}, 1, CURRENT_TIMESTAMP WHERE {targets[1]} IS NOT {targets[0]}
+            ON CONFLICT(restaurante_id) DO UPDATE SET versao = versao + 1, atualizado_em = CURRENT_TIMESTAMP;""")
+        bumps.append(_bump(0))
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN\n            " + '\n            '.join(bumps) + "\n        END")
+    conn.execute("""INSERT OR IGNORE INTO catalog_version (restaurante_id, versao, atualizado_em)
+        SELECT id, 1, CURRENT_TIMESTAMP FROM restaurant""")
+    conn.execute("INSERT OR IGNORE INTO catalog_version (restaurante_id, versao, atualizado_em) VALUES (0, 1, CURRENT_TIMESTAMP)")
@@ -0,0 +1,17 @@
+"""Totais desnormalizados do carrinho (quantidade de itens e subtotal), preenchidos a partir de cart_item."""
+from migrations import column_names
+
+BIND = 'restaurants'
+VERSION = 7
+DESCRIPTION = 'cart: quantidade_itens, subtotal'
+
+
+def upgrade(conn):
+    existing = column_names(conn, 'cart')
+    if 'quantidade_itens' not in existing:
+        conn.execute('ALTER TABLE cart ADD COLUMN quantidade_itens INTEGER NOT NULL DEFAULT 0')
+    if 'subtotal' not in existing:
+        conn.execute('ALTER TABLE cart ADD COLUMN subtotal FLOAT NOT NULL DEFAULT 0')
+    conn.execute("""UPDATE cart SET
+        quantidade_itens = (SELECT COALESCE(SUM(quantidade), 0) FROM cart_item WHERE carrinho_id = cart.id),
+        subtotal = (SELECT COALESCE(SUM(quantidade * preco), 0) FROM cart_item WHERE carrinho_id = cart.id)""")
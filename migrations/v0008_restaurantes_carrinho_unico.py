@@ -0,0 +1,31 @@
+"""Um carrinho por (usuário, restaurante) e uma linha por item no carrinho: junta as duplicatas
+criadas por cliques simultâneos e troca os índices por índices únicos (alvo dos upserts)."""
+BIND = 'restaurants'
+VERSION = 8
+DESCRIPTION = 'índices únicos em cart (usuario_id, restaurante_id) e cart_item (carrinho_id, item_menu_id)'
+
+
+def upgrade(conn):
+    # Carrinhos repetidos: os itens vão para o mais recente (maior id) e os demais são removidos
+    conn.execute("""UPDATE cart_item SET carrinho_id = (
+            SELECT MAX(keeper.id) FROM cart AS keeper, cart AS dup
+            WHERE dup.id = cart_item.carrinho_id
+              AND keeper.usuario_id = dup.usuario_id AND keeper.restaurante_id = dup.restaurante_id)
+        WHERE carrinho_id IN (SELECT id FROM cart)""")
+    conn.execute("""DELETE FROM cart WHERE id NOT IN (
+        SELECT MAX(id) FROM cart GROUP BY usuario_id, restaurante_id)""")
+    # Itens repetidos: a menor linha fica com a soma das quantidades
+    conn.execute("""UPDATE cart_item SET quantidade = (
+            SELECT SUM(dup.quantidade) FROM cart_item AS dup
+            WHERE dup.carrinho_id = cart_item.carrinho_id AND dup.item_menu_id = cart_item.item_menu_id)
+        WHERE id IN (SELECT MIN(id) FROM cart_item GROUP BY carrinho_id, item_menu_id HAVING COUNT(*) > 1)""")
+    conn.execute("""DELETE FROM cart_item WHERE id NOT IN (
+        SELECT MIN(id) FROM cart_item GROUP BY carrinho_id, item_menu_id)""")
+    conn.execute("""UPDATE cart SET
+        quantidade_itens = (SELECT COALESCE(SUM(quantidade), 0) FROM cart_item WHERE carrinho_id = cart.id),
+        subtotal = (SELECT COALESCE(SUM(quantidade * preco), 0) FROM cart_item WHERE carrinho_id = cart.id)""")
+
+    conn.execute('DROP INDEX IF EXISTS ix_cart_usuario_restaurante')
+    conn.execute('CREATE UNIQUE INDEX ix_cart_usuario_restaurante ON cart (usuario_id, restaurante_id)')
+    conn.execute('DROP INDEX IF EXISTS ix_cart_item_carrinho_item')
+    conn.execute('CREATE UNIQUE INDEX ix_cart_item_carrinho_item ON cart_item (carrinho_id, item_menu_id)')
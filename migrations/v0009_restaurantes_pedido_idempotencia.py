@@ -0,0 +1,13 @@
+"""Chave de idempotência do checkout: um reenvio com a mesma chave devolve o pedido já criado."""
+from migrations import column_names
+
+BIND = 'restaurants'
+VERSION = 9
+DESCRIPTION = 'order: chave_idempotencia única por usuário'
+
+
+def upgrade(conn):
+    if 'chave_idempotencia' not in column_names(conn, 'order'):
+        conn.execute('ALTER TABLE "order" ADD COLUMN chave_idempotencia VARCHAR(64)')
+    # NULLs não conflitam entre si: pedidos antigos e sem chave continuam válidos
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS ix_order_usuario_chave ON "order" (usuario_id, chave_idempotencia)')
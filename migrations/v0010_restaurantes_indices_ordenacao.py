@@ -0,0 +1,24 @@
+"""Índices das ordenações paginadas de /restaurants, /api/restaurants e /products.
+
+As ordenações por avaliação, tempo e taxa usam coalesce (NULL como pior valor); o SQLite só usa
+um índice de expressão quando a expressão da consulta é idêntica, com o mesmo literal.
+"""
+BIND = 'restaurants'
+VERSION = 10
+DESCRIPTION = 'índices das ordenações de restaurantes e produtos'
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_restaurant_nome ON restaurant (nome)',
+    'CREATE INDEX IF NOT EXISTS ix_restaurant_avaliacao_ordem ON restaurant (coalesce(avaliacao, 0.0) DESC, id)',
+    'CREATE INDEX IF NOT EXISTS ix_restaurant_tempo_ordem ON restaurant (coalesce(tempo_entrega, 2147483648))',
+    'CREATE INDEX IF NOT EXISTS ix_restaurant_taxa_ordem ON restaurant (coalesce(taxa_entrega, 1000000000.0))',
+    'CREATE INDEX IF NOT EXISTS ix_menu_item_nome ON menu_item (nome)',
+]
+
+
+def upgrade(conn):
+    # (categoria, nome) atende o filtro por categoria já na ordem da página e substitui o índice só de categoria
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_restaurant_categoria_nome ON restaurant (categoria, nome)')
+    conn.execute('DROP INDEX IF EXISTS ix_restaurant_categoria')
+    for ddl in INDEXES:
+        conn.execute(ddl)
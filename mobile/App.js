@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { SafeAreaView, View, Text, TextInput, Button, FlatList, Alert, StyleSheet } from 'react-native';
 
 const API_BASE = 'http://127.0.0.1:5000';
@@ -7,13 +7,22 @@ export default function App() {
   const [restaurants, setRestaurants] = useState([]);
   const [form, setForm] = useState({ id: null, owner_id: 1, name: '', address: '', category: '' });
   const [loading, setLoading] = useState(false);
+  // ETag da última lista recebida: se nada mudou, o servidor responde 304 sem corpo
+  const etagRef = useRef(null);
 
   const loadRestaurants = async () => {
     setLoading(true);
     try {
-      const resp = await fetch(`${API_BASE}/api/restaurants`);
-      const data = await resp.json();
-      setRestaurants(Array.isArray(data) ? data : []);
+      // NDJSON: um restaurante por linha, o servidor envia aos poucos sem montar a lista inteira
+      const headers = { Accept: 'application/x-ndjson' };
+      if (etagRef.current) headers['If-None-Match'] = etagRef.current;
+      const resp = await fetch(`${API_BASE}/api/restaurants`, { headers });
+      if (resp.status === 304) return;
+      if (!resp.ok) throw new Error('Erro ao carregar');
+      etagRef.current = resp.headers.get('ETag');
+      const text = await resp.text();
+      const data = text.split('\n').filter(line => line.trim()).map(line => JSON.parse(line));
+      setRestaurants(data);
     } catch (e) {
       Alert.alert('Erro', 'Falha ao carregar restaurantes');
     } finally {
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+import app as app_module  # noqa: E402
+from app import app, db, Restaurant, RestaurantGeo, TokenBucket, GeocodeUnavailable, geocode_address  # noqa: E402
+
+DEFAULT_CHECKPOINT = os.path.join(BASE_DIR, 'instance', 'backfill_restaurant_geo.json')
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path, state):
+    """Grava o checkpoint de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(state, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def geocode_with_retry(address, retries, backoff):
+    """Retorna ('ok', (lat, lon)), ('not_found', None) ou ('failed', motivo).
+
+    Passa pelo cache de geocodificação: endereços repetidos não voltam ao geocodificador e o que
+    for resolvido aqui já fica no cache para as requisições.
+    """
+    for attempt in range(retries):
+        try:
+            # Roda nas threads do executor: contexto próprio para a sessão usada pelo cache
+            with app.app_context():
+                coords = geocode_address(address, raise_errors=True)
+            return ('ok', coords) if coords else ('not_found', None)
+        except GeocodeUnavailable as e:
+            if attempt + 1 >= retries:
+                return ('failed', str(e))
+            time.sleep(backoff * (2 ** attempt))
+    return ('failed', 'sem tentativas')
+
+
+def next_chunk(last_id, chunk_size, include_existing):
+    """Próximo bloco de restaurantes em ordem de id (keyset: id > last_id)."""
+    query = db.session.query(Restaurant.id, Restaurant.address).filter(
+        Restaurant.id > last_id,
+        Restaurant.address.isnot(None),
+        Restaurant.address != ''
+    )
+    if not include_existing:
+        query = query.outerjoin(RestaurantGeo, RestaurantGeo.restaurant_id == Restaurant.id).filter(RestaurantGeo.id.is_(None))
+    return query.order_by(Restaurant.id.asc()).limit(chunk_size).all()
+
+
+def save_results(rows, results):
+    updated = 0
+    existing = {
+        rec.restaurant_id: rec
+        for rec in RestaurantGeo.query.filter(RestaurantGeo.restaurant_id.in_([rid for rid, _ in rows])).all()
+    }
+    for (rid, _), (status, value) in zip(rows, results):
+        if status != 'ok':
+            continue
+        rec = existing.get(rid)
+        if rec:
+            rec.lat, rec.lon = value
+        else:
+            db.session.add(RestaurantGeo(restaurant_id=rid, lat=value[0], lon=value[1]))
+        updated += 1
+    db.session.commit()
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocodifica em lote os restaurantes sem coordenadas (RestaurantGeo)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Restaurantes por bloco/commit (default: 100)")
+    parser.add_argument("--workers", type=int, default=4, help="Requisições de geocodificação simultâneas (default: 4)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Requisições por segundo ao geocodificador (default: 1.0, política do Nominatim)")
+    parser.add_argument("--burst", type=int, default=1, help="Capacidade do token bucket (default: 1)")
+    parser.add_argument("--retries", type=int, default=3, help="Tentativas por endereço em falhas transitórias (default: 3)")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Espera base entre tentativas, em segundos (default: 2.0)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Arquivo de checkpoint para retomar (default: instance/backfill_restaurant_geo.json)")
+    parser.add_argument("--max-chunks", type=int, default=0, help="Para depois de N blocos, mantendo o checkpoint para retomar (default: 0, sem limite)")
+    parser.add_argument("--reset", action="store_true", help="Ignora o checkpoint e começa do primeiro restaurante")
+    parser.add_argument("--all", dest="include_existing", action="store_true", help="Regeocodifica também restaurantes que já têm coordenadas")
+    parser.add_argument("--nominatim-url", help="URL base do geocodificador (ex.: servidor mock ou Nominatim próprio)")
+    parser.add_argument("--stub", action="store_true", help="Usa o geocodificador local determinístico (sem rede)")
+    args = parser.parse_args()
+
+    if args.nominatim_url:
+        app.config['NOMINATIM_URL'] = args.nominatim_url.rstrip('/')
+    if args.stub:
+        app.config['GEOCODER_BACKEND'] = 'stub'
+    # fetch_geocode consulta o limitador global do módulo a cada chamada
+    app_module.nominatim_rate_limiter = TokenBucket(args.rate, capacity=args.burst)
+
+    state = {} if args.reset else load_checkpoint(args.checkpoint)
+    last_id = int(state.get('last_id') or 0)
+    totals = {k: int(state.get(k) or 0) for k in ('processed', 'updated', 'not_found', 'failed')}
+    if last_id:
+        print(f"Retomando a partir do restaurante id > {last_id} ({totals['processed']} já processados)")
+
+    started = time.monotonic()
+    processed_now = 0
+    chunks = 0
+    finished = False
+    with app.app_context(), ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        while not args.max_chunks or chunks < args.max_chunks:
+            rows = next_chunk(last_id, args.chunk_size, args.include_existing)
+            if not rows:
+                finished = True
+                break
+            chunks += 1
+            chunk_started = time.monotonic()
+            results = list(executor.map(lambda row: geocode_with_retry(row[1], args.retries, args.backoff), rows))
+            updated = save_results(rows, results)
+
+            last_id = rows[-1][0]
+            processed_now += len(rows)
+            totals['processed'] += len(rows)
+            totals['updated'] += updated
+            totals['not_found'] += sum(1 for status, _ in results if status == 'not_found')
+            totals['failed'] += sum(1 for status, _ in results if status == 'failed')
+            save_checkpoint(args.checkpoint, dict(totals, last_id=last_id, updated_at=datetime.utcnow().isoformat()))
+
+            chunk_rate = len(rows) / max(time.monotonic() - chunk_started, 1e-9)
+            overall_rate = processed_now / max(time.monotonic() - started, 1e-9)
+            print(f"Bloco até id {last_id}: {len(rows)} restaurantes, {updated} geocodificados "
+                  f"| {chunk_rate:.2f}/s no bloco, {overall_rate:.2f}/s no total")
+
+    elapsed = time.monotonic() - started
+    status = 'Concluído' if finished else f'Parado após {chunks} blocos (retome com o mesmo --checkpoint)'
+    print(f"\n{status} em {elapsed:.1f}s: {totals['processed']} processados, {totals['updated']} geocodificados, "
+          f"{totals['not_found']} não encontrados, {totals['failed']} com falha "
+          f"({processed_now / max(elapsed, 1e-9):.2f} restaurantes/s nesta execução)")
+    # Execução completa: o próximo backfill começa do início
+    if finished and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
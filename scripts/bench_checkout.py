@@ -0,0 +1,126 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkouts/s com clientes simultâneos (carrinho via /api/cart/batch + POST /checkout com chave de idempotência)")
+    parser.add_argument("--clients", type=int, default=8, help="Clientes simultâneos, um usuário cada (default: 8)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga (default: 10)")
+    parser.add_argument("--cart-items", type=int, default=5, help="Itens distintos por pedido (default: 5)")
+    parser.add_argument("--menu-items", type=int, default=40, help="Itens no cardápio do restaurante (default: 40)")
+    parser.add_argument("--resubmit-every", type=int, default=5, help="A cada N pedidos envia o mesmo formulário duas vezes em paralelo, simulando duplo clique (0 desliga; default: 5)")
+    parser.add_argument("--work-dir", default=None, help="Diretório dos bancos temporários (default: um tempdir novo)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench-checkout-')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'cliente.db')}"
+    os.environ['RESTAURANTS_DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}"
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, migrate_databases, User, UserAddress, Restaurant, MenuItem, Order, OrderItem
+
+    with app.app_context():
+        migrate_databases()
+        owner = User(name='Bench Dono', email='bench-owner@example.com', password=generate_password_hash('x'), is_restaurant=True)
+        db.session.add(owner)
+        db.session.commit()
+        restaurant = Restaurant(owner_id=owner.id, name='Bench Pizzaria', category='Pizza', address='Rua Bench, 1', delivery_fee=5.0)
+        db.session.add(restaurant)
+        db.session.commit()
+        items = [MenuItem(restaurant_id=restaurant.id, name=f'Pizza {i}', price=30 + i, available=True) for i in range(args.menu_items)]
+        db.session.add_all(items)
+        db.session.commit()
+        item_ids = [item.id for item in items]
+        clients = []
+        for i in range(args.clients):
+            user = User(name=f'Bench Cliente {i}', email=f'bench-{i}@example.com', password=generate_password_hash('x'))
+            db.session.add(user)
+            db.session.commit()
+            address = UserAddress(user_id=user.id, name='Casa', street='Rua A', number='1', neighborhood='Centro',
+                                  city='São Paulo', state='SP', zip_code='01000-000', is_default=True)
+            db.session.add(address)
+            db.session.commit()
+            clients.append((user.id, address.id))
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {'checkouts': [], 'errors': 0, 'resubmits': 0, 'resubmit_mismatches': 0}
+
+    def client_loop(n, user_id, address_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        twin = app.test_client()
+        with twin.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        count = 0
+        while not stop.is_set():
+            operations = [{'item_id': item_ids[(n + count + k) % len(item_ids)], 'quantity': 1 + k % 2} for k in range(args.cart_items)]
+            form = {'address_id': address_id, 'payment_method': 'pix', 'idempotency_key': uuid.uuid4().hex}
+            count += 1
+            resubmitted = bool(args.resubmit_every) and count % args.resubmit_every == 0
+            started = time.perf_counter()
+            try:
+                ok = client.post('/api/cart/batch', json={'operations': operations}).status_code == 200
+                if resubmitted:
+                    # Duplo clique: o segundo envio corre junto com o primeiro
+                    again = {}
+                    second = threading.Thread(target=lambda: again.update(resp=twin.post('/checkout', data=form)))
+                    second.start()
+                resp = client.post('/checkout', data=form)
+                location = resp.headers.get('Location', '')
+                ok = ok and resp.status_code == 302 and '/invoice' in location
+                if resubmitted:
+                    second.join()
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            mismatch = resubmitted and (not ok or again['resp'].headers.get('Location', '') != location)
+            with lock:
+                if ok:
+                    stats['checkouts'].append(elapsed)
+                else:
+                    stats['errors'] += 1
+                stats['resubmits'] += resubmitted
+                stats['resubmit_mismatches'] += mismatch
+
+    threads = [threading.Thread(target=client_loop, args=(n, uid, aid), daemon=True) for n, (uid, aid) in enumerate(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=30)
+
+    with app.app_context():
+        orders = Order.query.count()
+        order_items = OrderItem.query.count()
+    done = len(stats['checkouts'])
+    print(f"{args.clients} clientes, {args.duration:.0f}s, {args.cart_items} itens por pedido ({work_dir})")
+    print(f"checkouts/s: {done / args.duration:.1f} | p50 {percentile(stats['checkouts'], 50):.2f} ms | "
+          f"p99 {percentile(stats['checkouts'], 99):.2f} ms | erros {stats['errors']}")
+    print(f"envios duplos: {stats['resubmits']} (segundo envio fora do pedido original: {stats['resubmit_mismatches']}) | "
+          f"pedidos gravados: {orders} (esperado {done}) | itens de pedido: {order_items} (esperado {done * args.cart_items})")
+    if orders != done or stats['resubmit_mismatches']:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
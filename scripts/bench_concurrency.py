@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+# Perfis comparados: o padrão do app (WAL) e o comportamento antigo (rollback journal, defaults do SQLite)
+PROFILES = {
+    'wal': {},
+    'rollback': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'mmap_size': 0, 'cache_size': -2000, 'temp_store': 'DEFAULT'},
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_profile(profile, args):
+    """Executa um perfil neste processo (bancos próprios em --work-dir) e devolve as métricas."""
+    work_dir = os.path.join(args.work_dir, profile)
+    os.makedirs(work_dir, exist_ok=True)
+    for name in os.listdir(work_dir):
+        os.remove(os.path.join(work_dir, name))
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'cliente.db')}"
+    os.environ['RESTAURANTS_DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}"
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, migrate_databases, User, UserAddress, Restaurant, MenuItem
+
+    app.config['SQLITE_PRAGMAS'].update(PROFILES[profile])
+    for overrides in app.config['SQLITE_BIND_PRAGMAS'].values():
+        for key in PROFILES[profile]:
+            overrides.pop(key, None)
+
+    with app.app_context():
+        migrate_databases()
+        owner = User(name='Bench Dono', email='bench-owner@example.com', password=generate_password_hash('x'), is_restaurant=True)
+        db.session.add(owner)
+        db.session.commit()
+        restaurant = Restaurant(owner_id=owner.id, name='Bench Pizzaria', category='Pizza', address='Rua Bench, 1', delivery_fee=5.0)
+        db.session.add(restaurant)
+        db.session.commit()
+        items = [MenuItem(restaurant_id=restaurant.id, name=f'Pizza {i}', price=30 + i, category=f'Cat {i % 5}', available=True)
+                 for i in range(args.menu_items)]
+        db.session.add_all(items)
+        db.session.commit()
+        item_ids = [item.id for item in items]
+        writers = []
+        for i in range(args.writers):
+            user = User(name=f'Bench Cliente {i}', email=f'bench-{i}@example.com', password=generate_password_hash('x'))
+            db.session.add(user)
+            db.session.commit()
+            address = UserAddress(user_id=user.id, name='Casa', street='Rua A', number='1', neighborhood='Centro',
+                                  city='São Paulo', state='SP', zip_code='01000-000', is_default=True)
+            db.session.add(address)
+            db.session.commit()
+            writers.append((user.id, address.id))
+        restaurant_id = restaurant.id
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {'reads': [], 'read_errors': 0, 'checkouts': [], 'checkout_errors': 0}
+
+    def reader():
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                ok = client.get(f'/restaurant/{restaurant_id}').status_code == 200
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if ok:
+                    stats['reads'].append(elapsed)
+                else:
+                    stats['read_errors'] += 1
+
+    def writer(user_id, address_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        n = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                client.post('/add_to_cart', json={'item_id': item_ids[n % len(item_ids)], 'quantity': 1})
+                resp = client.post('/checkout', data={'address_id': address_id, 'payment_method': 'pix'})
+                ok = resp.status_code == 302 and '/invoice' in resp.headers.get('Location', '')
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            n += 1
+            with lock:
+                if ok:
+                    stats['checkouts'].append(elapsed)
+                else:
+                    stats['checkout_errors'] += 1
+
+    threads = [threading.Thread(target=reader, daemon=True) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=w, daemon=True) for w in writers]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=30)
+
+    return {
+        'profile': profile,
+        'reads_per_sec': len(stats['reads']) / args.duration,
+        'read_p50_ms': percentile(stats['reads'], 50),
+        'read_p99_ms': percentile(stats['reads'], 99),
+        'read_errors': stats['read_errors'],
+        'checkouts_per_sec': len(stats['checkouts']) / args.duration,
+        'checkout_p99_ms': percentile(stats['checkouts'], 99),
+        'checkout_errors': stats['checkout_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão de leituras em /restaurant/<id> com checkouts gravando em paralelo, por perfil SQLite")
+    parser.add_argument("--profiles", default="wal,rollback", help="Perfis a comparar (default: wal,rollback)")
+    parser.add_argument("--readers", type=int, default=8, help="Threads lendo /restaurant/<id> (default: 8)")
+    parser.add_argument("--writers", type=int, default=2, help="Threads fazendo add_to_cart + /checkout (default: 2)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga por perfil (default: 10)")
+    parser.add_argument("--menu-items", type=int, default=40, help="Itens no cardápio do restaurante (default: 40)")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), 'ifood_bench_concurrency'),
+                        help="Diretório dos bancos descartáveis do benchmark")
+    parser.add_argument("--run-profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        print(json.dumps(run_profile(args.run_profile, args)))
+        return
+
+    # Cada perfil roda em um processo próprio: o app cria as engines uma única vez na importação
+    results = []
+    for profile in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        if profile not in PROFILES:
+            parser.error(f"Perfil desconhecido: {profile} (opções: {', '.join(PROFILES)})")
+        cmd = [sys.executable, os.path.abspath(__file__), '--run-profile', profile,
+               '--readers', str(args.readers), '--writers', str(args.writers), '--duration', str(args.duration),
+               '--menu-items', str(args.menu_items), '--work-dir', args.work_dir]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=BASE_DIR).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'perfil':<10} {'leituras/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6} {'checkouts/s':>12} {'p99 ms':>8} {'erros':>6}")
+    for r in results:
+        print(f"{r['profile']:<10} {r['reads_per_sec']:>11.1f} {r['read_p50_ms']:>8.2f} {r['read_p99_ms']:>8.2f} {r['read_errors']:>6} "
+              f"{r['checkouts_per_sec']:>12.1f} {r['checkout_p99_ms']:>8.2f} {r['checkout_errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
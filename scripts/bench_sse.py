@@ -0,0 +1,126 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga no SSE do painel: centenas de dashboards conectados recebendo mudanças de status")
+    parser.add_argument("--dashboards", type=int, default=300, help="Conexões SSE simultâneas em /restaurant/<id>/orders/stream (default: 300)")
+    parser.add_argument("--orders", type=int, default=20, help="Pedidos cujo status é avançado durante o teste (default: 20)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Espera máxima pelas entregas, em segundos (default: 30)")
+    parser.add_argument("--work-dir", default=None, help="Diretório dos bancos temporários (default: um tempdir novo)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench-sse-')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'cliente.db')}"
+    os.environ['RESTAURANTS_DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}"
+
+    from werkzeug.security import generate_password_hash
+    from werkzeug.serving import make_server
+    from app import app, db, migrate_databases, order_events, User, Restaurant, Order
+
+    with app.app_context():
+        migrate_databases()
+        owner = User(name='Bench Dono', email='bench-owner@example.com', password=generate_password_hash('x'), is_restaurant=True)
+        db.session.add(owner)
+        db.session.commit()
+        restaurant = Restaurant(owner_id=owner.id, name='Bench Pizzaria', address='Rua Bench, 1', delivery_fee=5.0)
+        db.session.add(restaurant)
+        db.session.commit()
+        orders = [Order(user_id=owner.id, restaurant_id=restaurant.id, address_id=1, subtotal=10.0, delivery_fee=5.0,
+                        total=15.0, payment_method='pix', status='pending') for _ in range(args.orders)]
+        db.session.add_all(orders)
+        db.session.commit()
+        owner_id, restaurant_id, order_ids = owner.id, restaurant.id, [o.id for o in orders]
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server.socket.listen(max(128, args.dashboards))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.port}'
+    cookie = {app.config.get('SESSION_COOKIE_NAME', 'session'):
+              app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(owner_id), '_fresh': True})}
+
+    lock = threading.Lock()
+    latencies = []
+    received = [0]
+    errors = []
+    stop = threading.Event()
+
+    def dashboard():
+        try:
+            with requests.get(f'{base}/restaurant/{restaurant_id}/orders/stream', cookies=cookie, stream=True, timeout=(10, None)) as resp:
+                if resp.status_code != 200:
+                    errors.append(resp.status_code)
+                    return
+                for line in resp.iter_lines(decode_unicode=True):
+                    if stop.is_set():
+                        return
+                    if line and line.startswith('data:'):
+                        data = json.loads(line[5:])
+                        with lock:
+                            latencies.append((time.time() - data['ts']) * 1000)
+                            received[0] += 1
+        except Exception as e:
+            if not stop.is_set():
+                errors.append(type(e).__name__)
+
+    started = time.perf_counter()
+    for _ in range(args.dashboards):
+        threading.Thread(target=dashboard, daemon=True).start()
+    while order_events.info()['subscribers'] < args.dashboards and time.perf_counter() - started < args.timeout:
+        if len(errors) >= args.dashboards:
+            break
+        time.sleep(0.05)
+    connected = order_events.info()['subscribers']
+    connect_time = time.perf_counter() - started
+    print(f"{connected}/{args.dashboards} dashboards conectados em {connect_time:.2f}s ({work_dir})")
+
+    owner_session = requests.Session()
+    owner_session.cookies.update(cookie)
+    publish_ms = []
+    transitions = 0
+    for status in ('preparing', 'delivering', 'delivered'):
+        for order_id in order_ids:
+            t0 = time.perf_counter()
+            resp = owner_session.post(f'{base}/orders/{order_id}/status', data={'status': status}, allow_redirects=False)
+            publish_ms.append((time.perf_counter() - t0) * 1000)
+            if resp.status_code == 302:
+                transitions += 1
+
+    expected = transitions * connected
+    deadline = time.perf_counter() + args.timeout
+    while received[0] < expected and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    server.shutdown()
+
+    print(f"transições publicadas: {transitions} | POST de status p50 {percentile(publish_ms, 50):.2f} ms, p99 {percentile(publish_ms, 99):.2f} ms")
+    print(f"eventos entregues: {received[0]}/{expected} | latência de entrega p50 {percentile(latencies, 50):.2f} ms, "
+          f"p99 {percentile(latencies, 99):.2f} ms, máx {max(latencies or [0]):.2f} ms | erros de conexão: {len(errors)}")
+    print(f"barramento: {order_events.info()}")
+    if received[0] < expected or connected < args.dashboards:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
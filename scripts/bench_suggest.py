@@ -0,0 +1,58 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from app import SuggestIndex  # noqa: E402
+
+WORDS = ['pizza', 'hambúrguer', 'açaí', 'sushi', 'temaki', 'pastel', 'coxinha', 'esfiha', 'lasanha', 'salada',
+         'frango', 'calabresa', 'margherita', 'picanha', 'tapioca', 'brigadeiro', 'sorvete', 'suco', 'café', 'pão']
+CATEGORIES = ['Pizza', 'Lanches', 'Japonesa', 'Brasileira', 'Açaí', 'Doces', 'Bebidas', 'Saudável', 'Árabe', 'Italiana']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a latência do índice de autocomplete (/api/search/suggest) com dados sintéticos")
+    parser.add_argument("--items", type=int, default=100000, help="Itens de menu sintéticos (default: 100000)")
+    parser.add_argument("--restaurants", type=int, default=5000, help="Restaurantes sintéticos (default: 5000)")
+    parser.add_argument("--queries", type=int, default=20000, help="Consultas medidas (default: 20000)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    restaurants = [(i, f"{rnd.choice(WORDS).title()} {rnd.choice(WORDS).title()} {i}", rnd.choice(CATEGORIES))
+                   for i in range(1, args.restaurants + 1)]
+    items = [(i, f"{rnd.choice(WORDS).title()} de {rnd.choice(WORDS)} {i}", rnd.choice(CATEGORIES), rnd.randint(1, args.restaurants))
+             for i in range(1, args.items + 1)]
+
+    index = SuggestIndex()
+    started = time.perf_counter()
+    index.load(restaurants, items)
+    print(f"Índice construído em {time.perf_counter() - started:.2f}s: {index.stats()}")
+
+    prefixes = [rnd.choice(WORDS)[:rnd.randint(1, 6)] for _ in range(args.queries)]
+    timings = []
+    for prefix in prefixes:
+        t0 = time.perf_counter()
+        index.suggest(prefix)
+        timings.append((time.perf_counter() - t0) * 1000)
+    print(f"{args.queries} consultas: p50={percentile(timings, 50):.3f}ms p95={percentile(timings, 95):.3f}ms "
+          f"p99={percentile(timings, 99):.3f}ms max={max(timings):.3f}ms")
+
+    started = time.perf_counter()
+    for i in range(1000):
+        index.apply({('product', args.items + i + 1): (f"{rnd.choice(WORDS)} especial", rnd.choice(CATEGORIES), {'restaurant_id': 1})})
+    print(f"1000 atualizações incrementais: {(time.perf_counter() - started) * 1000 / 1000:.3f}ms cada")
+
+
+if __name__ == "__main__":
+    main()
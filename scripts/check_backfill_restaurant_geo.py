@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from mock_nominatim import MockNominatim  # noqa: E402
+
+BACKFILL = os.path.join(BASE_DIR, 'scripts', 'backfill_restaurant_geo.py')
+
+# Roda o backfill com o TokenBucket envolvido: o instante de cada token concedido (o ``now`` do
+# próprio balde) vai para o arquivo em argv[1]. O limite de taxa é conferido nesses instantes, não na
+# chegada ao servidor falso, onde o agendamento das threads e o HTTP somam atraso variável.
+TRACED_BACKFILL = """
+import sys, threading
+sys.path.insert(0, sys.argv[2])
+import backfill_restaurant_geo as backfill
+grants, trace_path = [], sys.argv[1]
+lock = threading.Lock()
+
+class TracedTokenBucket(backfill.TokenBucket):
+    def acquire(self):
+        # Um acquire por vez: ninguém mexe em _updated entre a concessão e a leitura
+        with lock:
+            super().acquire()
+            grants.append(self._updated)
+
+backfill.TokenBucket = TracedTokenBucket
+sys.argv = [backfill.__file__] + sys.argv[3:]
+try:
+    backfill.main()
+finally:
+    with open(trace_path, 'a', encoding='utf-8') as fh:
+        fh.writelines(f'{t!r}\\n' for t in grants)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roda scripts/backfill_restaurant_geo.py contra um Nominatim falso: checkpoint, limite de taxa e contagem de falhas")
+    parser.add_argument("--restaurants", type=int, default=9, help="Restaurantes com endereço comum (default: 9)")
+    parser.add_argument("--rate", type=float, default=20.0, help="Requisições/s passadas ao backfill (default: 20)")
+    parser.add_argument("--work-dir", default=None, help="Diretório dos bancos temporários (default: um tempdir novo)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='backfill-geo-')
+    os.makedirs(work_dir, exist_ok=True)
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(work_dir, 'cliente.db')}",
+               RESTAURANTS_DATABASE_URL=f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}")
+    os.environ.update(env)
+    checkpoint = os.path.join(work_dir, 'checkpoint.json')
+    grants_path = os.path.join(work_dir, 'token_grants.txt')
+
+    from app import app, db, migrate_databases, User, Restaurant, RestaurantGeo, GeocodeCache
+
+    # Endereços comuns, um não encontrado, um sempre com erro, um que falha uma vez e um repetido (cache)
+    addresses = [f'Rua Comum {i}, São Paulo' for i in range(args.restaurants)]
+    addresses += ['Rua Inexistente, 1', 'Rua Falha, 2', 'Rua Instavel, 3', 'Rua Comum 0, São Paulo']
+    with app.app_context():
+        migrate_databases()
+        owner = User(name='Dono', email='owner@example.com', password='x', is_restaurant=True)
+        db.session.add(owner)
+        db.session.commit()
+        db.session.add_all([Restaurant(owner_id=owner.id, name=f'Restaurante {i}', address=address) for i, address in enumerate(addresses)])
+        db.session.commit()
+
+    mock = MockNominatim(flaky_failures=1).start()
+    problems = []
+
+    def check(ok, message):
+        print(f"{'OK   ' if ok else 'FALHA'} {message}")
+        if not ok:
+            problems.append(message)
+
+    def backfill(*extra):
+        cmd = [sys.executable, '-c', TRACED_BACKFILL, grants_path, os.path.dirname(BACKFILL), '--nominatim-url', mock.url, '--checkpoint', checkpoint, '--rate', str(args.rate),
+               '--burst', '1', '--workers', '4', '--chunk-size', '4', '--retries', '3', '--backoff', '0.01', *extra]
+        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(result.stdout, result.stderr)
+            raise SystemExit(f'backfill terminou com código {result.returncode}')
+        return result.stdout
+
+    # 1ª execução: só um bloco, o checkpoint fica para a retomada
+    backfill('--max-chunks', '1')
+    with open(checkpoint, encoding='utf-8') as fh:
+        state = json.load(fh)
+    first_requests = mock.count()
+    check(state['processed'] == 4 and first_requests == 4, f"primeiro bloco: {state['processed']} processados, {first_requests} requisições")
+
+    # 2ª execução: retoma depois de last_id, sem repetir o que já foi feito
+    started = time.monotonic()
+    output = backfill()
+    elapsed = time.monotonic() - started
+    summary = output.strip().splitlines()[-1]
+    print(f"      {summary}")
+    check(not os.path.exists(checkpoint), 'execução completa remove o checkpoint')
+    queries = [q for _, path, q in mock.requests if path == '/search']
+    repeated = {q for q in queries if queries.count(q) > 1} - {'rua falha, 2', 'rua instavel, 3'}
+    check(not repeated, f'retomada não consulta de novo endereços já processados {sorted(repeated) or ""}')
+    total = len(addresses)
+    check(f'{total} processados' in summary, f'{total} restaurantes processados no total')
+    check(f'{args.restaurants + 2} geocodificados' in summary, 'geocodificados: comuns, o repetido e o que falhou uma vez')
+    check('1 não encontrados' in summary and '1 com falha' in summary, 'um não encontrado e uma falha definitiva')
+    check(queries.count('rua falha, 2') == 3 and queries.count('rua instavel, 3') == 2, 'tentativas: 3 para o erro, 2 para o instável')
+
+    # Limite de taxa: com burst 1, tokens concedidos a pelo menos 1/rate um do outro (só a 2ª execução;
+    # entre processos o balde recomeça cheio)
+    with open(grants_path, encoding='utf-8') as fh:
+        grants = [float(line) for line in fh]
+    second_run = sorted(grants[first_requests:])
+    gaps = [b - a for a, b in zip(second_run, second_run[1:])]
+    min_gap = min(gaps) if gaps else 0
+    check(len(grants) == mock.count(), f'{len(grants)} tokens concedidos para {mock.count()} requisições')
+    check(min_gap >= 0.999 / args.rate, f'intervalo mínimo entre tokens {min_gap * 1000:.1f} ms (limite {1000 / args.rate:.0f} ms)')
+    print(f"      2ª execução em {elapsed:.2f}s")
+
+    with app.app_context():
+        geo = RestaurantGeo.query.count()
+        cached = GeocodeCache.query.count()
+    check(geo == args.restaurants + 2, f'{geo} restaurantes com coordenadas (o endereço repetido também)')
+    check(cached == args.restaurants + 2, f'{cached} entradas em geocode_cache (acertos e o não encontrado; erros ficam de fora)')
+
+    mock.stop()
+    print(f"bancos em {work_dir}")
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
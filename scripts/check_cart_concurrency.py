@@ -0,0 +1,99 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispara add_to_cart em paralelo para o mesmo usuário e confere o carrinho final")
+    parser.add_argument("--threads", type=int, default=8, help="Requisições simultâneas (default: 8)")
+    parser.add_argument("--requests", type=int, default=25, help="Adições por thread (default: 25)")
+    parser.add_argument("--items", type=int, default=3, help="Itens distintos do cardápio usados (default: 3)")
+    parser.add_argument("--work-dir", default=None, help="Diretório dos bancos temporários (default: um tempdir novo)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='cart-concurrency-')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'cliente.db')}"
+    os.environ['RESTAURANTS_DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}"
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, migrate_databases, User, Restaurant, MenuItem, Cart, CartItem
+
+    with app.app_context():
+        migrate_databases()
+        user = User(name='Concorrência', email='cart-concurrency@example.com', password=generate_password_hash('x'))
+        db.session.add(user)
+        db.session.commit()
+        restaurant = Restaurant(owner_id=user.id, name='Concorrência Lanches', address='Rua Teste, 1')
+        db.session.add(restaurant)
+        db.session.commit()
+        items = [MenuItem(restaurant_id=restaurant.id, name=f'Lanche {i}', price=10 + i * 2.5) for i in range(args.items)]
+        db.session.add_all(items)
+        db.session.commit()
+        user_id = user.id
+        prices = {item.id: item.price for item in items}
+    item_ids = list(prices)
+
+    barrier = threading.Barrier(args.threads)
+    errors = []
+
+    def worker(n):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        barrier.wait()
+        for i in range(args.requests):
+            item_id = item_ids[(n + i) % len(item_ids)]
+            resp = client.post('/add_to_cart', json={'item_id': item_id, 'quantity': 1})
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    expected = {item_id: 0 for item_id in item_ids}
+    for n in range(args.threads):
+        for i in range(args.requests):
+            expected[item_ids[(n + i) % len(item_ids)]] += 1
+
+    with app.app_context():
+        carts = Cart.query.filter_by(user_id=user_id).all()
+        rows = CartItem.query.filter(CartItem.cart_id.in_([c.id for c in carts])).all()
+        got = {}
+        for row in rows:
+            got[row.menu_item_id] = got.get(row.menu_item_id, 0) + row.quantity
+        problems = []
+        if errors:
+            problems.append(f'{len(errors)} requisições falharam: {sorted(set(errors))}')
+        if len(carts) != 1:
+            problems.append(f'{len(carts)} carrinhos para o usuário (esperado 1)')
+        if len(rows) != len(item_ids):
+            problems.append(f'{len(rows)} linhas em cart_item (esperado {len(item_ids)})')
+        if got != expected:
+            problems.append(f'quantidades {got} != esperado {expected}')
+        if carts:
+            total_qty = sum(expected.values())
+            total_value = round(sum(prices[i] * q for i, q in expected.items()), 2)
+            if carts[0].get_item_count() != total_qty or carts[0].get_total() != total_value:
+                problems.append(f'totais do carrinho {carts[0].get_item_count()}/{carts[0].get_total()} != {total_qty}/{total_value}')
+
+    total = args.threads * args.requests
+    if problems:
+        print(f"FALHA após {total} adições simultâneas:")
+        for problem in problems:
+            print(f"  - {problem}")
+        raise SystemExit(1)
+    print(f"OK: {total} adições em {args.threads} threads, {len(item_ids)} itens, quantidades e totais conferem ({work_dir})")
+
+
+if __name__ == "__main__":
+    main()
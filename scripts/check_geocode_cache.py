@@ -0,0 +1,106 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from mock_nominatim import MockNominatim  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confere o cache de geocodificação (LRU, TTL, cache negativo, tabela geocode_cache) contra um Nominatim falso")
+    parser.add_argument("--work-dir", default=None, help="Diretório dos bancos temporários (default: um tempdir novo)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='geocode-cache-')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'cliente.db')}"
+    os.environ['RESTAURANTS_DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}"
+
+    import app as app_module
+    from app import (app, db, migrate_databases, LRUCache, TokenBucket, GeocodeCache, GeocodeUnavailable, Restaurant,
+                     geocode_address, reverse_geocode, geocode_memory_cache, normalize_geocode_query)
+
+    mock = MockNominatim().start()
+    app.config['NOMINATIM_URL'] = mock.url
+    app.config['GEOCODER_BACKEND'] = 'nominatim'
+    app_module.nominatim_rate_limiter = TokenBucket(1000, capacity=1000)
+
+    problems = []
+
+    def check(ok, message):
+        print(f"{'OK   ' if ok else 'FALHA'} {message}")
+        if not ok:
+            problems.append(message)
+
+    # LRU: capacidade, ordem de uso e expiração por entrada
+    lru = LRUCache(2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+    check(lru.get('b') is None and lru.get('a') == 1 and lru.get('c') == 3, 'LRU descarta o menos usado recentemente')
+    lru.set('t', 'x', ttl=0.05)
+    time.sleep(0.1)
+    check(lru.get('t', 'ausente') == 'ausente', 'LRU expira entradas pelo TTL')
+
+    with app.app_context():
+        migrate_databases()
+
+        coords = geocode_address('Rua das Flores, 10, São Paulo')
+        calls = mock.count()
+        check(coords is not None and calls == 1, f'primeira consulta vai ao geocodificador ({calls} chamada)')
+        check(geocode_address('  rua das flores,  10, são paulo ') == coords and mock.count() == 1, 'mesma consulta normalizada sai do LRU')
+        geocode_memory_cache.clear()
+        check(geocode_address('Rua das Flores, 10, São Paulo') == coords and mock.count() == 1, 'sem LRU, sai da tabela geocode_cache')
+
+        check(geocode_address('Rua Inexistente, 1') is None and mock.count() == 2, 'endereço não encontrado consulta uma vez')
+        geocode_memory_cache.clear()
+        check(geocode_address('Rua Inexistente, 1') is None and mock.count() == 2, 'não encontrado fica em cache negativo (tabela)')
+
+        check(geocode_address('Rua Falha, 1') is None and geocode_address('Rua Falha, 1') is None and mock.count() == 4,
+              'erro HTTP não entra no cache negativo')
+        row = GeocodeCache.query.filter_by(key=normalize_geocode_query('Rua Falha, 1')).first()
+        check(row is None, 'erro HTTP não é gravado em geocode_cache')
+        try:
+            geocode_address('Rua Falha, 1', raise_errors=True)
+            raised = False
+        except GeocodeUnavailable:
+            raised = True
+        check(raised, 'raise_errors=True levanta GeocodeUnavailable em erro HTTP')
+        check(reverse_geocode(-23.5, -46.6) is not None and reverse_geocode(-23.5, -46.6) is not None and mock.count('/reverse') == 1,
+              'reverse geocoding também usa o cache')
+
+        # Entrada vencida na tabela: consulta de novo e renova a expiração
+        key = normalize_geocode_query('Rua das Flores, 10, São Paulo')
+        GeocodeCache.query.filter_by(key=key).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        geocode_memory_cache.clear()
+        geocode_address('Rua das Flores, 10, São Paulo')
+        renewed = GeocodeCache.query.filter_by(key=key).first()
+        check(mock.count() == 6 and renewed.expires_at > datetime.utcnow(), 'entrada vencida volta ao geocodificador e é renovada')
+
+        # Gravar o cache não pode commitar nem descartar o que está pendente na sessão de quem chamou
+        pending = Restaurant(owner_id=1, name='Pendente', address='Rua Nova, 5')
+        db.session.add(pending)
+        geocode_address('Rua Nova, 5')
+        still_pending = pending in db.session.new
+        db.session.rollback()
+        check(still_pending and Restaurant.query.filter_by(name='Pendente').count() == 0,
+              'gravação do cache não commita a sessão da requisição')
+        check(GeocodeCache.query.filter_by(key=normalize_geocode_query('Rua Nova, 5')).count() == 1,
+              'cache sobrevive ao rollback de quem chamou')
+
+    mock.stop()
+    print(f"bancos em {work_dir}")
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
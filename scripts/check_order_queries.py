@@ -0,0 +1,99 @@
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conta os SQLs das telas de pedidos com poucos e muitos pedidos; o número não pode crescer com a página")
+    parser.add_argument("--small", type=int, default=3, help="Pedidos do cenário pequeno (default: 3)")
+    parser.add_argument("--large", type=int, default=80, help="Pedidos do cenário grande (default: 80, máx. uma página de 100)")
+    parser.add_argument("--items", type=int, default=6, help="Itens por pedido no cenário grande (default: 6)")
+    parser.add_argument("--work-dir", default=None, help="Diretório dos bancos temporários (default: um tempdir novo)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='order-queries-')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'cliente.db')}"
+    os.environ['RESTAURANTS_DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}"
+
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import app, db, migrate_databases, User, UserAddress, Restaurant, MenuItem, Order, OrderItem
+
+    def seed(tag, orders, items_per_order):
+        owner = User(name=f'Dono {tag}', email=f'owner-{tag}@example.com', password=generate_password_hash('x'), is_restaurant=True)
+        customer = User(name=f'Cliente {tag}', email=f'customer-{tag}@example.com', password=generate_password_hash('x'))
+        db.session.add_all([owner, customer])
+        db.session.commit()
+        # Um endereço por pedido: o pior caso para resolver endereços de cliente.db
+        addresses = [UserAddress(user_id=customer.id, name=f'Endereço {i}', street='Rua A', number=str(i + 1), neighborhood='Centro',
+                                 city='São Paulo', state='SP', zip_code='01000-000', is_default=(i == 0)) for i in range(orders)]
+        restaurant = Restaurant(owner_id=owner.id, name=f'Restaurante {tag}', address='Rua B, 2', delivery_fee=5.0, delivery_time=30)
+        db.session.add_all(addresses + [restaurant])
+        db.session.commit()
+        menu = [MenuItem(restaurant_id=restaurant.id, name=f'Prato {tag} {i}', price=20 + i) for i in range(items_per_order)]
+        db.session.add_all(menu)
+        db.session.commit()
+        # Outros clientes no mesmo restaurante: o painel mostra um cliente diferente por pedido
+        others = [User(name=f'Outro {tag} {i}', email=f'other-{tag}-{i}@example.com', password='x') for i in range(orders)]
+        db.session.add_all(others)
+        db.session.commit()
+        order_ids = []
+        for address, other in zip(addresses, others):
+            for user_id in (other.id, customer.id):
+                order = Order(user_id=user_id, restaurant_id=restaurant.id, address_id=address.id, subtotal=10.0,
+                              delivery_fee=5.0, total=15.0, payment_method='pix', status='pending')
+                order.items = [OrderItem(menu_item_id=m.id, quantity=1, price=m.price) for m in menu]
+                db.session.add(order)
+                db.session.flush()
+            order_ids.append(order.id)
+        db.session.commit()
+        return {'owner': owner.id, 'customer': customer.id, 'restaurant': restaurant.id, 'order': order_ids[-1]}
+
+    with app.app_context():
+        migrate_databases()
+        scenarios = {'pequeno': seed('p', args.small, 1), 'grande': seed('g', args.large, args.items)}
+        engines = {'cliente.db': db.engines[None], 'restaurante.db': db.engines['restaurants']}
+
+    counts = Counter()
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', lambda *a, _name=name, **kw: counts.update([_name]))
+
+    def measure(user_id, path):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        client.get(path)  # aquece caches do processo (catálogo, cardápio)
+        counts.clear()
+        resp = client.get(path)
+        if resp.status_code != 200:
+            raise SystemExit(f'{path}: HTTP {resp.status_code}')
+        return dict(counts)
+
+    views = {
+        'orders': lambda s: (s['customer'], '/orders?limit=100'),
+        'restaurant_orders': lambda s: (s['owner'], f"/restaurant/{s['restaurant']}/orders?limit=100"),
+        'order_invoice': lambda s: (s['customer'], f"/orders/{s['order']}/invoice"),
+    }
+    # restaurante.db: pedidos, itens e produtos; cliente.db: clientes e endereços (um IN por modelo)
+    pinned = ('cliente.db', 'restaurante.db')
+    failed = False
+    for view, target in views.items():
+        result = {label: measure(*target(scenario)) for label, scenario in scenarios.items()}
+        small, large = result['pequeno'], result['grande']
+        ok = all(small.get(name, 0) == large.get(name, 0) for name in pinned)
+        failed |= not ok
+        print(f"{'OK   ' if ok else 'FALHA'} {view}: {args.small} pedidos -> {small} | {args.large} pedidos x {args.items} itens -> {large}")
+    print(f"bancos em {work_dir}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+
+# Permite importar app.py a partir da raiz do projeto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conta os SQLs de /products 'Próximos a mim' com poucos e muitos resultados; o número não pode crescer com a página")
+    parser.add_argument("--small", type=int, default=2, help="Restaurantes próximos no cenário pequeno (default: 2)")
+    parser.add_argument("--large", type=int, default=40, help="Restaurantes próximos no cenário grande (default: 40)")
+    parser.add_argument("--items", type=int, default=5, help="Itens por restaurante no cenário grande (default: 5)")
+    parser.add_argument("--work-dir", default=None, help="Diretório dos bancos temporários (default: um tempdir novo)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='products-queries-')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'cliente.db')}"
+    os.environ['RESTAURANTS_DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'restaurante.db')}"
+
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import app, db, migrate_databases, User, Restaurant, RestaurantGeo, MenuItem
+
+    def seed(tag, center, restaurants, items_per_restaurant):
+        owner = User(name=f'Dono {tag}', email=f'owner-{tag}@example.com', password='x', is_restaurant=True)
+        db.session.add(owner)
+        db.session.commit()
+        # ``restaurants`` a até ~1,5 km do centro e mais metade disso a 50 km ou mais (fora do raio e da caixa)
+        for i in range(restaurants + restaurants // 2):
+            near = i < restaurants
+            offset = (i % 10) * 0.001 if near else 0.5 + i * 0.01
+            restaurant = Restaurant(owner_id=owner.id, name=f'Restaurante {tag} {i}', address=f'Rua {tag}, {i}', delivery_fee=5.0)
+            db.session.add(restaurant)
+            db.session.flush()
+            db.session.add(RestaurantGeo(restaurant_id=restaurant.id, lat=center[0] + offset, lon=center[1] + offset))
+            db.session.add_all([MenuItem(restaurant_id=restaurant.id, name=f'Prato {tag} {i}-{k}', price=10 + k, category='Lanches')
+                                for k in range(items_per_restaurant)])
+        db.session.commit()
+        return restaurants * items_per_restaurant
+
+    with app.app_context():
+        migrate_databases()
+        customer = User(name='Cliente', email='customer@example.com', password=generate_password_hash('x'))
+        db.session.add(customer)
+        db.session.commit()
+        customer_id = customer.id
+        scenarios = {
+            'pequeno': ((-23.55, -46.63), seed('p', (-23.55, -46.63), args.small, 1)),
+            'grande': ((-22.90, -43.20), seed('g', (-22.90, -43.20), args.large, args.items)),
+        }
+        engines = {'cliente.db': db.engines[None], 'restaurante.db': db.engines['restaurants']}
+
+    counts = Counter()
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', lambda *a, _name=name, **kw: counts.update([_name]))
+
+    def measure(path):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(customer_id)
+        client.get(path)  # aquece caches do processo (catálogo, facetas)
+        counts.clear()
+        resp = client.get(path)
+        if resp.status_code != 200:
+            raise SystemExit(f'{path}: HTTP {resp.status_code}')
+        return dict(counts), resp.get_data(as_text=True).count('Prato ')
+
+    failed = False
+    for label, extra in (('nome', ''), ('preço', '&sort=price_asc'), ('busca', '&q=prato')):
+        result = {}
+        for scenario, (center, expected) in scenarios.items():
+            path = f'/products?nearby=true&user_lat={center[0]}&user_lon={center[1]}&radius_km=3&limit=100{extra}'
+            result[scenario] = measure(path) + (expected,)
+        (small, small_rows, small_expected), (large, large_rows, large_expected) = result['pequeno'], result['grande']
+        ok = small == large and small_rows >= small_expected and large_rows >= min(large_expected, 100)
+        failed |= not ok
+        print(f"{'OK   ' if ok else 'FALHA'} ordenação {label}: {small_expected} produtos -> {small} | "
+              f"{large_expected} produtos -> {large}")
+    print(f"bancos em {work_dir}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockNominatim:
+    """Servidor HTTP local no formato do Nominatim (/search e /reverse), para testes sem rede.
+
+    O texto da consulta decide a resposta:
+      - contém 'inexistente': 200 com lista vazia (endereço não encontrado)
+      - contém 'falha': sempre HTTP 503
+      - contém 'instavel': HTTP 503 nas primeiras ``flaky_failures`` consultas daquele texto
+      - qualquer outro: coordenadas estáveis na Grande São Paulo derivadas do texto
+    Cada requisição recebida fica em ``requests`` como (monotonic, caminho, q).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, flaky_failures=1):
+        self.flaky_failures = flaky_failures
+        self.requests = []
+        self._attempts = {}
+        self._lock = threading.Lock()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                status, body = mock.respond(url.path, params)
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+
+    def respond(self, path, params):
+        query = (params.get('q') or '').lower()
+        with self._lock:
+            self.requests.append((time.monotonic(), path, query))
+            attempt = self._attempts[query] = self._attempts.get(query, 0) + 1
+        if 'falha' in query or ('instavel' in query and attempt <= self.flaky_failures):
+            return 503, {'error': 'Service Unavailable'}
+        if path.endswith('/reverse'):
+            return 200, {'address': {'road': 'Rua Mock', 'city': 'São Paulo', 'state': 'SP'}}
+        if 'inexistente' in query:
+            return 200, []
+        digest = hashlib.sha1(query.encode('utf-8')).digest()
+        lat = -23.55 + (int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF - 0.5) * 0.3
+        lon = -46.63 + (int.from_bytes(digest[4:8], 'big') / 0xFFFFFFFF - 0.5) * 0.3
+        return 200, [{'lat': f'{lat:.6f}', 'lon': f'{lon:.6f}'}]
+
+    def count(self, path='/search'):
+        with self._lock:
+            return sum(1 for _, p, _ in self.requests if p == path)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocodificador falso no formato do Nominatim (use com NOMINATIM_URL=http://127.0.0.1:<porta>)")
+    parser.add_argument("--port", type=int, default=8089, help="Porta HTTP (default: 8089)")
+    parser.add_argument("--flaky-failures", type=int, default=1, help="Falhas 503 antes de responder consultas com 'instavel' (default: 1)")
+    args = parser.parse_args()
+    mock = MockNominatim(port=args.port, flaky_failures=args.flaky_failures)
+    print(f"Nominatim falso em {mock.url} (Ctrl+C para sair)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -171,39 +171,72 @@ function showToast(message, type = 'success') {
   }, 2500);
 }
 
-// Checkout
+// Checkout: envia o carrinho local inteiro ao servidor em uma requisição (/api/cart/batch)
+// e segue para a página de checkout
 function checkout() {
   if (cart.items.length === 0) {
     showToast('Seu carrinho está vazio!', 'danger');
     return;
   }
 
-  fetch('/checkout', {
+  fetch('/api/cart/batch', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
     },
     body: JSON.stringify({
-      restaurant_id: cart.restaurant_id,
-      items: cart.items,
-      total: cart.total
+      replace: true,
+      operations: cart.items.map(item => ({ item_id: parseInt(item.id), quantity: item.quantity, op: 'set' }))
     })
   })
   .then(response => response.json())
   .then(data => {
     if (data.success) {
-      showToast('Pedido realizado com sucesso!');
-      // Limpa o carrinho
+      // O carrinho agora está no servidor
       clearCart();
-      // Redireciona para Meus Pedidos
-      window.location.href = '/orders';
+      window.location.href = '/checkout';
     } else {
-      showToast(data.message || 'Erro ao realizar pedido', 'danger');
+      showToast((data.errors || []).join(' ') || 'Erro ao enviar o carrinho', 'danger');
     }
   })
   .catch(error => {
     console.error(error);
-    showToast('Erro ao realizar pedido', 'danger');
+    showToast('Erro ao enviar o carrinho', 'danger');
+  });
+}
+
+// Sugestões de busca enquanto o usuário digita
+function setupSearchSuggest(input, index) {
+  const list = document.createElement('datalist');
+  list.id = 'search-suggest-' + index;
+  input.setAttribute('list', list.id);
+  input.setAttribute('autocomplete', 'off');
+  input.after(list);
+
+  let timer = null;
+  let controller = null;
+  input.addEventListener('input', function() {
+    clearTimeout(timer);
+    const q = input.value.trim();
+    if (q.length < 2) {
+      list.innerHTML = '';
+      return;
+    }
+    timer = setTimeout(() => {
+      if (controller) controller.abort();
+      controller = new AbortController();
+      fetch('/api/search/suggest?q=' + encodeURIComponent(q), { signal: controller.signal })
+        .then(response => response.json())
+        .then(data => {
+          list.innerHTML = '';
+          (data.suggestions || []).forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.label;
+            list.appendChild(option);
+          });
+        })
+        .catch(() => {});
+    }, 150);
   });
 }
 
@@ -227,6 +260,9 @@ document.addEventListener('DOMContentLoaded', function() {
     });
   }
 
+  // Autocomplete dos campos de busca (/api/search/suggest)
+  document.querySelectorAll('input[type="text"][name="q"]').forEach(setupSearchSuggest);
+
   // Botão de checkout
   const checkoutButton = document.getElementById('checkout-button');
   if (checkoutButton) {